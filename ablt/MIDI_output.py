@@ -1,48 +1,239 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import io
 import os
+import json
+import zipfile
 
-from mido import Message, MidiFile, MidiTrack, MetaMessage, bpm2tempo
+import numpy as np
 
+NOTE_VELOCITY = 100
 
-def create_MIDI_file(midi_array, BPM, title, output_dir, middle_c='C4', tpb=960*16):
-              
-    outfile = MidiFile(ticks_per_beat=tpb)
-    track = MidiTrack()
-    outfile.tracks.append(track)
 
-    track.append(MetaMessage('time_signature', numerator=4, denominator=4))
-    track.append(MetaMessage('set_tempo', tempo=bpm2tempo(BPM)))
-    track.append(MetaMessage('track_name', name=title))
-    track.append(MetaMessage('instrument_name', name='bass'))
-    
-    delta0 = int(midi_array[0, 0]*tpb)
-    for i in range(midi_array.shape[0]-1):
+def bpm2tempo(BPM):
+    """Microseconds per beat."""
+    return int(round((60 * 1000000) / BPM))
+
+
+def encode_variable_length(values):
+    """
+    Encodes non-negative integers as MIDI variable length quantities at once.
+
+        Parameters:
+        -----------
+            values (array): integers in [0, 2^28)
+
+        Returns:
+        --------
+            septets (ndarray): [N, 4] uint8 array of the right aligned quantity bytes
+            mask (ndarray): [N, 4] bool array of the bytes in use
+    """
+
+    values = np.asarray(values, dtype=np.int64).reshape(-1)
+    assert np.all(values >= 0) and np.all(values < 1 << 28), 'Variable length quantities must be in [0, 2^28)!'
+
+    septets = (values[:, None] >> np.array([21, 14, 7, 0])) & 0x7F
+    septets[:, :3] |= 0x80 # continuation bits
+
+    N_bytes = 1 + (values >= 1 << 7) + (values >= 1 << 14) + (values >= 1 << 21)
+    mask = np.arange(4) >= 4 - N_bytes[:, None]
+
+    return septets.astype(np.uint8), mask
+
+
+def meta_event(meta_type, data):
+    """Meta event at delta time 0."""
+
+    septets, mask = encode_variable_length(len(data))
+
+    return b'\x00\xff' + bytes([meta_type]) + septets[mask].tobytes() + data
+
+
+def note_events(midi_array, middle_c='C4', tpb=960*16):
+    """
+    Serializes the notes of a midi array to note_on, note_off event pairs. The delta times of all the notes are
+    computed at once.
+
+        Parameters:
+        -----------
+            midi_array (ndarray): MIDI_NOTE_DTYPE structured array
+            middle_c (str, default='C4'): 'C3' transposes the notes an octave up
+            tpb (int, default=960*16): ticks per beat
+
+        Returns:
+        --------
+            events (bytes): track events
+    """
+
+    start_beats, durations = midi_array['start_beat'], midi_array['duration']
+    N_notes = len(midi_array)
+
+    # a note_on follows the previous note_off
+    on_deltas = np.empty(N_notes)
+    on_deltas[:1] = start_beats[:1]
+    on_deltas[1:] = start_beats[1:] - (start_beats[:-1] + durations[:-1])
+    on_deltas, off_deltas = (on_deltas*tpb).astype(np.int64), (durations*tpb).astype(np.int64)
+
+    pitches = midi_array['midi_number'].astype(np.int64) + (12 if middle_c == 'C3' else 0)
+    assert np.all((0 <= pitches) & (pitches < 128)), 'MIDI numbers must be in [0, 128)!'
+
+    on_septets, on_mask = encode_variable_length(on_deltas)
+    off_septets, off_mask = encode_variable_length(off_deltas)
+
+    note_on = np.stack([np.full(N_notes, 0x90), pitches, np.full(N_notes, NOTE_VELOCITY)], axis=1)
+    note_off = np.stack([np.full(N_notes, 0x80), pitches, np.full(N_notes, NOTE_VELOCITY)], axis=1)
+
+    # one fixed width record per note, the unused bytes of the delta times are masked out
+    records = np.concatenate([on_septets, note_on, off_septets, note_off], axis=1).astype(np.uint8)
+    used = np.concatenate([on_mask, np.ones((N_notes, 3), dtype=bool), off_mask, np.ones((N_notes, 3), dtype=bool)],
+                          axis=1)
+
+    return records[used].tobytes()
+
+
+def conductor_events(BPM):
+    """4/4 time signature and tempo meta events."""
+
+    return meta_event(0x58, bytes([4, 2, 24, 8])) + meta_event(0x51, bpm2tempo(BPM).to_bytes(3, 'big'))
+
 
-        pitch = int(midi_array[i, 1]) # convert to midi pitch
+def track_chunk(events):
+    """Closes the events with an end of track and wraps them in an MTrk chunk."""
 
-        if middle_c == 'C3': 
-            pitch += 12 
+    events += meta_event(0x2F, b'')
 
-        duration = int(midi_array[i, 3]*tpb)
+    return b'MTrk' + len(events).to_bytes(4, 'big') + events
 
-        offset = midi_array[i, 0] + midi_array[i, 3]
 
-        track.append(Message('note_on', note=pitch, velocity=100, time=delta0))
-        track.append(Message('note_off', note=pitch, velocity=100, time=duration))
+def midi_track_bytes(midi_array, BPM, title, middle_c='C4', tpb=960*16):
+    """Serializes a bass line to an MTrk chunk, the time signature and the tempo are left out if BPM is None."""
 
-        # Delta time for midi
-        delta0 = int((midi_array[i+1, 0]-offset)*tpb)
+    events = b''.join([conductor_events(BPM) if BPM is not None else b'',
+                       meta_event(0x03, title.encode('latin1', errors='replace')), # track name
+                       meta_event(0x04, b'bass'), # instrument name
+                       note_events(midi_array, middle_c, tpb)])
 
-    # Put the last note
-    duration = int(midi_array[i+1, 3]*tpb)
-    pitch = int(midi_array[i+1, 1])
-    track.append(Message('note_on', note=pitch, velocity=100, time=delta0))
-    track.append(Message('note_off', note=pitch, velocity=100, time=duration))
+    return track_chunk(events)
 
-    track.append(MetaMessage('end_of_track'))
 
-    os.makedirs(output_dir, exist_ok=True)  
+def midi_header_bytes(file_format, N_tracks, tpb=960*16):
+    """Serializes the MThd chunk."""
+    return b'MThd' + (6).to_bytes(4, 'big') + b''.join(x.to_bytes(2, 'big') for x in [file_format, N_tracks, tpb])
+
+
+def midi_file_bytes(midi_array, BPM, title, middle_c='C4', tpb=960*16):
+    """
+    Serializes a bass line to a single track standard MIDI file in memory.
+
+        Parameters:
+        -----------
+            midi_array (ndarray): MIDI_NOTE_DTYPE structured array
+            BPM (float): BPM of the track
+            title (str): track name
+            middle_c (str, default='C4'): 'C3' transposes the notes an octave up
+            tpb (int, default=960*16): ticks per beat
+
+        Returns:
+        --------
+            midi_file (bytes): content of the .mid file
+    """
+
+    return midi_header_bytes(1, 1, tpb) + midi_track_bytes(midi_array, BPM, title, middle_c, tpb)
+
+
+def multi_track_midi_bytes(bass_lines, middle_c='C4', tpb=960*16):
+    """
+    Serializes many bass lines to a single standard MIDI file in memory. The file has format 1, a conductor track
+    with the time signature and the tempo of the first bass line is followed by a track per bass line. The tracks
+    of a format 1 file share the conductor tempo, so the notes keep their beat positions but a bass line with
+    another BPM plays at the tempo of the first one. Use midi_archive_bytes for a file with its own tempo per
+    bass line.
+
+        Parameters:
+        -----------
+            bass_lines (dict): {title: (midi_array, BPM)}
+            middle_c (str, default='C4'): 'C3' transposes the notes an octave up
+            tpb (int, default=960*16): ticks per beat
+
+        Returns:
+        --------
+            midi_file (bytes): content of the .mid file
+    """
+
+    assert bass_lines, 'No bass lines to write!'
+
+    BPM = next(iter(bass_lines.values()))[1]
+    conductor = track_chunk(conductor_events(BPM))
+    tracks = [midi_track_bytes(midi_array, None, title, middle_c, tpb) for title, (midi_array, _) in bass_lines.items()]
+
+    return midi_header_bytes(1, 1+len(tracks), tpb) + conductor + b''.join(tracks)
+
+
+def midi_archive_bytes(bass_lines, middle_c='C4', tpb=960*16):
+    """
+    Serializes many bass lines to a single zip archive in memory. The archive holds a {M}/{title}.mid file for
+    every decimation rate of every bass line and an index.json of the entries.
+
+        Parameters:
+        -----------
+            bass_lines (dict): {title: (midi_arrays, BPM)} where midi_arrays is a {M: midi_array} dict
+            middle_c (str, default='C4'): 'C3' transposes the notes an octave up
+            tpb (int, default=960*16): ticks per beat
+
+        Returns:
+        --------
+            archive (bytes): content of the .zip file
+    """
+
+    index = []
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for title, (midi_arrays, BPM) in bass_lines.items():
+            for M, midi_array in midi_arrays.items():
+                path = '{}/{}.mid'.format(M, title)
+                archive.writestr(path, midi_file_bytes(midi_array, BPM, title, middle_c, tpb))
+                index.append({'title': title, 'BPM': float(BPM), 'M': int(M), 'N_notes': len(midi_array),
+                              'path': path})
+        archive.writestr('index.json', json.dumps({'ticks_per_beat': tpb, 'entries': index}, indent=4))
+
+    return buffer.getvalue()
+
+
+def create_MIDI_file(midi_array, BPM, title, output_dir, middle_c='C4', tpb=960*16):
+
+    os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, '{}.mid'.format(title))
-    outfile.save(output_path)
\ No newline at end of file
+    with open(output_path, 'wb') as outfile:
+        outfile.write(midi_file_bytes(midi_array, BPM, title, middle_c, tpb))
+
+
+def export_MIDI_batch(bass_lines, output_path, middle_c='C4', tpb=960*16):
+    """
+    Writes many bass lines with a single file write, a .zip archive of all the decimation rates or a multi-track .mid
+    file of a single decimation rate. All the tracks of the .mid file play at the tempo of the first bass line, the
+    .zip archive keeps the tempo of every bass line.
+
+        Parameters:
+        -----------
+            bass_lines (dict): {title: (midi_arrays, BPM)} where midi_arrays is a {M: midi_array} dict,
+                                for a .mid file each midi_arrays must hold a single M
+            output_path (str): path of the .zip or the .mid file
+            middle_c (str, default='C4'): 'C3' transposes the notes an octave up
+            tpb (int, default=960*16): ticks per beat
+    """
+
+    extension = os.path.splitext(output_path)[1]
+    assert extension in ['.zip', '.mid'], 'Choose a .zip or a .mid output!'
+
+    if extension == '.zip':
+        content = midi_archive_bytes(bass_lines, middle_c, tpb)
+    else:
+        assert all(len(midi_arrays) == 1 for midi_arrays, _ in bass_lines.values()), \
+                                                            'A multi-track MIDI file holds a single decimation rate!'
+        content = multi_track_midi_bytes({title: (next(iter(midi_arrays.values())), BPM)
+                                                    for title, (midi_arrays, BPM) in bass_lines.items()}, middle_c, tpb)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'wb') as outfile:
+        outfile.write(content)
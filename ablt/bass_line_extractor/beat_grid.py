@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+
+from librosa.onset import onset_strength
+
+from ..constants import BPM_TOLERANCE
+
+
+def onset_envelope(track, fs, fps=100):
+    """
+    Calculates the onset strength envelope of a track at the beat activation frame rate.
+
+        Parameters:
+        -----------
+            track (ndarray): audio track
+            fs (int): sampling rate
+            fps (int, default=100): frames per second of the envelope
+
+        Returns:
+        --------
+            envelope (ndarray): onset strength envelope
+    """
+
+    return onset_strength(y=np.asarray(track), sr=fs, hop_length=int(round(fs/fps)))
+
+
+def fit_beat_grid(envelope, BPM, fps=100, tolerance=BPM_TOLERANCE, N_periods=41, N_refinements=3):
+    """
+    Fits a fixed period beat grid to an onset envelope using the provided BPM. The beat period is searched
+    within the tolerance around the BPM and refined around the best candidate, the phase is searched over one
+    period with a frame resolution. A candidate grid is scored by the mean envelope value at its beats.
+
+        Parameters:
+        -----------
+            envelope (ndarray): onset strength (or beat activation) envelope
+            BPM (float): track BPM
+            fps (int, default=100): frames per second of the envelope
+            tolerance (float, default=BPM_TOLERANCE): relative tolerance of the beat period search
+            N_periods (int, default=41): number of beat periods to try at each refinement
+            N_refinements (int, default=3): number of beat period search refinements
+
+        Returns:
+        --------
+            beat_positions (ndarray): beat positions in time
+            quality (float): mean envelope value at the beats over the mean of the envelope,
+                            close to 1 when the grid does not match the track, 0 when no grid can be fitted
+    """
+
+    envelope = np.asarray(envelope, dtype=np.float64)
+    duration = len(envelope)/fps # in sec
+
+    period0 = 60/BPM
+    min_period, max_period = period0*(1-tolerance), period0*(1+tolerance)
+
+    # shorter than two periods, no beats to score at the longest candidate period
+    if int((duration-max_period)/max_period) <= 0:
+        return np.array([]), 0.0
+
+    mean_envelope = np.mean(envelope)
+    if mean_envelope <= 0:
+        return np.array([]), 0.0
+
+    def score_grids(period):
+        """Returns the best phase and its score for a beat period."""
+        phases = np.arange(0, period, 1/fps)
+        N_beats = int((duration-period)/period)
+        beats = phases[:, np.newaxis] + period*np.arange(N_beats)[np.newaxis, :] # (phase, beat) in sec
+        scores = np.interp(beats*fps, np.arange(len(envelope)), envelope).mean(axis=1)
+        best_idx = np.argmax(scores)
+        return phases[best_idx], scores[best_idx]
+
+    low, high = min_period, max_period
+    for _ in range(N_refinements):
+        periods = np.linspace(low, high, N_periods)
+        results = [score_grids(period) for period in periods]
+        best_idx = int(np.argmax([score for _, score in results]))
+
+        # zoom in around the best period, within the tolerance
+        step = periods[1] - periods[0]
+        low, high = max(periods[best_idx]-step, min_period), min(periods[best_idx]+step, max_period)
+
+    period = periods[best_idx]
+    phase, score = results[best_idx]
+
+    beat_positions = np.arange(phase, duration, period)
+    quality = score/mean_envelope
+
+    return beat_positions, quality
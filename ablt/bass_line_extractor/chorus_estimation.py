@@ -3,13 +3,87 @@
 
 import numpy as np
 
-from ..signal_processing import lp_and_normalize
-from ..utilities import sample_and_hold, get_bar_positions
-from ..constants import DROP_DETECTOR_CUTOFF
+from ..signal_processing import lp_and_normalize, multirate_lp_and_normalize
+from ..utilities import get_bar_positions
+from ..constants import FS, DROP_DETECTOR_CUTOFF, DROP_DETECTOR_TAPS
+
+
+class EnergyIndex:
+    """
+    Energy index of a track built once from the cumulative sum of its squared samples. The energy of any
+    sample range is a difference of two prefix sums, so beat, bar or cell energies are computed in O(1) per
+    range and vectorized over all the boundaries at once.
+    """
+
+    def __init__(self, track, fs, energy_scale=1.0):
+        """
+        Parameters:
+        -----------
+            track (ndarray): audio track (low passed for drop detection)
+            fs (float): sampling rate
+            energy_scale (float, default=1.0): multiplies the energies, compensates the sample count of a
+                                                track sampled below the reference rate
+        """
+
+        self.fs = fs
+        self.energy_scale = energy_scale
+        self.N_samples = len(track)
+        self.cumulative_energy = np.concatenate(([0.0], np.cumsum(np.square(track, dtype=np.float64))))
+
+    @classmethod
+    def from_track(cls, track, fs, multirate=True, reference_fs=FS):
+        """
+        Low pass filters the track at DROP_DETECTOR_CUTOFF and indexes it for drop detection. The multirate
+        front end filters a decimated copy. The energies are scaled to the sample count at reference_fs, the
+        rate the absolute drop picking threshold was tuned for, so they do not depend on the rate of the track.
+        The filter tap is scaled the same way, every rate gets the transition band of DROP_DETECTOR_TAPS taps
+        at reference_fs.
+        """
+
+        M = int(DROP_DETECTOR_TAPS*fs/reference_fs) | 1 # keep an odd tap for the Type I filter
+        if multirate:
+            track_lp, fs_lp = multirate_lp_and_normalize(track, DROP_DETECTOR_CUTOFF, fs, M=M)
+        else:
+            track_lp, fs_lp = lp_and_normalize(track, DROP_DETECTOR_CUTOFF, fs, M=M), fs
+        return cls(track_lp, fs_lp, energy_scale=reference_fs/fs_lp)
+
+    def range_energies(self, start_times, end_times):
+        """
+        Returns the energies of the [start_time, end_time) ranges.
+
+            Parameters:
+            -----------
+                start_times (ndarray): start of the ranges (in time)
+                end_times (ndarray): end of the ranges (in time)
+
+            Returns:
+            --------
+                energies (ndarray): sum of squared samples of each range
+        """
+
+        start_indices = np.clip((self.fs*np.asarray(start_times)).astype(int), 0, self.N_samples)
+        end_indices = np.clip((self.fs*np.asarray(end_times)).astype(int), 0, self.N_samples)
+        energies = self.cumulative_energy[np.maximum(start_indices, end_indices)] - self.cumulative_energy[start_indices]
+        return self.energy_scale*energies
+
+    def energies(self, boundaries):
+        """Returns the energies between consecutive boundaries (in time)."""
+        boundaries = np.asarray(boundaries)
+        return self.range_energies(boundaries[:-1], boundaries[1:])
+
+    def bar_energies(self, beat_positions):
+        """Returns the energy of each bar given the beat positions."""
+        return self.energies(get_bar_positions(beat_positions))
+
+    def cell_energies(self, beat_positions, N_bars=4):
+        """Returns the mean bar energy of each complete cell of N_bars bars."""
+        bar_positions = get_bar_positions(beat_positions)
+        N_cells = (len(bar_positions)-1) // N_bars
+        return self.energies(bar_positions[:N_cells*N_bars+1:N_bars]) / N_bars
 
 
 # TODO : WRITE A PSEUDOCODE, REFER HERE
-def drop_detection(track, beat_positions, fs, epsilon):
+def drop_detection(track, beat_positions, fs, epsilon, energy_index=None, full_rate_track=None, reference_fs=FS):
     """
     Detects drops of a track using beat positions.
         
@@ -17,8 +91,12 @@ def drop_detection(track, beat_positions, fs, epsilon):
         -----------
             track (ndarray): audio track
             beat_positions (ndarray): array of beat positions (in time)
-            fs (int): sampling rate
+            fs (int): sampling rate of the track
             epsilon (int, default=1): determines the threshold value considering a drop
+            energy_index (EnergyIndex, default=None): reuse an index of the track, the track is not used then
+            full_rate_track (ndarray, default=None): the track sampled at reference_fs, give it for comparing the
+                                                    decisions with the full rate low pass filter (slow)
+            reference_fs (float, default=FS): sampling rate the energies are scaled to
 
         Returns:
         --------
@@ -27,13 +105,14 @@ def drop_detection(track, beat_positions, fs, epsilon):
 
     """
 
-    bar_positions = get_bar_positions(beat_positions)
+    if energy_index is None:
+        energy_index = EnergyIndex.from_track(track, fs, reference_fs=reference_fs)
 
-    track_lp = lp_and_normalize(track, DROP_DETECTOR_CUTOFF, fs)
+    if full_rate_track is not None:
+        validate_drop_detection(full_rate_track, beat_positions, epsilon, energy_index, reference_fs)
 
-    bar_energies = calculate_bar_energies(track_lp, bar_positions, fs)
-    cell_energies = calculate_mean_cell_energies(bar_energies)
-    smoothed_cell_energies = sample_and_hold(cell_energies, 4)
+    cell_energies = energy_index.cell_energies(beat_positions)
+    smoothed_cell_energies = np.repeat(cell_energies, 4)
 
     possible_drops = find_drops(smoothed_cell_energies, epsilon)
     estimated_drop = drop_picking(possible_drops)
@@ -43,7 +122,43 @@ def drop_detection(track, beat_positions, fs, epsilon):
     else:
         drop_beat_idx=0
 
-    return drop_beat_idx, np.array([idx*4 for idx in possible_drops[0]])
+    return drop_beat_idx, possible_drops[0]*4
+
+
+def validate_drop_detection(full_rate_track, beat_positions, epsilon, energy_index, reference_fs=FS):
+    """
+    Compares the drops found using an energy index with the drops found by low pass filtering the full rate
+    track with lp_and_normalize, the baseline the drop picking threshold was tuned on.
+
+        Parameters:
+        -----------
+            full_rate_track (ndarray): audio track sampled at reference_fs
+            beat_positions (ndarray): array of beat positions (in time)
+            epsilon (int): determines the threshold value considering a drop
+            energy_index (EnergyIndex): index to validate, it can be built from a decimated copy of the track
+            reference_fs (float, default=FS): sampling rate of the full rate track
+
+        Returns:
+        --------
+            match (bool): True if both front ends give the same drop decisions
+    """
+
+    full_rate_index = EnergyIndex.from_track(full_rate_track, reference_fs, multirate=False, reference_fs=reference_fs)
+
+    drops = find_drops(np.repeat(energy_index.cell_energies(beat_positions), 4), epsilon)
+    full_rate_drops = find_drops(np.repeat(full_rate_index.cell_energies(beat_positions), 4), epsilon)
+
+    match = (drop_picking(drops)[0] == drop_picking(full_rate_drops)[0] and
+                np.array_equal(drops[0], full_rate_drops[0]))
+    if not match:
+        print('Drop detection front ends disagree! Possible drops: {} (index), {} (full rate)'.format(drops[0],
+                                                                                            full_rate_drops[0]))
+    return match
+
+
+def energy_threshold(energies, epsilon=1):
+    """Returns the energy threshold of drop detection, epsilon standard deviations below the mean energy."""
+    return np.mean(energies) - (np.std(energies)/epsilon)
 
 
 def find_drops(energies, epsilon=1):
@@ -60,27 +175,19 @@ def find_drops(energies, epsilon=1):
             possible_drops (tupple): (drop_indices, drop_energies) where drop_indices correspond to cell_indices
     """
     
-    average_energy = np.mean(energies)
-    energy_deviation = np.std(energies)
+    energies = np.asarray(energies)
 
-    threshold = average_energy - (energy_deviation/epsilon)
+    threshold = energy_threshold(energies, epsilon)
 
-    low_energy_indices = np.array([i for i, energy in enumerate(energies) if energy <= threshold] + [len(energies)])
+    low_energy_indices = np.append(np.flatnonzero(energies <= threshold), len(energies))
 
     discontinuity_indices = np.where(np.diff(low_energy_indices) != 1)[0]
 
-    energy_rise_indices = low_energy_indices[discontinuity_indices]
-
-    drop_indices, drop_energies = [], []
-    for idx in energy_rise_indices:
-        
-        e = energies[idx+1]
-        
-        if e > threshold:
-            drop_indices.append(idx+1)
-            drop_energies.append(e)
+    # first index after each low energy section
+    drop_indices = low_energy_indices[discontinuity_indices] + 1
+    drop_indices = drop_indices[energies[drop_indices] > threshold]
                 
-    possible_drops = (np.array(drop_indices), drop_energies)
+    possible_drops = (drop_indices, energies[drop_indices].tolist())
     
     return possible_drops
 
@@ -127,49 +234,21 @@ def drop_picking(possible_drops, threshold=1000):
     return drop
 
 
-def calculate_bar_energies(track, bar_positions, fs):
+def check_chorus_beat_grid(chorus_beat_positions, beat_length, return_deviations=False):
     """
-    Calculates the energies of each bar in a griven track using the bar positions.
+    Compares the beat lengths of a chorus beat grid with the beat length of the provided BPM.
 
         Parameters:
         -----------
-            track (ndarray): audio track
-            bar_positions (ndarray): array of bar positions (in time)
-            fs (int): sampling rate
+            chorus_beat_positions (ndarray): beat positions of the chorus (in time)
+            beat_length (float): beat length of the provided BPM in sec
+            return_deviations (bool, default=False): return the deviation of every beat length too
 
         Returns:
         --------
-            bar_energies (ndarray): energy of each bar
+            large_deviation_indices (ndarray): indices of the beats whose length deviates more than 11 ms
+            length_deviations (ndarray): absolute beat length deviations in sec (if return_deviations)
     """
-   
-    bar_energies = []
-    for idx in range(len(bar_positions)-1):
-        
-        segment = track[int(fs*bar_positions[idx]):int(fs*bar_positions[idx+1])]
-
-        bar_energies.append(np.sum(np.square(segment)))
-        
-    return bar_energies
-
-
-def calculate_mean_cell_energies(bar_energies):
-    """
-    Calculates the mean energy for each cell (4 bars)
-    """    
-    cell_boundaries = np.arange(0, len(bar_energies)+1, 4)
-        
-    cell_energies = []
-    for i, j in enumerate(cell_boundaries[:-1]):
-        
-        start_idx = j
-        end_idx = cell_boundaries[i+1]
-                    
-        cell_energies.append(np.mean(bar_energies[start_idx:end_idx]))
-        
-    return cell_energies
-    
-
-def check_chorus_beat_grid(chorus_beat_positions, beat_length):
 
     rounded_beat_length = np.around(beat_length, 2)
 
@@ -178,4 +257,6 @@ def check_chorus_beat_grid(chorus_beat_positions, beat_length):
 
     large_deviation_indices = np.where(length_deviations > 0.011)[0]
     
+    if return_deviations:
+        return large_deviation_indices, length_deviations
     return large_deviation_indices
\ No newline at end of file
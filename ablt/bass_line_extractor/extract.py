@@ -7,12 +7,19 @@ import sys
 from .extractor_class import BassLineExtractor
 from ..utilities import exception_logger
 from ..directories import OUTPUT_DIR
+from ..constants import SEPARATOR_MODEL
 
 
 # TODO: track.track to track.audio ??
-def extract_single_bass_line(path, N_bars=4, separator=None, BPM=0):
+def extract_single_bass_line(path, N_bars=4, separator=None, BPM=0, low_memory=False, fixed_grid=False,
+                            separator_model=SEPARATOR_MODEL, chunk_workers=None, split_chorus=False):
     """
     Creates a Bass line_Extractor object for a track using the metadata provided. Extracts and Exports the Bass line.
+    In low memory mode the full rate track is dropped after beat tracking and only the chorus is decoded again.
+    With fixed_grid, a provided BPM is used for fitting a fixed beat grid instead of running the beat tracker.
+    If no separator is given, the shared separator_model is used. With chunk_workers, the chunks of the chorus
+    are separated in parallel for a lower single track latency. A chorus fits into a single demucs segment,
+    split_chorus shortens the segment so the workers share the chorus, at the cost of a different separation.
     """
 
     try:
@@ -24,12 +31,17 @@ def extract_single_bass_line(path, N_bars=4, separator=None, BPM=0):
         exception_dir = os.path.join(OUTPUT_DIR, "{}/exceptions/extraction".format(title))
 
         # Create the extractor
-        extractor = BassLineExtractor(path, N_bars=N_bars, separator=separator, BPM=BPM)
+        extractor = BassLineExtractor(path, N_bars=N_bars, separator=separator, BPM=BPM, low_memory=low_memory,
+                                                        fixed_grid=fixed_grid, separator_model=separator_model,
+                                                        chunk_workers=chunk_workers, split_chorus=split_chorus)
 
         # Estimate the Beat Positions and Export
         beat_positions = extractor.beat_detector.estimate_beat_positions(extractor.track.track)
         extractor.beat_detector.export_beat_positions() 
 
+        # Keep only a decimated copy of the track in low memory mode
+        extractor.track.release()
+
         # Estimate the Chorus Position and Export
         chorus_beat_positions = extractor.chorus_detector.estimate_chorus_position(beat_positions)         
         extractor.chorus_detector.export_chorus_start_beat_idx()            
@@ -6,23 +6,23 @@ import warnings
 
 import numpy as np
 from scipy.io.wavfile import write
+from scipy.signal import resample_poly
 
-from torch import tensor
-from librosa import load 
 from librosa.util import normalize
 
 # High Level Audio Processing
-from madmom.features.beats import RNNBeatProcessor, BeatTrackingProcessor # Beat Tracking
-from madmom.processors import SequentialProcessor
-
-from demucs.utils import apply_model
-from demucs.pretrained import load_pretrained
-
-from .chorus_estimation import drop_detection, check_chorus_beat_grid
-from ..signal_processing import lp_and_normalize
-from ..utilities import export_function
-
-from ..constants import FS, CUTOFF_FREQ
+from madmom.features.beats import BeatTrackingProcessor # Beat Tracking
+
+from .chorus_estimation import EnergyIndex, drop_detection, check_chorus_beat_grid
+from .beat_grid import onset_envelope, fit_beat_grid
+from .separation import separate_bass_line
+from ..signal_processing import decimate_lp_and_normalize, decimate_track
+from ..utilities import export_function, export_bass_line_fs
+from ..cache import load_audio, load_audio_segment, file_key
+from ..model_registry import get_separator, get_beat_activation_processor
+
+from ..constants import (FS, CUTOFF_FREQ, BASS_LINE_DECIMATION, ANALYSIS_DECIMATION, BPM_TOLERANCE, GRID_FIT_THRESHOLD,
+                         SEPARATOR_MODEL)
 from ..directories import OUTPUT_DIR
 
 warnings.filterwarnings('ignore') # ignore librosa .mp3 warnings
@@ -31,7 +31,8 @@ warnings.filterwarnings('ignore') # ignore librosa .mp3 warnings
 # TODO: wav writing the bassline and the chorus
 class BassLineExtractor:
     
-    def __init__(self, path, N_bars=4, separator=None, BPM=0):
+    def __init__(self, path, N_bars=4, separator=None, BPM=0, low_memory=False, fixed_grid=False,
+                separator_model=SEPARATOR_MODEL, chunk_workers=None, split_chorus=False):
         """
         Parameters:
         -----------
@@ -40,18 +41,28 @@ class BassLineExtractor:
             N_bars (int, default=4): Number of bars of bass line to extract
             separator (default=None): demucs Source Separator
             BPM (float, default=0):  track BPM (optional)
+            low_memory (bool, default=False): drop the full rate track after beat tracking and
+                                                decode only the chorus window again
+            fixed_grid (bool, default=False): if the BPM is provided, fit a fixed period beat grid instead of
+                                                running the beat tracker, which is still run on a poor fit
+            separator_model (str, default=SEPARATOR_MODEL): pretrained demucs model used if no separator is given
+            chunk_workers (int, default=None): separate the chunks of the chorus with this many threads,
+                                                give None for separating them one after another
+            split_chorus (bool, default=False): shorten the demucs segment so every chunk worker gets a part
+                                                of the chorus, changes the separation output
             
         """
         
         self.info = Info(path, BPM, FS, N_bars) # Track information class
         
-        self.track = Track(self.info) # Track holder class
+        self.track = Track(self.info, low_memory) # Track holder class
 
-        self.beat_detector = BeatDetector(self.info) # Beat Grid Former
+        self.beat_detector = BeatDetector(self.info, fixed_grid) # Beat Grid Former
         
         self.chorus_detector = ChorusDetector(self.info, self.track) # Chorus Detector
 
-        self.source_separator = SourceSeparator(self.info, separator) # Source Separator is configured
+        self.source_separator = SourceSeparator(self.info, separator, separator_model,
+                                                chunk_workers, split_chorus) # Source Separator is configured
 
 class Info:
     """
@@ -78,6 +89,7 @@ class Info:
         # Form the Export directories
         self.output_dir = os.path.join(OUTPUT_DIR, self.title)
         self.beatgrid_dir = os.path.join(self.output_dir, 'beat_grid')
+        self.beat_activations_dir = os.path.join(self.output_dir, 'beat_activations')
         self.chorus_dir = os.path.join(self.output_dir, 'chorus')
         self.bass_line_dir = os.path.join(self.output_dir, 'bass_line')
 
@@ -95,21 +107,58 @@ class Track:
     Track loader class. Loads and stores the track.
     """
           
-    def __init__(self, info):
+    def __init__(self, info, low_memory=False):
         
         print('Loading the track.')
-        self.track, self.fs = load(info.path, sr=info.fs, mono=True)
+        self.track, self.fs = load_audio(info.path, sr=info.fs, mono=True), info.fs
         self.info = info
+        self.low_memory = low_memory
+
+        # Drop detection runs on this copy, it is decimated when the full rate track is released
+        self.analysis_track, self.analysis_fs = self.track, self.fs
+
+    def release(self):
+        """
+        In low memory mode, keeps a decimated copy of the track for chorus analysis and drops the full rate track.
+        """
+
+        if self.low_memory and self.track is not None:
+            self.analysis_track = decimate_track(self.track, ANALYSIS_DECIMATION)
+            self.analysis_fs = self.fs / ANALYSIS_DECIMATION
+            self.track = None
+
+    def get_segment(self, start_idx, end_idx):
+        """
+        Returns the [start_idx, end_idx) samples of the full rate track, decoding them again if it was released.
+        """
+
+        if self.track is not None:
+            return self.track[start_idx:end_idx]
+        return load_audio_segment(self.info.path, self.fs, start_idx, end_idx)
 
 class BeatDetector:
     """
     BeatDetector class. Detects, stores and exports beat positions from a given track.
     """
     
-    def __init__(self, info):
+    def __init__(self, info, fixed_grid=False):
+        """
+            Parameters:
+            -----------
+                info (Info): Info class instance of the track.
+                fixed_grid (bool, default=False): if the BPM is provided, fit a fixed period beat grid to the
+                                onset envelope and only run the beat tracker when the fit is poor. If the grid
+                                can not be fitted at all, the tempo search of the tracker is restricted around
+                                the BPM.
+        """
 
         self.info = info
-        self.processor = SequentialProcessor([RNNBeatProcessor(), BeatTrackingProcessor(fps=100)])
+        self.fixed_grid = fixed_grid and info.BPM is not None
+        self.activation_processor = get_beat_activation_processor() # shared by all the detectors
+        self.tracking_processor = BeatTrackingProcessor(fps=100)
+        if self.fixed_grid:
+            self.restricted_tracking_processor = BeatTrackingProcessor(fps=100, min_bpm=info.BPM*(1-BPM_TOLERANCE),
+                                                                                max_bpm=info.BPM*(1+BPM_TOLERANCE))
           
     def estimate_beat_positions(self, track):
         """
@@ -125,9 +174,49 @@ class BeatDetector:
         """
 
         print('Finding the beat positions.')
-        self.beat_positions = self.processor(track)
+        tracking_processor = self.tracking_processor
+        if self.fixed_grid:
+            try:
+                beat_positions, quality = fit_beat_grid(onset_envelope(track, self.info.fs), self.info.BPM)
+            except Exception as ex: # the BPM is not contradicted, track the beats around it
+                print('Beat grid fit failed ({}: {}), tracking the beats around the BPM.'.format(type(ex).__name__, ex))
+                tracking_processor = self.restricted_tracking_processor
+            else:
+                if quality >= GRID_FIT_THRESHOLD:
+                    print('Fitted a fixed beat grid (quality: {:.2f}).'.format(quality))
+                    self.beat_positions = beat_positions
+                    return self.beat_positions
+                print('Poor beat grid fit (quality: {:.2f}), using the full beat tracker.'.format(quality))
+
+        activations = self.estimate_beat_activations(track)
+        self.beat_positions = tracking_processor(activations)
         return self.beat_positions
 
+    def estimate_beat_activations(self, track):
+        """
+        Computes the 100 fps RNN beat activation function and exports it. If the activations of the track were
+        exported before they are reused, so only the cheap beat tracking step runs again. The exported activations
+        are keyed by the title and the file_key of the track, a replaced track is processed again.
+
+            Parameters:
+            -----------
+                track (ndarray): 1D numpy array of the track, must have Fs=44100 for beat detection.
+
+            Returns:
+            --------
+                activations (ndarray): beat activation function
+        """
+
+        activations_name = '{}_{}'.format(self.info.title, file_key(self.info.path))
+        activations_path = os.path.join(self.info.beat_activations_dir, activations_name+'.npy')
+        if os.path.isfile(activations_path):
+            print('Using the exported beat activations.')
+            self.activations = np.load(activations_path)
+        else:
+            self.activations = self.activation_processor(track)
+            export_function(self.activations, self.info.beat_activations_dir, activations_name)
+        return self.activations
+
     def estimate_BPM(self, beat_positions):
         """
         Estimates the BPM using given beat positions. Recommended to use chorus beat positions.
@@ -159,11 +248,12 @@ class ChorusDetector:
     def __init__(self, info, track):
     
         self.info = info
-        self.track = track.track
+        self.track = track # Track holder
         self.fs = track.fs
+        self.energy_index = None # built once, reused by every drop detection
 
     # TODO: chorus epsilon parameter is different
-    def estimate_chorus_position(self, beat_positions, epsilon=2):
+    def estimate_chorus_position(self, beat_positions, epsilon=2, validate=False):
         """
         Estimates the chorus using the given beat positions.
 
@@ -171,11 +261,23 @@ class ChorusDetector:
             -----------
                 beat_positions (ndarray): beat positions in time
                 epsilon (int, default=2): adjusts the threshold parameter for drop picking.
+                validate (bool, default=False): compare the drop detection with the full rate low pass filter.
         """
 
         print('Estimating the Chorus position.')
 
-        drop_beat_idx, _ = drop_detection(self.track, beat_positions, self.fs, epsilon)
+        if self.energy_index is None:
+            # energies are scaled to the full rate, a decimated analysis track finds the same drops
+            self.energy_index = EnergyIndex.from_track(self.track.analysis_track, self.track.analysis_fs,
+                                                       reference_fs=self.info.fs)
+
+        # the full rate baseline needs the full rate track, it is decoded again if it was released
+        full_rate_track = None
+        if validate:
+            full_rate_track = self.track.track if self.track.track is not None else load_audio(self.info.path,
+                                                                                    sr=self.info.fs, mono=True)
+        drop_beat_idx, _ = drop_detection(None, beat_positions, self.track.analysis_fs, epsilon, self.energy_index,
+                                          full_rate_track, reference_fs=self.info.fs)
 
         self.chorus_start_beat_idx = drop_beat_idx
 
@@ -194,7 +296,7 @@ class ChorusDetector:
 
         start_time, end_time = self.chorus_beat_positions[0], self.chorus_beat_positions[-1]
         start_idx, end_idx = int(start_time*self.fs), int(end_time*self.fs)
-        self.chorus = self.track[start_idx:end_idx+1]
+        self.chorus = self.track.get_segment(start_idx, end_idx+1)
         return self.chorus
 
     def export_chorus_audio(self):
@@ -212,7 +314,11 @@ class ChorusDetector:
 
     def analyze_chorus_beats(self):
         assert self.info.BPM is not None, 'You must provide a BPM value for analyzing the extracted beat grid!'
-        if check_chorus_beat_grid(self.chorus_beat_positions, self.info.beat_length).size > 0:
+        deviation_indices, deviations = check_chorus_beat_grid(self.chorus_beat_positions, self.info.beat_length,
+                                                                return_deviations=True)
+        if deviation_indices.size > 0:
+            print('Deviations in the chorus beat grid at beats {} (max: {:.1f} ms).'.format(deviation_indices,
+                                                                            1000*deviations[deviation_indices].max()))
             export_function(self.chorus_beat_positions, self.info.chorus_beat_analysis_dir, self.info.title)        
     
 class SourceSeparator:
@@ -220,18 +326,26 @@ class SourceSeparator:
     SourceSeparator class. Separates the bass line from a given chorus array and processes it.
     """
     
-    def __init__(self, info, separator=None):
+    def __init__(self, info, separator=None, separator_model=SEPARATOR_MODEL, chunk_workers=None,
+                split_chorus=False):
         """
             Parameters:
             -----------
                 info (Info): Info class instance of the track.
-                separator (default=None): provide a Source separator or load demucs_extra pretrained. 
+                separator (default=None): provide a Source separator or use the shared separator_model. 
+                separator_model (str, default=SEPARATOR_MODEL): pretrained demucs model, one of SEPARATOR_MODELS
+                chunk_workers (int, default=None): number of threads separating the chunks of the chorus in
+                                                    parallel, give None for separating them sequentially
+                split_chorus (bool, default=False): shorten the demucs segment so every chunk worker gets a
+                                                    part of the chorus, changes the separation output
         """
         
         self.info = info
         if separator is None:
-            separator = load_pretrained('demucs_extra')
+            separator = get_separator(separator_model)
         self.separator = separator
+        self.chunk_workers = chunk_workers
+        self.split_chorus = split_chorus
 
     def separate_bass_line(self, chorus):
         """
@@ -246,37 +360,26 @@ class SourceSeparator:
         
         print('Separating the Bass Line.') 
 
-        # For demucs implementation
-        wav = np.stack([chorus]*2, axis=0)
-        ref = wav.mean(0)
-        wav = (wav - ref.mean()) / ref.std()
-        wav = tensor(wav)
-
-        sources = apply_model(self.separator,
-                            wav,
-                            shifts=0,
-                            split=True,
-                            overlap=0.25,
-                            progress=False)
-
-        sources = sources * ref.std() + ref.mean()
-
-        self.separated_bass_line = sources[1,:,:].numpy()       
+        self.separated_bass_line = separate_bass_line(self.separator, chorus, chunk_workers=self.chunk_workers,
+                                                      split_chorus=self.split_chorus, overlap=0.25)
 
     def process_bass_line(self):
         """
-        Converts the extracted bass line to mono, normalizes it, LP filters at B2 and normalizes again.
+        Converts the extracted bass line to mono, normalizes it, decimates it by BASS_LINE_DECIMATION, LP filters
+        at B2 and normalizes again.
         """
 
         bass_line_mono = np.mean(self.separated_bass_line, axis=0) # convert to mono
         bass_line_mono_normalized = normalize(bass_line_mono) # normalize bass line  
 
-        self.bass_line = lp_and_normalize(bass_line_mono_normalized, CUTOFF_FREQ, self.info.fs)
+        self.bass_line, self.bass_line_fs = decimate_lp_and_normalize(bass_line_mono_normalized, CUTOFF_FREQ,
+                                                                      self.info.fs, BASS_LINE_DECIMATION)
 
     def export_bass_line_array(self):
         print("Exporting the Bass Line.")
         export_function(self.bass_line, self.info.bass_line_dir, self.info.title) 
+        export_bass_line_fs(self.bass_line_fs, self.info.bass_line_dir)
 
     def export_bass_line_audio(self):
         wav_path = os.path.join(self.info.bass_line_dir, self.info.title+'_bassline.wav')
-        write(wav_path, FS, self.bass_line)        
\ No newline at end of file
+        write(wav_path, FS, resample_poly(self.bass_line, BASS_LINE_DECIMATION, 1)) # back to FS for listening        
\ No newline at end of file
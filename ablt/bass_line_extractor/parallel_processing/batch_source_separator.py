@@ -1,105 +1,130 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import numpy as np
-from torch import tensor
-
 from librosa.util import normalize
 
-from demucs.utils import apply_model # Source Separation
-from demucs.pretrained import load_pretrained
-
-from ...utilities import batch_export_function
-from ...signal_processing import lp_and_normalize
+from ..separation import separate_bass_line, separate_bass_lines_batch
+from ...utilities import batch_export_function, export_bass_line_fs
+from ...model_registry import get_separator
+from ...constants import SEPARATOR_MODEL, BASS_LINE_DECIMATION
+from ...signal_processing import decimate_lp_and_normalize
 
 class BatchSourceSeparator:
     """
     SourceSeparator class. Separates the bassline from a given chorus array and processes it.
     """
     
-    def __init__(self, info, separator=None, max_workers=None):
+    def __init__(self, info, separator=None, max_workers=None, batch_size=None, separator_model=SEPARATOR_MODEL):
         """
             Parameters:
             -----------
                 info (Info): Info class instance of the track.
-                separator (default=None): provide a Source separator or load demucs_extra pretrained.
+                separator (default=None): provide a Source separator or use the shared separator_model.
                 max_workers (int, default=None): number of workers for multithreading, give None for
                                                         letting the computer decide.
+                batch_size (int, default=None): separate the choruses together with this many chunks in each
+                                                        forward pass, give None for separating them one by one.
+                separator_model (str, default=SEPARATOR_MODEL): pretrained demucs model, one of SEPARATOR_MODELS
         """
         
         self.info = info
         if separator is None:
-            separator = load_pretrained('demucs_extra')
+            separator = get_separator(separator_model)
         self.separator = separator
         self.max_workers=max_workers
+        self.batch_size = batch_size
     
     def separate_basslines(self, chorus_dict):
         print('Separating Basslines...')
+
+        if self.batch_size is not None:
+            self.bassline_dict = self.separate_basslines_batched(chorus_dict)
+        else:
+            self.bassline_dict = self.separate_basslines_threaded(chorus_dict)
+
+        print('Done. (Separation)')
+
+    def separate_basslines_threaded(self, chorus_dict):
+        """Separates the choruses one by one using multithreading."""
         
         bassline_dict = {}
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor: 
-
-            for title, chorus in chorus_dict.items():
-                future = executor.submit(separate_single_bassline, chorus, self.separator, self.info.fs)
-                bassline_dict[title] = future.result()
+            futures = {executor.submit(separate_single_bassline, chorus, self.separator, self.info.fs): title
+                                                                        for title, chorus in chorus_dict.items()}
+            for future in as_completed(futures):
+                title = futures[future]
+                try:
+                    bassline_dict[title] = future.result()
+                except Exception as ex:
+                    self.info.add_failure(title, 'separation', ex)
         
-        self.bassline_dict = bassline_dict
-        print('Done. (Separation)')
+        return bassline_dict
+                    
+    def separate_basslines_batched(self, chorus_dict):
+        """
+        Separates all the choruses with batched forward passes. If the batch fails, the choruses are separated one
+        by one so a single bad chorus can be recorded as a failure.
+        """
+
+        titles = list(chorus_dict.keys())
+        try:
+            separated_basslines = separate_bass_lines_batch(self.separator, [chorus_dict[title] for title in titles],
+                                                            batch_size=self.batch_size)
+        except Exception as ex:
+            print('Batched separation failed ({}: {}), separating one by one.'.format(type(ex).__name__, ex))
+            return self.separate_basslines_threaded(chorus_dict)
+
+        bassline_dict = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor: 
+            futures = {executor.submit(process_bassline, separated_bassline, self.info.fs): title
+                                            for title, separated_bassline in zip(titles, separated_basslines)}
+            for future in as_completed(futures):
+                title = futures[future]
+                try:
+                    bassline_dict[title] = future.result()
+                except Exception as ex:
+                    self.info.add_failure(title, 'separation', ex)
+
+        return bassline_dict
                     
     def export_basslines(self):
         """ Exports and deletes the basslines from the BatchSourceSeparator"""
         batch_export_function(self.bassline_dict, self.info.directories['bassline'])
+        export_bass_line_fs(self.info.fs / BASS_LINE_DECIMATION, self.info.directories['bassline'])
         del self.bassline_dict
 
 
 def separate_single_bassline(chorus, separator, fs):
     """
-    Separates the bassline from a given chorus array.
+    Separates the bassline from a given chorus array, only the bass stem is kept.
 
         Parameters:
         -----------
             chorus (ndarray): chorus array
-
-    source_names = ["drums", "bass", "other", "vocals"]
+            separator: demucs model
+            fs (int): sampling rate of the chorus, the bassline is sampled at fs/BASS_LINE_DECIMATION
     """
 
-    chorus, mean, std = preprocess_chorus(chorus)
-
-    sources = apply_model(separator, chorus,
-                        shifts=0, split=True,
-                        overlap=0.25, progress=False)
-
-    sources = sources*std + mean
-
-    separated_bassline = sources[1,:,:].numpy()
+    separated_bassline = separate_bass_line(separator, chorus, overlap=0.25)
 
     processed_bassline = process_bassline(separated_bassline, fs)
     
     return processed_bassline
       
-        
-def preprocess_chorus(chorus, audio_channels=2):
-
-    if audio_channels == 2:
-        chorus = np.stack([chorus]*2, axis=0)            
-    ref = chorus.mean(0)
-    mean, std = ref.mean(), ref.std()
-    chorus = (chorus - mean) / std
-
-    return tensor(chorus), mean, std
-
 
 def process_bassline(separated_bassline, fs):
     """
-    Converts the extracted bassline to mono, normalizes it, LP filters at B2 and normalizes again.
+    Converts the extracted bassline to mono, normalizes it, decimates it by BASS_LINE_DECIMATION, LP filters at B2
+    and normalizes again.
     """
 
     bassline_mono = np.mean(separated_bassline, axis=0) # convert to mono
     bassline_mono_normalized = normalize(bassline_mono) # normalize bassline 
 
     fc = 130 # freq of B2 in Hz 
-    processed_bassline = lp_and_normalize(bassline_mono_normalized, fc, fs)
+    processed_bassline, _ = decimate_lp_and_normalize(bassline_mono_normalized, fc, fs, BASS_LINE_DECIMATION)
     
     return processed_bassline
\ No newline at end of file
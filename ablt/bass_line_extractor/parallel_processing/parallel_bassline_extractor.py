@@ -7,16 +7,20 @@ import gc
 import numpy as np
 from tqdm import tqdm
 
-from demucs.pretrained import load_pretrained
 
 from .parallel_extractor_classes import BatchBasslineExtractor
+from .parallel_madmom import BeatTrackingPool
 
 from ...utilities import exception_logger
+from ...cache import enable_caches
+from ...model_registry import get_separator, warm_up
+from ...constants import SEPARATOR_MODEL
 
 DIRECTORIES_JSON_PATH = 'data/directories.json'
 
 def extract_batch_basslines(titles, directories, date, fs=44100, N_bars=4, separator=None, track_dicts=None,
-                            thread_workers='auto', process_workers='auto'):
+                            thread_workers='auto', process_workers='auto', low_memory=False,
+                            beat_tracking_pool=None, fixed_grid=False, separation_batch_size=None):
     """
     Creates a Bassline_Extractor object for a batch of tracks using the metadata provided. Extracts and Exports the Bassline.
     """
@@ -26,7 +30,8 @@ def extract_batch_basslines(titles, directories, date, fs=44100, N_bars=4, separ
         init_folders(directories['extraction'])
 
         extractor = BatchBasslineExtractor(titles, directories, fs, N_bars, separator, track_dicts,
-                                            thread_workers, process_workers)
+                                            thread_workers, process_workers, low_memory, beat_tracking_pool,
+                                            fixed_grid, separation_batch_size)
 
         # Return the loaded tracks
         track_array_dict = extractor.track.load_tracks()
@@ -36,6 +41,8 @@ def extract_batch_basslines(titles, directories, date, fs=44100, N_bars=4, separ
         beat_positions_dict = extractor.beat_detector.estimate_beat_positions(track_array_dict)
         extractor.beat_detector.export_beat_positions() 
 
+        # Keep only decimated copies of the tracks in low memory mode
+        track_array_dict = extractor.track.release(track_array_dict)
 
         # Estimate the Chorus Positions and Extract
         extractor.chorus_detector.estimate_choruses(track_array_dict, beat_positions_dict)                    
@@ -51,6 +58,10 @@ def extract_batch_basslines(titles, directories, date, fs=44100, N_bars=4, separ
         # Export the basslines
         extractor.source_separator.export_basslines()
 
+        # Log the tracks that failed inside the batch
+        for title, failure in extractor.info.failures.items():
+            exception_logger(directories['extraction'], failure.exception, '{} ({})'.format(title, failure.stage))
+
         del chorus_dict
         del track_array_dict
         del beat_positions_dict
@@ -74,22 +85,35 @@ def extract_batch_basslines(titles, directories, date, fs=44100, N_bars=4, separ
         exception_logger(directories['extraction'], ex, date, '\n'.join(titles)) 
 
 
-def main(track_dicts_name, batch_size=6, thread_workers='auto', process_workers='auto'):
+def main(track_dicts_name, batch_size=6, thread_workers='auto', process_workers='auto', low_memory=False,
+        fixed_grid=False, separation_batch_size=None, separator_model=SEPARATOR_MODEL, quantize_separator=False,
+        traced_separator_path=None, cache=False):
     
     directories, _, track_dicts, track_titles, date = prepare(DIRECTORIES_JSON_PATH, track_dicts_name)
 
-    separator = load_pretrained('demucs_extra') # load demucs once at the beginning
+    if cache: # decoded audio and separated bass lines on disk
+        enable_caches(pyin=False)
+
+    # load the shared models once at the beginning
+    warm_up(separator_model, quantized=quantize_separator, traced_path=traced_separator_path)
+    separator = get_separator(separator_model, quantize_separator, traced_separator_path)
+
+    # beat tracking processes live through all the batches
+    beat_tracking_pool = BeatTrackingPool(batch_size if process_workers == 'batch' else process_workers)
 
     N_batches = len(track_titles) // batch_size
 
     start_time = time.time()
-    for batch_titles in tqdm(np.array_split(track_titles, N_batches)):
+    with beat_tracking_pool:
+        for batch_titles in tqdm(np.array_split(track_titles, N_batches)):
 
-        extract_batch_basslines(batch_titles, directories, date, separator=separator, track_dicts=track_dicts,
-                                thread_workers=thread_workers, process_workers=process_workers)
+            extract_batch_basslines(batch_titles, directories, date, separator=separator, track_dicts=track_dicts,
+                                    thread_workers=thread_workers, process_workers=process_workers,
+                                    low_memory=low_memory, beat_tracking_pool=beat_tracking_pool,
+                                    fixed_grid=fixed_grid, separation_batch_size=separation_batch_size)
 
-        with open('Completed_{}_{}.txt'.format(date, track_dicts_name.split('.json')[0]), 'a') as outfile:
-            outfile.write('\n'.join(batch_titles)+'\n')
+            with open('Completed_{}_{}.txt'.format(date, track_dicts_name.split('.json')[0]), 'a') as outfile:
+                outfile.write('\n'.join(batch_titles)+'\n')
 
     print('Total Run:', time.strftime("%H:%M:%S",time.gmtime(time.time() - start_time)))
 
@@ -2,27 +2,33 @@
 # coding: utf-8
 
 import os, sys
-import traceback
-from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import numpy as np
-from librosa import load 
 
-# High Level Audio Processing
-from madmom.features.beats import RNNBeatProcessor, BeatTrackingProcessor # Beat Tracking
-from madmom.processors import SequentialProcessor
+from madmom.features.beats import BeatTrackingProcessor # Beat Tracking
 
 from ..chorus_estimation import drop_detection, check_chorus_beat_grid
+from ..beat_grid import onset_envelope, fit_beat_grid
+from ...signal_processing import decimate_track
 from ...utilities import export_function, batch_export_function
+from ...cache import load_audio, load_audio_segment, file_key
+from ...constants import ANALYSIS_DECIMATION, BPM_TOLERANCE, GRID_FIT_THRESHOLD, SEPARATOR_MODEL
 
-from .parallel_madmom import process_batch
+from .parallel_madmom import BeatTrackingPool
 from .batch_source_separator import BatchSourceSeparator
 
+# Stage name and the exception of a track that failed inside a batch
+Failure = namedtuple('Failure', ['stage', 'exception'])
+
 
 class BatchBasslineExtractor:
     
     def __init__(self, titles, directories, fs=44100, N_bars=4, separator=None,
-                track_dicts=None, thread_workers='auto', process_workers='auto'):
+                track_dicts=None, thread_workers='auto', process_workers='auto', low_memory=False,
+                beat_tracking_pool=None, fixed_grid=False, separation_batch_size=None,
+                separator_model=SEPARATOR_MODEL):
         """
         Parameters:
         -----------
@@ -32,19 +38,29 @@ class BatchBasslineExtractor:
             fs (int): sampling rate
             N_bars (int, default=4): Number of bars of bassline to extract
             separator (default=None): demucs Source Separator
-            thread_workers (int, default='auto'): max workers for the track loader and the source separator
-                let the cpu decide or infer from the batch_size
+            thread_workers (int or str, default='auto'): max workers for the track loader, the chorus detector
+                and the source separator. Give an integer, 'auto' to let the cpu decide or 'batch' to infer
+                from the batch_size
             process_workers (int default='cpu'): max processes to create, give an integer of let the cpu decide 
+            low_memory (bool, default=False): drop the full rate tracks after beat tracking and
+                                                decode only the chorus windows again
+            beat_tracking_pool (BeatTrackingPool, default=None): a long lived pool for beat tracking, 
+                                                a temporary one is created for the batch if not provided
+            fixed_grid (bool, default=False): if the BPM values are provided, fit fixed period beat grids
+                                                and only track the beats of the tracks with a poor fit
+            separation_batch_size (int, default=None): separate the choruses with batched forward passes of
+                                                this many chunks, give None for separating them one by one
+            separator_model (str, default=SEPARATOR_MODEL): pretrained demucs model used if no separator is given
         """
         
-        assert thread_workers in ['auto', 'batch'], 'thread_workers must be decided by\
-                                                            the cpu or inferred from the batch_size'
+        assert isinstance(thread_workers, int) or thread_workers in ['auto', 'batch'], 'thread_workers must be\
+                                            an integer, decided by the cpu or inferred from the batch_size'
         assert process_workers in ['auto', 'batch'], 'process_workers must be decided by\
                                                              the cpu or inferred from the batch_size'
 
         if thread_workers == 'auto':
             thread_workers = None
-        else:
+        elif thread_workers == 'batch':
             thread_workers = len(titles)
 
         if process_workers != 'auto':
@@ -52,13 +68,15 @@ class BatchBasslineExtractor:
         
         self.info = BatchInfo(titles, directories['extraction'], fs, N_bars, track_dicts) # Track information class
         
-        self.track = BatchTracks(self.info, thread_workers) # Track holder class
+        self.track = BatchTracks(self.info, thread_workers, low_memory) # Track holder class
 
-        self.beat_detector = BatchBeatDetector(self.info, process_workers) # Beat Grid Former
+        self.beat_detector = BatchBeatDetector(self.info, process_workers, beat_tracking_pool,
+                                                fixed_grid, thread_workers) # Beat Grid Former
         
         self.chorus_detector = BatchChorusDetector(self.info, thread_workers) # Chorus Detector
 
-        self.source_separator = BatchSourceSeparator(self.info, separator, thread_workers) # Source Separator is configured
+        self.source_separator = BatchSourceSeparator(self.info, separator, thread_workers, separation_batch_size,
+                                                    separator_model) # Source Separator is configured
 
 
 class BatchInfo:
@@ -75,21 +93,30 @@ class BatchInfo:
         self.directories = sub_directories
         self.N_bars = N_bars # number of bars to consider a chorus     
         self.fs = fs
+        self.analysis_fs = fs # sampling rate of the tracks used in chorus analysis
 
         self.beat_lengths = None
         if track_dicts is not None: # if BPM value is provided
             self.beat_lengths={title: 60/int(track_dicts[title]['BPM']) for title in titles}
 
+        self.failures = {} # {title: Failure} tracks that failed at some stage of the batch
+
+    def add_failure(self, title, stage, ex):
+        """Records the failure of a track, the rest of the batch continues without it."""
+        print('{} failed on: {} ({}: {})'.format(stage.capitalize(), title, type(ex).__name__, ex))
+        self.failures[title] = Failure(stage, ex)
+
 
 class BatchTracks:
     """
     Track loader class. Loads and stores the tracks using Multithreading.
     """
           
-    def __init__(self, info, max_workers=None):
+    def __init__(self, info, max_workers=None, low_memory=False):
         
         self.info = info
         self.max_workers=max_workers
+        self.low_memory = low_memory
 
     def load_tracks(self):
         """
@@ -107,38 +134,65 @@ class BatchTracks:
         def loader(title, clip_dir, fs=44100):
             """ Loads a single track """
             path = os.path.join(clip_dir, title+'.mp3')
-            track, _ = load(path, sr=fs, mono=True)
-            track_tuple = (title, track)
-            return track_tuple
+            return load_audio(path, sr=fs, mono=True)
 
         print('\nLoading a batch of tracks...')
 
         track_array_dict = {}
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor: 
-            for title in self.info.titles:
+            futures = {executor.submit(loader, title, self.info.directories['clip'], self.info.fs): title
+                                                                                for title in self.info.titles}
+            for future in as_completed(futures):
+                title = futures[future]
                 try:
-                    future = executor.submit(loader, title, self.info.directories['clip'], self.info.fs)
-                    title, track = future.result()
-                    track_array_dict[title] = track
-                except FileNotFoundError:
-                    print('Track not Found: {}\nMoving to the next track.\n'.format(title))
+                    track_array_dict[title] = future.result()
                 except Exception as ex:
-                    print(''.join(traceback.format_exception(etype=type(ex), value=ex, tb=ex.__traceback__)))
+                    self.info.add_failure(title, 'loading', ex)
 
         print('Done. (Loading)\n')
         return track_array_dict
 
+    def release(self, track_array_dict):
+        """
+        In low memory mode, replaces the full rate tracks with decimated copies for chorus analysis.
+
+            Parameters:
+            -----------
+                track_array_dict ({title: ndarray}): full rate tracks
+
+            Returns:
+            --------
+                track_array_dict ({title: ndarray}): tracks sampled at info.analysis_fs
+        """
+
+        if not self.low_memory:
+            return track_array_dict
+
+        for title in list(track_array_dict.keys()):
+            track_array_dict[title] = decimate_track(track_array_dict[title], ANALYSIS_DECIMATION)
+        self.info.analysis_fs = self.info.fs / ANALYSIS_DECIMATION
+
+        return track_array_dict
+
 
 class BatchBeatDetector:
     """
     BeatDetector class. Detects, stores and exports beat positions from a given track.
     """
     
-    def __init__(self, info, max_workers='auto'):
+    def __init__(self, info, max_workers='auto', pool=None, fixed_grid=False, thread_workers=None):
 
         self.info = info
         self.max_workers = max_workers
-        self.processor = SequentialProcessor([RNNBeatProcessor(), BeatTrackingProcessor(fps=100)])
+        self.pool = pool # BeatTrackingPool
+        self.fixed_grid = fixed_grid and info.beat_lengths is not None
+        self.thread_workers = thread_workers # for fitting the beat grids
+        self.tracking_processor = BeatTrackingProcessor(fps=100)
+        self.unfitted_titles = set() # tracks whose beat grid could not be fitted, tracked around their BPM
+
+        # RNN beat activations are exported next to the beat positions and reused by later runs on the same files
+        self.activations_dir = self.info.directories['beat_grid'].get('beat_activations',
+                    os.path.join(os.path.dirname(self.info.directories['beat_grid']['beat_positions']), 'beat_activations'))
           
     def estimate_beat_positions(self, track_array_dict):
         """
@@ -153,10 +207,101 @@ class BatchBeatDetector:
         """
 
         print('Estimating the beat positions...')
-        self.beat_positions_dict = process_batch(self.processor, track_array_dict, self.max_workers)
+
+        beat_positions_dict = {}
+        if self.fixed_grid: # the beat tracker only runs for the tracks with a poor grid fit
+            beat_positions_dict = self.fit_beat_grids(track_array_dict)
+
+        # Only track the beats again for the tracks with exported activations
+        remaining_tracks = {}
+        for title, track in track_array_dict.items():
+            if title in beat_positions_dict:
+                continue
+            activations_path = os.path.join(self.activations_dir, self.activations_name(title)+'.npy')
+            if os.path.isfile(activations_path):
+                beat_positions_dict[title] = self.track_beats(title, np.load(activations_path))
+            else:
+                remaining_tracks[title] = track
+
+        if remaining_tracks:
+            # the workers track the beats around the BPM of the tracks whose grid could not be fitted
+            tempo_ranges = {title: self.tempo_range(title) for title in remaining_tracks
+                                                            if title in self.unfitted_titles}
+
+            if self.pool is not None:
+                results, failures = self.pool.process(remaining_tracks, tempo_ranges)
+            else:
+                with BeatTrackingPool(self.max_workers) as pool:
+                    results, failures = pool.process(remaining_tracks, tempo_ranges)
+
+            for title, (activations, beat_positions) in results.items():
+                export_function(activations, self.activations_dir, self.activations_name(title))
+                beat_positions_dict[title] = beat_positions
+            for title, ex in failures.items():
+                self.info.add_failure(title, 'beat tracking', ex)
+
+        self.beat_positions_dict = beat_positions_dict
         print('Done. (Beat Positions)')
         return self.beat_positions_dict
 
+    def activations_name(self, title):
+        """Returns the export name of the activations, keyed by the title and the file_key of the track."""
+        return '{}_{}'.format(title, file_key(os.path.join(self.info.directories['clip'], title+'.mp3')))
+
+    def track_beats(self, title, activations):
+        """
+        Tracks the beats from the activations. The tempo search is restricted around the BPM only if the beat grid
+        of the track could not be fitted, a poor fit falls back to the full tracker.
+        """
+
+        if title not in self.unfitted_titles:
+            return self.tracking_processor(activations)
+
+        min_bpm, max_bpm = self.tempo_range(title)
+        tracking_processor = BeatTrackingProcessor(fps=100, min_bpm=min_bpm, max_bpm=max_bpm)
+        return tracking_processor(activations)
+
+    def tempo_range(self, title):
+        """Returns the (min_bpm, max_bpm) tempo search range around the provided BPM of a track."""
+        BPM = 60/self.info.beat_lengths[title]
+        return BPM*(1-BPM_TOLERANCE), BPM*(1+BPM_TOLERANCE)
+
+    def fit_beat_grids(self, track_array_dict):
+        """
+        Fits fixed period beat grids to the onset envelopes of the tracks using the provided BPM values.
+
+            Parameters:
+            -----------
+                track_array_dict (dict): {title: ndarray} track dict
+
+            Returns:
+            --------
+                beat_positions_dict (dict): {title: ndarray} beat positions of the tracks with a good fit
+        """
+
+        def fit_single_grid(track, beat_length, fs):
+            return fit_beat_grid(onset_envelope(track, fs), 60/beat_length)
+
+        beat_positions_dict = {}
+        with ThreadPoolExecutor(self.thread_workers) as executor:
+            futures = {executor.submit(fit_single_grid, track, self.info.beat_lengths[title], self.info.fs): title
+                                                                    for title, track in track_array_dict.items()}
+            for future in as_completed(futures):
+                title = futures[future]
+                try:
+                    beat_positions, quality = future.result()
+                except Exception as ex: # the BPM is not contradicted, the beats are tracked around it
+                    print('Beat grid fit failed on: {} ({}: {})'.format(title, type(ex).__name__, ex))
+                    self.unfitted_titles.add(title)
+                    continue
+                if quality >= GRID_FIT_THRESHOLD:
+                    beat_positions_dict[title] = beat_positions
+                else:
+                    print('Poor beat grid fit (quality: {:.2f}) on: {}'.format(quality, title))
+
+        print('Fitted fixed beat grids for {}/{} tracks.'.format(len(beat_positions_dict), len(track_array_dict)))
+        return beat_positions_dict
+
     def export_beat_positions(self):
         """ Exports the beat positions and deletes them from the BeatDetector"""
         batch_export_function(self.beat_positions_dict, self.info.directories['beat_grid']['beat_positions'])
@@ -183,17 +328,23 @@ class BatchChorusDetector:
     def estimate_choruses(self, track_array_dict, beat_positions_dict):
         print('Estimating the Chorus positions...')
 
-        def estimate_single_chorus(track, beat_positions, fs, N_bars, epsilon=2):            
-            drop_beat_idx, _ = drop_detection(track, beat_positions, fs, epsilon)
+        def estimate_single_chorus(track, beat_positions, fs, N_bars, epsilon=2):
+            # energies are scaled to the full rate, the decimated low memory tracks find the same drops
+            drop_beat_idx, _ = drop_detection(track, beat_positions, fs, epsilon, reference_fs=self.info.fs)
             chorus_beat_positions = beat_positions[drop_beat_idx : drop_beat_idx+(N_bars*4)+1]
             return chorus_beat_positions
 
         chorus_estimates_dict = {}
         with ThreadPoolExecutor(self.max_workers) as executor: 
-            for title, track in track_array_dict.items():
-                future = executor.submit(estimate_single_chorus, track, beat_positions_dict[title],
-                                        self.info.fs, self.info.N_bars)
-                chorus_estimates_dict[title] = future.result()
+            futures = {executor.submit(estimate_single_chorus, track_array_dict[title], beat_positions,
+                                        self.info.analysis_fs, self.info.N_bars): title
+                                            for title, beat_positions in beat_positions_dict.items()}
+            for future in as_completed(futures):
+                title = futures[future]
+                try:
+                    chorus_estimates_dict[title] = future.result()
+                except Exception as ex:
+                    self.info.add_failure(title, 'chorus estimation', ex)
 
         self.chorus_estimates_dict = chorus_estimates_dict
         print('Done. (Chorus)\n')
@@ -203,10 +354,12 @@ class BatchChorusDetector:
 
     def analyze_chorus_beats(self):
         for title, chorus_beat_positions in self.chorus_estimates_dict.items():
-            deviation_indices = check_chorus_beat_grid(chorus_beat_positions, self.info.beat_lengths[title])
+            deviation_indices, deviations = check_chorus_beat_grid(chorus_beat_positions, self.info.beat_lengths[title],
+                                                                    return_deviations=True)
             if deviation_indices.size > 0:
                 export_function(deviation_indices, self.info.directories['chorus']['chorus_beat_analysis'], title)
-                print('Deviations in the chorus beat grid for:\n{}\n'.format(title))
+                print('Deviations in the chorus beat grid at beats {} (max: {:.1f} ms) for:\n{}\n'.format(
+                                            deviation_indices, 1000*deviations[deviation_indices].max(), title))
 
     def export_chorus_beat_positions(self):
         batch_export_function(self.chorus_estimates_dict, self.info.directories['chorus']['chorus_beat_positions'])
@@ -214,6 +367,7 @@ class BatchChorusDetector:
     def extract_choruses(self, track_array_dict):
         """
         Views the chorus from the loaded track given crorresponding beat positions in time.
+        If the full rate tracks were released, decodes only the chorus windows.
         """
         chorus_dict = {}
         for title, chorus_beat_positions in self.chorus_estimates_dict.items():
@@ -221,7 +375,11 @@ class BatchChorusDetector:
             start_time, end_time = chorus_beat_positions[0], chorus_beat_positions[-1]
             start_idx, end_idx = int(start_time*self.info.fs), int(end_time*self.info.fs)
 
-            chorus_dict[title] = track_array_dict[title][start_idx:end_idx+1]
+            if self.info.analysis_fs == self.info.fs:
+                chorus_dict[title] = track_array_dict[title][start_idx:end_idx+1]
+            else:
+                path = os.path.join(self.info.directories['clip'], title+'.mp3')
+                chorus_dict[title] = load_audio_segment(path, self.info.fs, start_idx, end_idx+1)
 
         self.chorus_dict = chorus_dict
         return chorus_dict
@@ -1,59 +1,129 @@
 import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
 
-class _ParallelProcess(mp.Process):
+import numpy as np
+
+# (RNNBeatProcessor, BeatTrackingProcessor) of a worker process, built once by the pool initializer
+_processors = None
+
+def _init_worker():
+    """Builds the madmom processors once for the lifetime of the worker process."""
+    global _processors
+
+    from madmom.features.beats import BeatTrackingProcessor
+    from ...model_registry import get_beat_activation_processor
+
+    _processors = (get_beat_activation_processor(), BeatTrackingProcessor(fps=100))
+
+def _track_beats(name, shape, dtype, tempo_range=None):
+    """
+    Estimates the beat activations and positions of a track that is stored in a shared memory segment. If a
+    (min_bpm, max_bpm) tempo_range is given, the tempo search of the beat tracker is restricted to it.
+    """
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        track = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        activations = _processors[0](track)
+        del track # release the buffer before closing
+    finally:
+        shm.close()
+
+    if tempo_range is None:
+        return activations, _processors[1](activations)
+
+    from madmom.features.beats import BeatTrackingProcessor
+
+    min_bpm, max_bpm = tempo_range
+    return activations, BeatTrackingProcessor(fps=100, min_bpm=min_bpm, max_bpm=max_bpm)(activations)
+
+
+class BeatTrackingPool:
+    """
+    Long lived pool of beat tracking processes. Each worker builds the madmom processors once and the tracks reach
+    the workers through shared memory, so only a segment name, shape and dtype cross the process boundary.
+    """
+
+    def __init__(self, num_workers='auto'):
+        """
+        Parameters:
+        -----------
+            num_workers (int, default='auto'): number of processes, give 'auto' for using all cpus
+        """
+
+        if num_workers == 'auto':
+            num_workers = mp.cpu_count()
+        print('Num workers: {}'.format(num_workers))
+
+        self.num_workers = num_workers
+
+        # workers share the parent's tracker, so the segments are only released by the parent
+        resource_tracker.ensure_running()
+        self.pool = mp.Pool(num_workers, initializer=_init_worker)
+
+    def process(self, track_array_dict, tempo_ranges=None):
+        """
+        Estimates the beat positions of a batch of tracks. Fs must be 44100!!!
+
+            Parameters:
+            -----------
+                track_array_dict (dict): {title: ndarray} track dict
+                tempo_ranges (dict, default=None): {title: (min_bpm, max_bpm)} restricts the tempo search of the
+                                                    beat tracker for the given tracks
+
+            Returns:
+            --------
+                results (dict): {title: (activations, beat_positions)} of the successful tracks
+                failures (dict): {title: Exception} tracks that failed in a worker
+        """
+
+        segments, async_results = [], {}
+        results, failures = {}, {}
+        try:
+            for title, track in track_array_dict.items():
+                track = np.asarray(track)
+
+                shm = shared_memory.SharedMemory(create=True, size=max(track.nbytes, 1))
+                segments.append(shm)
+
+                buffer = np.ndarray(track.shape, dtype=track.dtype, buffer=shm.buf)
+                buffer[:] = track
+                del buffer
+
+                tempo_range = tempo_ranges.get(title) if tempo_ranges is not None else None
+                async_results[title] = self.pool.apply_async(_track_beats, (shm.name, track.shape, track.dtype.str,
+                                                                            tempo_range))
+
+            # every submitted task is waited on, a result can not be missed
+            for title, async_result in async_results.items():
+                try:
+                    results[title] = async_result.get()
+                except Exception as ex:
+                    failures[title] = ex
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+
+        return results, failures
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def process_batch(files, num_workers):
     """
-    task_queue :
-        Queue with tasks, i.e. tuples ('processor', 'infile')
+    Estimates the beat positions of a batch of tracks with a temporary BeatTrackingPool.
+    Prefer keeping a BeatTrackingPool alive between batches.
     """
-    def __init__(self, task_queue, result_queue):
-        super(_ParallelProcess, self).__init__()
-        self.task_queue = task_queue
-        self.result_queue = result_queue
-        
-    def run(self):
-        """Process all tasks from the task queue and record in the result queue."""
-        while True:           
-            next_task = self.task_queue.get()
-            if next_task is None:
-                self.task_queue.task_done()
-                break
-            else:
-                # get the task tuple
-                processor, title, track =  next_task
-                answer = processor(track)
-                # signal that it is done
-                self.task_queue.task_done()
-                self.result_queue.put((title, answer))
-        return
-    
-def process_batch(processor, files, num_workers):
-    
-    if num_workers=='auto':
-        num_workers=mp.cpu_count()
-    print('Num workers: {}'.format(num_workers))
-
-    # create task and result queues
-    tasks = mp.JoinableQueue()
-    #results = mp.Queue()
-    results = mp.SimpleQueue()
-
-    # create working threads
-    processes = [_ParallelProcess(tasks, results) for _ in range(num_workers)]
-    
-    for p in processes: # start the processes
-        p.daemon = True
-        p.start()
-    for title, track in files.items():  # Enqueue jobs
-        tasks.put((processor, title, track))
-
-    for i in range(num_workers): # Add a poison pill for each consumer
-        tasks.put(None)
-    
-    tasks.join() # wait for all processing tasks to finish
-    
-    result_dict = {}
-    while not results.empty():
-        #result = results.get(block=False)
-        title, track = results.get()
-        result_dict[title] = track   
-    return result_dict
\ No newline at end of file
+
+    with BeatTrackingPool(num_workers) as pool:
+        results, failures = pool.process(files)
+    return {title: beat_positions for title, (_, beat_positions) in results.items()}, failures
@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch as th
+
+from demucs.utils import TensorChunk, center_trim, apply_model
+
+from ..cache import get_separation_cache, separation_key
+from ..model_registry import model_name
+
+
+def normalize_chorus(chorus, audio_channels=2):
+    """
+    Normalizes a mono chorus like the demucs reference mixture and repeats it on the audio channels as a
+    broadcast view, so the fake stereo input does not copy the samples.
+
+        Parameters:
+        -----------
+            chorus (ndarray): mono chorus array
+            audio_channels (int, default=2): number of audio channels of the separator
+
+        Returns:
+        --------
+            mix (Tensor): [C, T] read-only view of the normalized chorus
+            mean (float): mean of the chorus
+            std (float): standard deviation of the chorus
+    """
+
+    mean, std = chorus.mean(), chorus.std()
+    mix = th.from_numpy(np.ascontiguousarray((chorus - mean) / std, dtype=np.float32))
+    return mix.expand(audio_channels, -1), mean, std
+
+
+def apply_model_single_source(model, mix, source_idx, overlap=0.25, transition_power=1.):
+    """
+    Applies a demucs model to a mixture like demucs' apply_model(split=True, shifts=0), but keeps a single
+    source. The other sources are dropped as soon as each chunk is separated, so only a [C, T] output is
+    accumulated instead of the [S, C, T] one.
+
+        Parameters:
+        -----------
+            model: demucs model
+            mix (Tensor): [C, T] normalized mixture
+            source_idx (int): index of the source to keep in model.sources
+            overlap (float, default=0.25): overlap between the chunks
+            transition_power (float, default=1.): power of the triangular overlap-add weight
+
+        Returns:
+        --------
+            source (Tensor): [C, T] separated source
+    """
+
+    length = mix.shape[-1]
+    segment = model.segment_length
+    stride = int((1 - overlap) * segment)
+
+    weight = th.cat([th.arange(1, segment // 2 + 1), th.arange(segment - segment // 2, 0, -1)])
+    weight = (weight / weight.max())**transition_power
+
+    out = th.zeros(*mix.shape)
+    sum_weight = th.zeros(length)
+    for offset in range(0, length, stride):
+        chunk_out = apply_model(model, TensorChunk(mix, offset, segment))[source_idx]
+        chunk_length = chunk_out.shape[-1]
+        out[..., offset:offset+chunk_length] += weight[:chunk_length] * chunk_out
+        sum_weight[offset:offset+chunk_length] += weight[:chunk_length]
+
+    return out / sum_weight
+
+
+def separation_cache_key(separator, chorus, split, overlap):
+    """
+    Returns the separation cache and the key of the chorus, (None, None) if the cache is disabled or the
+    separator was not loaded through the model registry.
+    """
+
+    cache, name = get_separation_cache(), model_name(separator)
+    if cache is None or name is None:
+        return None, None
+    return cache, separation_key(chorus, name, shifts=0, split=split, overlap=overlap)
+
+
+def separate_bass_line(separator, chorus, chunk_workers=None, split_chorus=False, overlap=0.25, use_cache=True):
+    """
+    Separates the bass line of a mono chorus keeping only the bass stem. The chorus is normalized once, the
+    stereo input is a view of it and only the bass stem is scaled back. The raw stem is read from and written to
+    the separation cache.
+
+        Parameters:
+        -----------
+            separator: demucs model
+            chorus (ndarray): mono chorus array
+            chunk_workers (int, default=None): number of threads separating the chunks in parallel, give None for
+                                                separating them sequentially. A chorus that fits into a single
+                                                demucs segment is separated sequentially unless split_chorus.
+            split_chorus (bool, default=False): shorten the demucs segment so every chunk worker gets a chunk of
+                                                the chorus. The chunk boundaries change, so the output differs
+                                                from the sequential separation.
+            overlap (float, default=0.25): overlap between the chunks
+            use_cache (bool, default=True): check the separation cache first
+
+        Returns:
+        --------
+            separated_bass_line (ndarray): [C, T] separated bass line, read-only if it was cached
+    """
+
+    split_chorus = bool(chunk_workers and split_chorus)
+    split = 'workers{}'.format(chunk_workers) if split_chorus else 'segment'
+    cache, key = separation_cache_key(separator, chorus, split, overlap) if use_cache else (None, None)
+    if key is not None:
+        bass_line = cache.get(key)
+        if bass_line is not None:
+            return bass_line
+
+    mix, mean, std = normalize_chorus(chorus, separator.audio_channels)
+    bass_idx = separator.sources.index('bass')
+
+    stride = int((1 - overlap) * separator.segment_length)
+    if split_chorus or (chunk_workers and mix.shape[-1] > stride): # more than one chunk
+        bass_line = apply_model_parallel(separator, mix, num_workers=chunk_workers, overlap=overlap,
+                                         source_idx=bass_idx, split_among_workers=split_chorus)
+    else:
+        bass_line = apply_model_single_source(separator, mix, bass_idx, overlap=overlap)
+    bass_line = (bass_line * std + mean).numpy()
+
+    if key is not None:
+        cache.put(key, bass_line)
+    return bass_line
+
+
+def apply_model_batch(model, mixes, batch_size=8, overlap=0.25, transition_power=1., source_idx=None):
+    """
+    Applies a demucs model to several mixtures at once. Every mixture is split into segment_length chunks like
+    demucs' apply_model(split=True), the chunks of all the mixtures are padded to a common valid length and
+    stacked into [B, C, T] tensors, so each forward pass runs on batch_size chunks. The outputs are trimmed back
+    and overlap-added per mixture.
+
+    A chunk shorter than the longest one gets more zero padding than in apply_model, so the outputs can differ
+    slightly from the sequential separation.
+
+        Parameters:
+        -----------
+            model: demucs model
+            mixes (list): list of [C, T] normalized mixture tensors
+            batch_size (int, default=8): number of chunks in a forward pass
+            overlap (float, default=0.25): overlap between the chunks of a mixture
+            transition_power (float, default=1.): power of the triangular overlap-add weight
+            source_idx (int, default=None): keep only this source, give None for keeping all of them
+
+        Returns:
+        --------
+            sources (list): list of [S, C, T] separated source tensors, [C, T] if source_idx is given
+    """
+
+    segment = model.segment_length
+    stride = int((1 - overlap) * segment)
+
+    # triangle shaped weight, maximal in the middle of the segment
+    weight = th.cat([th.arange(1, segment // 2 + 1), th.arange(segment - segment // 2, 0, -1)])
+    weight = (weight / weight.max())**transition_power
+
+    chunks = [(idx, offset, TensorChunk(mix, offset, segment)) for idx, mix in enumerate(mixes)
+                                                                for offset in range(0, mix.shape[-1], stride)]
+    valid_length = model.valid_length(max(chunk.length for _, _, chunk in chunks))
+
+    n_sources = len(model.sources) if source_idx is None else 1
+    outs = [th.zeros(n_sources, *mix.shape) for mix in mixes]
+    sum_weights = [th.zeros(mix.shape[-1]) for mix in mixes]
+
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start+batch_size]
+        with th.no_grad():
+            batch_out = model(th.stack([chunk.padded(valid_length) for _, _, chunk in batch]))
+        if source_idx is not None:
+            batch_out = batch_out[:, source_idx:source_idx+1]
+
+        for (idx, offset, chunk), chunk_out in zip(batch, batch_out):
+            chunk_out = center_trim(chunk_out, chunk.length)
+            outs[idx][..., offset:offset+chunk.length] += weight[:chunk.length] * chunk_out
+            sum_weights[idx][offset:offset+chunk.length] += weight[:chunk.length]
+
+    if source_idx is not None:
+        outs = [out[0] for out in outs]
+    return [out / sum_weight for out, sum_weight in zip(outs, sum_weights)]
+
+
+def separate_bass_lines_batch(separator, choruses, batch_size=8, overlap=0.25, use_cache=True):
+    """
+    Separates the bass lines of a list of choruses with batched forward passes. Each chorus is normalized
+    separately like in the sequential separation and only the bass stems are kept. Only the choruses missing
+    from the separation cache are separated.
+
+        Parameters:
+        -----------
+            separator: demucs model
+            choruses (list): list of mono chorus arrays
+            batch_size (int, default=8): number of chunks in a forward pass
+            overlap (float, default=0.25): overlap between the chunks of a chorus
+            use_cache (bool, default=True): check the separation cache first
+
+        Returns:
+        --------
+            separated_bass_lines (list): list of [C, T] separated bass line arrays
+    """
+
+    separated_bass_lines = [None]*len(choruses)
+    keys = [None]*len(choruses)
+    for idx, chorus in enumerate(choruses):
+        cache, keys[idx] = separation_cache_key(separator, chorus, 'batch', overlap) if use_cache else (None, None)
+        if keys[idx] is not None:
+            separated_bass_lines[idx] = cache.get(keys[idx])
+
+    indices = [idx for idx, bass_line in enumerate(separated_bass_lines) if bass_line is None]
+    if not indices:
+        return separated_bass_lines
+
+    mixes, stats = [], []
+    for idx in indices:
+        mix, mean, std = normalize_chorus(choruses[idx], separator.audio_channels)
+        mixes.append(mix)
+        stats.append((mean, std))
+
+    bass_lines = apply_model_batch(separator, mixes, batch_size=batch_size, overlap=overlap,
+                                   source_idx=separator.sources.index('bass'))
+
+    for idx, bass_line, (mean, std) in zip(indices, bass_lines, stats):
+        separated_bass_lines[idx] = (bass_line * std + mean).numpy()
+        if keys[idx] is not None:
+            cache.put(keys[idx], separated_bass_lines[idx])
+
+    return separated_bass_lines
+
+
+def _apply_model_chunk(model, chunk, source_idx=None):
+    chunk_out = apply_model(model, chunk)
+    return chunk_out if source_idx is None else chunk_out[source_idx]
+
+
+def configure_chunk_threads(chunk_workers):
+    """
+    Bounds torch's intra-op thread count to cpu_count // chunk_workers, so the threads of apply_model_parallel
+    share the cores instead of oversubscribing them. The setting is process wide, call it once at startup and only
+    if the choruses are split among the workers. Otherwise a chorus is mostly a single chunk, which runs faster
+    with all of torch's threads.
+
+        Parameters:
+        -----------
+            chunk_workers (int): number of threads separating the chunks of a chorus
+
+        Returns:
+        --------
+            num_threads (int): torch intra-op threads
+    """
+
+    num_threads = max(1, (os.cpu_count() or 1) // chunk_workers)
+    th.set_num_threads(num_threads)
+    return num_threads
+
+
+def apply_model_parallel(model, mix, num_workers=None, segment=None, split_among_workers=False, min_duration=3.,
+                         overlap=0.25, transition_power=1., source_idx=None):
+    """
+    Applies a demucs model to a single mixture by dispatching its overlapping chunks to a thread pool. The chunk
+    outputs are overlap-added in offset order like apply_model. Torch's thread count is not changed here, bound
+    it once at startup with configure_chunk_threads.
+
+    By default the chunks are the demucs segments of apply_model, so the output is the sequential one. A chorus
+    is shorter than the 40 sec demucs segment though, with split_among_workers the segment is shortened to give
+    a chunk to each worker, but not below min_duration seconds. That changes the chunk boundaries and the
+    context of every chunk, so the output differs from apply_model.
+
+        Parameters:
+        -----------
+            model: demucs model
+            mix (Tensor): [C, T] normalized mixture
+            num_workers (int, default=None): number of threads, give None for the number of cpus
+            segment (int, default=None): chunk length in samples, give None for the demucs segment
+            split_among_workers (bool, default=False): if the segment is not given, shorten it to split the
+                                                        mixture among the workers
+            min_duration (float, default=3.): shortest chunk in seconds when splitting among the workers
+            overlap (float, default=0.25): overlap between the chunks
+            transition_power (float, default=1.): power of the triangular overlap-add weight
+            source_idx (int, default=None): keep only this source, give None for keeping all of them
+
+        Returns:
+        --------
+            sources (Tensor): [S, C, T] separated sources, [C, T] if source_idx is given
+    """
+
+    num_workers = num_workers or os.cpu_count() or 1
+
+    length = mix.shape[-1]
+    if segment is None:
+        segment = model.segment_length
+        if split_among_workers: # a chunk per worker
+            stride = int(np.ceil(length / num_workers))
+            segment = min(max(int(stride / (1 - overlap)), int(min_duration*model.samplerate)), length)
+    segment = min(segment, model.segment_length)
+    stride = int((1 - overlap) * segment)
+
+    weight = th.cat([th.arange(1, segment // 2 + 1), th.arange(segment - segment // 2, 0, -1)])
+    weight = (weight / weight.max())**transition_power
+
+    offsets = list(range(0, length, stride))
+
+    with ThreadPoolExecutor(max_workers=min(num_workers, len(offsets))) as executor:
+        futures = [executor.submit(_apply_model_chunk, model, TensorChunk(mix, offset, segment), source_idx)
+                                                                                        for offset in offsets]
+
+        out = th.zeros(*mix.shape) if source_idx is not None else th.zeros(len(model.sources), *mix.shape)
+        sum_weight = th.zeros(length)
+        for offset, future in zip(offsets, futures): # overlap-add in order
+            chunk_out = future.result()
+            chunk_length = chunk_out.shape[-1]
+            out[..., offset:offset+chunk_length] += weight[:chunk_length] * chunk_out
+            sum_weight[offset:offset+chunk_length] += weight[:chunk_length]
+
+    return out / sum_weight
+
+
+#-------------------------------------------------- Optimized Separators ------------------------------------------------------------
+
+def quantize_separator(separator):
+    """
+    Applies dynamic int8 quantization to the LSTM and the linear layers of a demucs model. The convolutions stay
+    in float, the returned copy keeps the attributes of the model (sources, samplerate, segment_length...).
+    """
+
+    return th.quantization.quantize_dynamic(separator, {th.nn.LSTM, th.nn.Linear}, dtype=th.qint8)
+
+
+class TracedSeparator:
+    """
+    TorchScript separator wrapper that can be used in place of a demucs model. The model is traced for a single
+    input length, so every chunk is padded to that length and the segment length is bounded by it.
+    """
+
+    def __init__(self, module, sources, samplerate, audio_channels, segment_length, input_length):
+        """
+        Parameters:
+        -----------
+            module (ScriptModule): traced demucs model
+            sources (list): source names
+            samplerate (int): sampling rate of the model
+            audio_channels (int): number of audio channels of the model
+            segment_length (int): longest chunk that fits into the traced input
+            input_length (int): traced input length
+        """
+
+        self.module = module
+        self.sources = sources
+        self.samplerate = samplerate
+        self.audio_channels = audio_channels
+        self.segment_length = segment_length
+        self.input_length = input_length
+
+    def valid_length(self, length):
+        assert length <= self.segment_length, 'The separator was traced for at most {} samples!'.format(
+                                                                                            self.segment_length)
+        return self.input_length
+
+    def __call__(self, mix):
+        # traced with a single item
+        return th.cat([self.module(mix[idx:idx+1]) for idx in range(mix.shape[0])])
+
+    def save(self, path):
+        """Serializes the traced model together with the model information."""
+        metadata = {'sources': self.sources, 'samplerate': self.samplerate, 'audio_channels': self.audio_channels,
+                    'segment_length': self.segment_length, 'input_length': self.input_length}
+        th.jit.save(self.module, path, _extra_files={'metadata.json': json.dumps(metadata)})
+
+    @classmethod
+    def load(cls, path):
+        """Loads a serialized traced separator."""
+        extra_files = {'metadata.json': ''}
+        module = th.jit.load(path, map_location='cpu', _extra_files=extra_files)
+        return cls(module, **json.loads(extra_files['metadata.json']))
+
+
+def trace_separator(separator, duration=20):
+    """
+    Traces a demucs model (float or quantized) with TorchScript for chunks of at most duration seconds.
+
+        Parameters:
+        -----------
+            separator: demucs model
+            duration (float, default=20): longest chunk in seconds, must cover the choruses
+
+        Returns:
+        --------
+            traced_separator (TracedSeparator): traced separator
+    """
+
+    segment_length = min(int(duration*separator.samplerate), separator.segment_length)
+    input_length = separator.valid_length(segment_length)
+
+    example = th.zeros(1, separator.audio_channels, input_length)
+    with th.no_grad():
+        module = th.jit.trace(separator, example, check_trace=False)
+
+    return TracedSeparator(module, list(separator.sources), separator.samplerate, separator.audio_channels,
+                            segment_length, input_length)
+
+
+def signal_to_distortion_ratio(reference, estimate):
+    """Returns the SDR of an estimate wrt. a reference in dB."""
+    error = np.sum(np.square(reference - estimate))
+    return 10*np.log10(np.sum(np.square(reference)) / max(error, 1e-12))
+
+
+def compare_separators(reference_separator, separator, choruses, batch_size=1):
+    """
+    Compares a separator with a reference separator (e.g. the float model) on the bass stems of the choruses.
+
+        Parameters:
+        -----------
+            reference_separator: demucs model
+            separator: optimized model (quantized, TracedSeparator...)
+            choruses (list): list of mono chorus arrays
+            batch_size (int, default=1): number of chunks in a forward pass
+
+        Returns:
+        --------
+            comparison (dict): reference and candidate s/chorus, speedup and the bass stem SDR (mean, min) in dB
+    """
+
+    start_time = time.time()
+    references = separate_bass_lines_batch(reference_separator, choruses, batch_size=batch_size, use_cache=False)
+    reference_duration = time.time() - start_time
+
+    start_time = time.time()
+    estimates = separate_bass_lines_batch(separator, choruses, batch_size=batch_size, use_cache=False)
+    duration = time.time() - start_time
+
+    SDRs = [signal_to_distortion_ratio(reference, estimate) for reference, estimate in zip(references, estimates)]
+
+    comparison = {'reference_s_per_chorus': reference_duration/len(choruses),
+                  's_per_chorus': duration/len(choruses),
+                  'speedup': reference_duration/duration,
+                  'bass_SDR_mean': float(np.mean(SDRs)),
+                  'bass_SDR_min': float(np.min(SDRs))}
+    return comparison
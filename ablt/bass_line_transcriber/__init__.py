@@ -1,2 +1,3 @@
 from .transcriber_class import BassLineTranscriber
-from .transcribe import transcribe_single_bass_line
\ No newline at end of file
+from .transcribe import transcribe_single_bass_line
+from .sweep import parameter_sweep
\ No newline at end of file
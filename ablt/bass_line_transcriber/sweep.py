@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import csv
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .transcription import (pYIN_estimate, semitone_YIN_estimate, threshold_F0, adaptive_voiced_region_quantization,
+                            uniform_voiced_region_quantization, frequency_to_midi_sequence,
+                            midi_sequence_to_midi_array)
+from ..utilities import get_chorus_beat_positions, get_quarter_beat_positions, get_bass_line_fs
+from ..cache import get_pyin_cache, configure_pyin_cache
+from ..directories import OUTPUT_DIR, SWEEP_DIR, PYIN_CACHE_DIR
+from ..constants import HOP_RATIO, M, PYIN_THRESHOLD, F0_ESTIMATORS
+
+# Parameters in the order of the stages that first use them
+SWEEP_PARAMETERS = ['F0_estimator', 'hop_ratio', 'pYIN_threshold', 'quantization_scheme', 'epsilon', 'M']
+
+# Parameters of the F0 estimate, the costly stage. The sweep is split over processes along them.
+UPSTREAM_PARAMETERS = SWEEP_PARAMETERS[:2]
+
+DEFAULT_GRID = {'F0_estimator': ['pYIN'],
+                'hop_ratio': [HOP_RATIO],
+                'pYIN_threshold': [PYIN_THRESHOLD],
+                'quantization_scheme': ['adaptive'],
+                'epsilon': [2],
+                'M': [M]}
+
+METRICS = ['voiced_ratio', 'N_notes', 'mean_note_length', 'N_pitches']
+
+
+class TranscriptionStages:
+    """
+    Memoized transcription stages of a single bass line. The stages form a chain:
+
+        F0 estimate -> pitch track -> quantized pitch track -> MIDI sequence -> MIDI array
+
+    and each one depends on a prefix of SWEEP_PARAMETERS. A stage output is stored under the values of that prefix,
+    so sweeping a parameter grid computes every stage once per distinct combination of its upstream parameters.
+    """
+
+    def __init__(self, bass_line_path, BPM, N_bars=4, silence_code=0):
+        """
+            Parameters:
+            -----------
+                bass_line_path (str): path to the bassline.npy
+                BPM (float, str): BPM of the track
+                N_bars (int, default=4): Number of bars to perform transcription on
+                silence_code (int, default=0): code integer to represent silent regions
+        """
+
+        self.title = os.path.splitext(os.path.basename(bass_line_path))[0]
+
+        self.bass_line = np.load(bass_line_path)
+        self.fs = get_bass_line_fs(os.path.dirname(bass_line_path))
+        self.beat_duration = 60/float(BPM) # in seconds
+        self.N_bars = N_bars
+        self.silence_code = silence_code
+
+        chorus_beat_positions = get_chorus_beat_positions(os.path.join(OUTPUT_DIR, self.title))
+        self.quarter_beat_positions = get_quarter_beat_positions(chorus_beat_positions)
+
+        self._outputs = {} # {(stage, parameter values): output}
+
+    def _memoize(self, stage, N_parameters, params, compute):
+        key = (stage,) + tuple(params[parameter] for parameter in SWEEP_PARAMETERS[:N_parameters])
+        if key not in self._outputs:
+            self._outputs[key] = compute()
+        return self._outputs[key]
+
+    def F0_estimate(self, params):
+        """(F0, confidence) at the F0 sample times."""
+
+        def compute():
+            estimate = pYIN_estimate if params['F0_estimator'] == 'pYIN' else semitone_YIN_estimate
+            return estimate(self.bass_line, self.beat_duration, params['hop_ratio'], fs=self.fs)
+
+        return self._memoize('F0_estimate', 2, params, compute)
+
+    def pitch_track(self, params):
+        """Confidence filtered (time_axis, F0)."""
+
+        def compute():
+            F0, confidence = self.F0_estimate(params)
+            _, pitch_track = threshold_F0(F0, confidence, params['pYIN_threshold'], self.beat_duration,
+                                          params['hop_ratio'], self.N_bars)
+            return pitch_track
+
+        return self._memoize('pitch_track', 3, params, compute)
+
+    def quantized_pitch_track(self, params):
+        """Quantized (time_axis, F0)."""
+
+        def compute():
+            if params['quantization_scheme'] == 'adaptive':
+                return adaptive_voiced_region_quantization(self.pitch_track(params), self.quarter_beat_positions,
+                                                           length_threshold=params['hop_ratio']//4,
+                                                           epsilon=params['epsilon'])
+            return uniform_voiced_region_quantization(self.pitch_track(params), params['epsilon'])
+
+        return self._memoize('quantized_pitch_track', 5, params, compute)
+
+    def midi_sequence(self, params):
+        compute = lambda: frequency_to_midi_sequence(self.quantized_pitch_track(params)[1], self.silence_code)
+        return self._memoize('midi_sequence', 5, params, compute)
+
+    def midi_array(self, params):
+        compute = lambda: midi_sequence_to_midi_array(self.midi_sequence(params), M=params['M'],
+                                                      N_qb=params['hop_ratio']//4, silence_code=self.silence_code)
+        return self._memoize('midi_array', 6, params, compute)
+
+    def metrics(self, params):
+        """
+        Returns a summary of the transcription:
+            voiced_ratio: ratio of the non-silent MIDI sequence samples
+            N_notes: number of notes in the MIDI array
+            mean_note_length: mean note length in beats
+            N_pitches: number of distinct MIDI numbers
+        """
+
+        midi_sequence, midi_array = self.midi_sequence(params), self.midi_array(params)
+        N_notes = len(midi_array)
+        return {'voiced_ratio': np.mean(midi_sequence != self.silence_code),
+                'N_notes': N_notes,
+                'mean_note_length': midi_array['duration'].mean() if N_notes else 0.0,
+                'N_pitches': len(np.unique(midi_array['midi_number']))}
+
+
+def parameter_combinations(grid):
+    """Returns the parameter dicts of a grid ordered like the stages, so consecutive ones share upstream stages."""
+
+    grid = {**DEFAULT_GRID, **grid}
+    return [dict(zip(SWEEP_PARAMETERS, values)) for values in itertools.product(*[grid[parameter]
+                                                                               for parameter in SWEEP_PARAMETERS])]
+
+
+def split_grid(grid):
+    """
+    Splits a grid into sub-grids with a single value of each of the UPSTREAM_PARAMETERS, so every sub-grid computes
+    a single F0 estimate.
+    """
+
+    grid = {**DEFAULT_GRID, **grid}
+    return [{**grid, **{parameter: [value] for parameter, value in zip(UPSTREAM_PARAMETERS, values)}}
+                                for values in itertools.product(*[grid[parameter] for parameter in UPSTREAM_PARAMETERS])]
+
+
+def sweep_bass_line(bass_line_path, BPM, grid, N_bars=4):
+    """
+    Evaluates the parameter grid on a single bass line.
+
+        Returns:
+        --------
+            rows (list): list of {title, parameters..., metrics...} dicts
+    """
+
+    stages = TranscriptionStages(bass_line_path, BPM, N_bars=N_bars)
+
+    rows = []
+    for params in parameter_combinations(grid):
+        rows.append({'title': stages.title, **params, **stages.metrics(params)})
+    return rows
+
+
+def parameter_sweep(bass_lines, grid=None, N_bars=4, max_workers=None, results_path=None):
+    """
+    Sweeps a parameter grid over bass lines and writes one results table. A task is a bass line and one combination
+    of the UPSTREAM_PARAMETERS, so a few bass lines with many F0 estimators or hop ratios still keep every process
+    busy. Each task evaluates its sub-grid reusing the stage outputs downstream of its F0 estimate. The raw pyin
+    outputs are also shared between sweeps through the pYIN cache if it is enabled.
+
+        Parameters:
+        -----------
+            bass_lines (dict): {bass_line_path: BPM}
+            grid (dict, default=None): {parameter: list of values} for any of SWEEP_PARAMETERS, the others are set to
+                                                DEFAULT_GRID. pYIN_threshold values can also be 'mean' or 'mean_reduced'.
+            N_bars (int, default=4): Number of bars to transcribe
+            max_workers (int, default=None): number of processes, give None for the number of cpus
+            results_path (str, default=None): path of the csv table, give None for a dated file in SWEEP_DIR
+
+        Returns:
+        --------
+            results_path (str): path of the results table
+            failures (dict): {bass_line_path: exception}
+    """
+
+    grid = grid or {}
+    unknown_parameters = set(grid) - set(SWEEP_PARAMETERS)
+    assert not unknown_parameters, 'Unknown sweep parameters: {}'.format(unknown_parameters)
+    combinations = parameter_combinations(grid)
+    for params in combinations:
+        assert params['F0_estimator'] in F0_ESTIMATORS, 'Choose an F0 estimator from {}!'.format(F0_ESTIMATORS)
+        assert params['quantization_scheme'] in ['adaptive', 'uniform'], \
+                                                                'Choose between adaptive and uniform quantization!'
+        assert not (params['hop_ratio']//4) % params['M'], 'M={} does not divide N_qb={}!'.format(params['M'],
+                                                                                              params['hop_ratio']//4)
+
+    if results_path is None:
+        os.makedirs(SWEEP_DIR, exist_ok=True)
+        results_path = os.path.join(SWEEP_DIR, 'sweep_{}.csv'.format(time.strftime("%m-%d_%H-%M-%S")))
+
+    print('Sweeping {} parameter combinations over {} bass lines.'.format(len(combinations), len(bass_lines)))
+    start_time = time.time()
+
+    # the worker processes use the pYIN cache of this process, if it is enabled
+    pyin_cache = get_pyin_cache()
+    cache_config = (pyin_cache.cache_dir, pyin_cache.max_bytes) if pyin_cache is not None else (PYIN_CACHE_DIR, 0)
+
+    tasks = [(path, BPM, sub_grid) for path, BPM in bass_lines.items() for sub_grid in split_grid(grid)]
+    task_rows, failures = [None]*len(tasks), {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=configure_pyin_cache,
+                             initargs=cache_config) as executor:
+        futures = {executor.submit(sweep_bass_line, path, BPM, sub_grid, N_bars): idx
+                                                                for idx, (path, BPM, sub_grid) in enumerate(tasks)}
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                task_rows[idx] = future.result()
+            except Exception as ex:
+                path = tasks[idx][0]
+                print('{}: {}: {}'.format(os.path.basename(path), type(ex).__name__, ex))
+                failures[path] = ex
+
+    # in the order of the bass lines and the parameter combinations
+    rows = [row for rows in task_rows if rows is not None for row in rows]
+    rows.sort(key=lambda row: row['title'])
+    with open(results_path, 'w', newline='') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=['title']+SWEEP_PARAMETERS+METRICS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print('Done in {:.1f} sec. {} rows written to {}'.format(time.time()-start_time, len(rows), results_path))
+
+    return results_path, failures
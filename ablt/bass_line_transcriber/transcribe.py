@@ -11,7 +11,7 @@ from ..directories import OUTPUT_DIR
 
 def transcribe_single_bass_line(path, BPM, M=M, N_bars=4, hop_ratio=HOP_RATIO,
                                 quantization_scheme='adaptive', epsilon=2,
-                                pYIN_threshold=PYIN_THRESHOLD):
+                                pYIN_threshold=PYIN_THRESHOLD, F0_estimator='pYIN', export_MIDI=True):
     """
         Parameters:
         -----------
@@ -23,6 +23,12 @@ def transcribe_single_bass_line(path, BPM, M=M, N_bars=4, hop_ratio=HOP_RATIO,
             quantization_scheme (str, default=adaptive): F0 quantization scheme
             epsilon (int): freq_bound = delta_scale/epsilon determines if quantization will happen.
             pYIN_threshold (float): Confidence level threshold for F0 estimation filtering.
+            F0_estimator (str, default='pYIN'): F0 estimator, one of F0_ESTIMATORS
+            export_MIDI (bool, default=True): write a MIDI file for each M, disable when batching the MIDI outputs
+
+        Returns:
+        --------
+            midi_arrays (dict): {M: midi_array} or None if the transcription failed
 
     """
 
@@ -37,11 +43,12 @@ def transcribe_single_bass_line(path, BPM, M=M, N_bars=4, hop_ratio=HOP_RATIO,
         bass_line_transcriber = BassLineTranscriber(path, BPM, M=M, N_bars=N_bars, hop_ratio=hop_ratio)
 
         # Pitch Track Extraction
-        bass_line_transcriber.extract_pitch_track(pYIN_threshold)
+        bass_line_transcriber.extract_pitch_track(pYIN_threshold, F0_estimator)
         bass_line_transcriber.quantize_pitch_track(epsilon, quantization_scheme)
         
         # Convert to MIDI pitches
         bass_line_transcriber.create_MIDI_sequence()
+        bass_line_transcriber.create_MIDI_arrays()
 
         # Exporting
         bass_line_transcriber.export_F0_estimate()
@@ -49,10 +56,13 @@ def transcribe_single_bass_line(path, BPM, M=M, N_bars=4, hop_ratio=HOP_RATIO,
         bass_line_transcriber.export_quantized_pitch_track()
 
         # MIDI reconstruction
-        bass_line_transcriber.export_MIDI_file()        
+        if export_MIDI:
+            bass_line_transcriber.export_MIDI_file()        
 
         print('Transcription complete.')
 
+        return bass_line_transcriber.midi_arrays
+
     except KeyboardInterrupt:
         sys.exit()
     except UnboundLocalError as u_ex:
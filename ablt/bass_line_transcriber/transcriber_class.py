@@ -5,18 +5,18 @@ import os
 
 import numpy as np
 
-from .transcription import (pYIN_F0, adaptive_voiced_region_quantization,
-                            uniform_voiced_region_quantization, midi_sequence_to_midi_array,
+from .transcription import (pYIN_F0, semitone_YIN_F0, adaptive_voiced_region_quantization,
+                            uniform_voiced_region_quantization, midi_sequence_to_midi_arrays,
                             frequency_to_midi_sequence)
-from ..utilities import (get_chorus_beat_positions, get_quarter_beat_positions, export_function)
+from ..utilities import (get_chorus_beat_positions, get_quarter_beat_positions, get_bass_line_fs, export_function)
 from ..MIDI_output import create_MIDI_file
 from ..directories import OUTPUT_DIR
-from ..constants import HOP_RATIO, M
+from ..constants import HOP_RATIO, M, F0_ESTIMATORS
 
 
 class BassLineTranscriber():
 
-    def __init__(self, bass_line_path, BPM, M=M, N_bars=4, hop_ratio=HOP_RATIO, silence_code=0):
+    def __init__(self, bass_line_path, BPM, M=M, N_bars=4, hop_ratio=HOP_RATIO, silence_code=0, fs=None):
         """
         BassLineTranscriber object for transcribing a chorus bassline.
 
@@ -29,6 +29,8 @@ class BassLineTranscriber():
                 N_bars (int, default=4): Number of bars to perform transcription on
                 hop_ratio (int, default=32): Number of F0 estimate samples that make up a beat
                 silence_code (int, default=0): code integer to represent silent regions
+                fs (float, default=None): sampling rate of the bassline, give None for reading it from the
+                                            bassline directory
         
         """
 
@@ -54,19 +56,32 @@ class BassLineTranscriber():
         self.quarter_beat_positions = get_quarter_beat_positions(chorus_beat_positions)
 
         self.bass_line = np.load(bass_line_path)
+        self.fs = fs if fs is not None else get_bass_line_fs(os.path.dirname(bass_line_path))
 
         self.silence_code = silence_code
 
-    def extract_pitch_track(self, pYIN_threshold=0.05):
+    def extract_pitch_track(self, pYIN_threshold=0.05, F0_estimator='pYIN'):
+        """
+            Parameters:
+            -----------
+                pYIN_threshold (float, default=0.05): Confidence level threshold for F0 estimation filtering
+                F0_estimator (str, default='pYIN'): 'pYIN' for librosa's pyin, 'semitone_YIN' for the YIN restricted
+                                                    to the sub-bass notes
+        """
+
+        assert F0_estimator in F0_ESTIMATORS, 'Choose an F0 estimator from {}!'.format(F0_ESTIMATORS)
 
         print('Starting the transcription process.')
 
+        estimate_F0 = pYIN_F0 if F0_estimator == 'pYIN' else semitone_YIN_F0
+
         #Initial estimate | Confidence Filtered
-        self.F0_estimate, self.pitch_track = pYIN_F0(self.bass_line,
-                                                    beat_duration=self.beat_duration,
-                                                    hop_ratio=self.hop_ratio,
-                                                    N_bars=self.N_bars,
-                                                    threshold=pYIN_threshold)                                             
+        self.F0_estimate, self.pitch_track = estimate_F0(self.bass_line,
+                                                        beat_duration=self.beat_duration,
+                                                        hop_ratio=self.hop_ratio,
+                                                        N_bars=self.N_bars,
+                                                        threshold=pYIN_threshold,
+                                                        fs=self.fs)                                             
 
     def quantize_pitch_track(self, epsilon, quantization_scheme="adaptive"):
 
@@ -83,15 +98,17 @@ class BassLineTranscriber():
     def create_MIDI_sequence(self):
         self.midi_sequence = frequency_to_midi_sequence(self.pitch_track_quantized[1], self.silence_code)
 
+    def create_MIDI_arrays(self):
+        # Downsample by each m
+        self.midi_arrays = midi_sequence_to_midi_arrays(self.midi_sequence,
+                                                        self.M,
+                                                        N_qb=self.N_qb,
+                                                        silence_code=self.silence_code)
+
     def export_MIDI_file(self):
 
         print('Creating the MIDI file.')
-        for m in self.M:
-            # Downsample by m and convert to a MIDI file
-            bass_line_midi_array = midi_sequence_to_midi_array(self.midi_sequence,
-                                                                M=m,
-                                                                N_qb=self.N_qb,
-                                                                silence_code=self.silence_code)                                                                                                                           
+        for m, bass_line_midi_array in self.midi_arrays.items():
             midi_dir = os.path.join(self.midi_dir, str(m))                                                    
             create_MIDI_file(bass_line_midi_array, self.BPM, self.title, midi_dir)        
 
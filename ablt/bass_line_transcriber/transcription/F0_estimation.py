@@ -7,49 +7,221 @@ from librosa import pyin
 from crepe import predict as crepe_predict
 
 from ...utilities import create_frequency_bins
-from ...constants import FS, FRAME_LEN, F_MAX, F_MIN, HOP_RATIO
+from ...cache import get_pyin_cache, pyin_key
+from ...constants import FS, FRAME_LEN, FRAME_FACTOR, T_MAX, F_MAX, F_MIN, HOP_RATIO, SUB_BASS_FREQUENCIES, YIN_THRESHOLD
+
+
+def pyin_frame_length(fs):
+    """
+    Returns the pYIN frame length at a sampling rate, FRAME_LEN at FS. At other rates the frame covers FRAME_FACTOR
+    periods of F_MIN, with a sample of margin so that the longest period still fits into the frame after the half
+    frame window.
+    """
+    if fs == FS:
+        return FRAME_LEN
+    return FRAME_FACTOR*(int(np.ceil(T_MAX*fs)) + 1)
+
+
+def raw_pYIN(audio, fs, hop_length, frame_length, use_cache=True):
+    """
+    Runs librosa's pyin between F_MIN and F_MAX through the pYIN cache.
+
+        Returns:
+        --------
+            F0 (ndarray): F0 estimate, 0 for unvoiced frames
+            voiced_flag (ndarray): voiced decisions of the HMM
+            voiced_probabilities (ndarray): confidence of each frame
+    """
+
+    cache = get_pyin_cache() if use_cache else None
+    if cache is not None:
+        key = pyin_key(audio, fs, hop_length, frame_length, F_MIN, F_MAX)
+        raw = cache.get(key)
+        if raw is not None:
+            return np.array(raw[0]), raw[1].astype(bool), np.array(raw[2])
+
+    F0, voiced_flag, voiced_probabilities = pyin(audio,
+                                                sr=fs,
+                                                frame_length=frame_length,
+                                                hop_length=hop_length,
+                                                fmin=F_MIN,
+                                                fmax=F_MAX,
+                                                fill_na=0.0)
+
+    if cache is not None:
+        cache.put(key, np.stack([F0, voiced_flag, voiced_probabilities]))
+    return F0, voiced_flag, voiced_probabilities
+
 
 # TODO: confidence filter with numpy features
-def pYIN_F0(audio, beat_duration, hop_ratio=HOP_RATIO, N_bars=4, threshold=0.05):
+def pYIN_F0(audio, beat_duration, hop_ratio=HOP_RATIO, N_bars=4, threshold=0.05, fs=FS, use_cache=True):
     """
         Params:
         -------
             beat_duration (float): Duration of a beat in seconds
             hop_ratio (int): Number of F0 samples that will make up a beat.
             N_bars (int, default=4): Number of chorus bars to transcribe.
+            fs (float, default=FS): Sampling rate of the audio, the frame and the hop lengths are scaled with it.
+            use_cache (bool, default=True): Read the raw pyin outputs from the pYIN cache when they were computed
+                                            before, so only the threshold and the quantization run again.
 
     """
 
-    hop_length = int((beat_duration/hop_ratio)*FS)
-    N_qb = int(hop_ratio/4) # Number of F0 samples a quarter beat includes
-    
-    F0, _, confidence = pyin(audio,
-                            sr=FS,
-                            frame_length=FRAME_LEN,
-                            hop_length=hop_length,
-                            fmin=F_MIN,
-                            fmax=F_MAX,
-                            fill_na=0.0)
+    F0, confidence = pYIN_estimate(audio, beat_duration, hop_ratio, fs, use_cache)
 
+    return threshold_F0(F0, confidence, threshold, beat_duration, hop_ratio, N_bars)
 
-    if threshold == 'mean':
-        threshold = np.mean(confidence)
-    elif threshold == 'mean_reduced':
-        threshold = np.mean(confidence) - np.std(confidence)/2
-    else:
-        assert threshold < 1.0 and threshold >= 0, 'Threshold must be in [0, 1)'
+
+def pYIN_estimate(audio, beat_duration, hop_ratio=HOP_RATIO, fs=FS, use_cache=True):
+    """
+    Returns the pyin F0 estimate and the voiced probabilities at the F0 sample times, before the confidence
+    filtering.
+    """
+
+    hop = (beat_duration/hop_ratio)*fs # exact hop in samples
+    hop_length = max(int(hop), 1)
+    
+    F0, _, confidence = raw_pYIN(audio, fs, hop_length, pyin_frame_length(fs), use_cache=use_cache)
+
+    # The integer hop length drifts from the beat grid, which is noticeable at low sampling rates. 
+    # Keep the frames that are the closest to the exact F0 sample times.
+    if fs != FS:
+        frame_indices = np.rint(np.arange(int(len(F0)*hop_length/hop)) * (hop/hop_length)).astype(int)
+        frame_indices = np.minimum(frame_indices, len(F0)-1)
+        F0, confidence = F0[frame_indices], confidence[frame_indices]
 
     F0 = np.round(F0, 2) # round to 2 decimals
 
+    return F0, confidence
+
+
+def semitone_YIN_F0(audio, beat_duration, hop_ratio=HOP_RATIO, N_bars=4, threshold=0.05, fs=FS, n_neighbors=1,
+                    yin_threshold=YIN_THRESHOLD):
+    """
+    YIN estimator restricted to the SUB_BASS_FREQUENCIES. The cumulative mean normalized difference function is
+    only computed at the lags of the notes and n_neighbors lags around each of them, for all the frames at once.
+    The cumulative mean at a lag is obtained from cumulative sums of the frame, so the other lags are not needed.
+    Each lag is assigned to its closest note. Like the absolute threshold step of YIN, the local minimum that follows
+    the highest note whose difference falls below yin_threshold is chosen, the global minimum otherwise.
+
+        Params:
+        -------
+            beat_duration (float): Duration of a beat in seconds
+            hop_ratio (int): Number of F0 samples that will make up a beat.
+            N_bars (int, default=4): Number of chorus bars to transcribe.
+            threshold (float or str, default=0.05): Confidence level filtering threshold, 'mean' or 'mean_reduced'
+            fs (float, default=FS): Sampling rate of the audio.
+            n_neighbors (int, default=1): Number of lags around the period of each note.
+            yin_threshold (float, default=YIN_THRESHOLD): Absolute threshold of the normalized difference.
+
+        Returns:
+        --------
+            F0_estimate (tuple): (time_axis, F0) note frequencies, 0 for silence
+            pitch_track (tuple): (time_axis, F0) confidence filtered F0
+    """
+
+    F0, confidence = semitone_YIN_estimate(audio, beat_duration, hop_ratio, fs, n_neighbors, yin_threshold)
+
+    return threshold_F0(F0, confidence, threshold, beat_duration, hop_ratio, N_bars)
+
+
+def semitone_YIN_estimate(audio, beat_duration, hop_ratio=HOP_RATIO, fs=FS, n_neighbors=1,
+                          yin_threshold=YIN_THRESHOLD):
+    """
+    Returns the semitone grid YIN F0 estimate and its confidence at the F0 sample times, before the confidence
+    filtering.
+    """
+
+    hop = (beat_duration/hop_ratio)*fs # exact hop in samples
+
+    # Candidate lags and their notes
+    periods = fs / SUB_BASS_FREQUENCIES
+    lags = np.unique(np.rint(periods[:, None]).astype(int) + np.arange(-n_neighbors, n_neighbors+1)) # ascending
+    lags = lags[lags > 0]
+    lag_notes = np.argmin(np.abs(np.log2(periods[None, :] / lags[:, None])), axis=1) # descending
+    note_starts = np.flatnonzero(np.diff(lag_notes, prepend=-1)) # groups of lags of each note
+    notes = lag_notes[note_starts]
+
+    # Frames at the exact F0 sample times
+    W = pyin_frame_length(fs) // 2 # integration window
+    N = W + lags[-1] + 1
+    n_frames = 1 + int(len(audio)/hop)
+    audio = np.pad(np.asarray(audio, dtype=np.float64), (W//2, N)) # integration windows centered at the frames
+    starts = np.rint(np.arange(n_frames)*hop).astype(int)
+    frames = audio[starts[:, None] + np.arange(N)] # [n_frames, N]
+
+    # Cumulative sums with a leading 0
+    C = np.pad(np.cumsum(frames, axis=1), ((0, 0), (1, 0))) # of the samples
+    Q = np.pad(np.cumsum(frames**2, axis=1), ((0, 0), (1, 0))) # of the energy
+    P = np.pad(np.cumsum(Q, axis=1), ((0, 0), (1, 0))) # of the energy cumsum
+
+    x = frames[:, :W]
+    E_0 = Q[:, W] - Q[:, 0]
+    xC_0 = np.einsum('ij,ij->i', x, C[:, 1:W+1])
+
+    cmndf = np.empty((n_frames, len(lags)))
+    for idx, tau in enumerate(lags):
+        r = np.einsum('ij,ij->i', x, frames[:, tau:tau+W]) # autocorrelation
+        d = E_0 + Q[:, tau+W] - Q[:, tau] - 2*r # difference function
+        # sum of the difference function over the lags 1..tau
+        D = (tau*E_0 + (P[:, tau+W+1] - P[:, W+1]) - (P[:, tau+1] - P[:, 1])
+                                                            - 2*(np.einsum('ij,ij->i', x, C[:, tau+1:tau+1+W]) - xC_0))
+        cmndf[:, idx] = np.divide(d*tau, D, out=np.ones(n_frames), where=D > 0)
+
+    note_cmndf = np.minimum.reduceat(cmndf, note_starts, axis=1) # [n_frames, n_notes], notes descending
+
+    # the first note below the threshold, then down to the next local minimum
+    below = note_cmndf < yin_threshold
+    first_below = np.argmax(below, axis=1)
+    local_minima = np.append(note_cmndf[:, :-1] <= note_cmndf[:, 1:], np.ones((n_frames, 1), dtype=bool), axis=1)
+    local_minima &= np.arange(len(notes)) >= first_below[:, None]
+    choice = np.where(below.any(axis=1), np.argmax(local_minima, axis=1), np.argmin(note_cmndf, axis=1))
+
+    F0 = SUB_BASS_FREQUENCIES[notes[choice]]
+    # 1 for a perfectly periodic frame, 0 from twice the absolute threshold on
+    confidence = np.clip(1 - note_cmndf[np.arange(n_frames), choice]/(2*yin_threshold), 0, 1)
+
+    return F0, confidence
+
+
+def threshold_F0(F0, confidence, threshold, beat_duration, hop_ratio=HOP_RATIO, N_bars=4):
+    """
+    Fits the F0 estimate to N_bars and silences the samples whose confidence is below the threshold.
+
+        Returns:
+        --------
+            F0_estimate (tuple): (time_axis, F0)
+            pitch_track (tuple): (time_axis, F0) confidence filtered F0
+    """
+
+    N_qb = int(hop_ratio/4) # Number of F0 samples a quarter beat includes
+
+    threshold = confidence_threshold(confidence, threshold)
+
     F0 = ensure_sequence_length(F0, N_qb=N_qb, N_bars=N_bars)
+    confidence = ensure_sequence_length(confidence, N_qb=N_qb, N_bars=N_bars)
 
     F0_filtered = confidence_filter(F0, confidence, threshold)
 
-    time_axis = np.arange(len(F0_filtered)) * (hop_length/FS)
+    time_axis = np.arange(len(F0_filtered)) * (beat_duration/hop_ratio)
 
     return (time_axis, F0), (time_axis, F0_filtered)
 
 
+def confidence_threshold(confidence, threshold):
+    """
+    Returns the confidence filtering threshold, threshold can be a value in [0, 1), 'mean' or 'mean_reduced'.
+    """
+
+    if threshold == 'mean':
+        threshold = np.mean(confidence)
+    elif threshold == 'mean_reduced':
+        threshold = np.mean(confidence) - np.std(confidence)/2
+    else:
+        assert threshold < 1.0 and threshold >= 0, 'Threshold must be in [0, 1)'
+    return threshold
+
+
 def confidence_filter(F0, confidence, threshold):
     """
     Silences the time instants where the model confidence is below the given threshold.
@@ -7,6 +7,11 @@ import numpy as np
 
 warnings.filterwarnings('ignore') 
 
+# A row of a midi array
+MIDI_NOTE_DTYPE = np.dtype([('start_beat', np.float64), ('midi_number', np.int16), ('velocity', np.uint8),
+                            ('duration', np.float64)])
+
+
 # TODO REPLACE zeros prior for warning handling.
 def frequency_to_midi_sequence(F0, silence_code=0):
     """
@@ -29,46 +34,106 @@ def frequency_to_midi_sequence(F0, silence_code=0):
     return midi_seq
 
 
-def midi_sequence_to_midi_array(midi_seq, M, N_qb=8, silence_code=0, velocity=120):
+def run_length_encoding(midi_seq):
     """
-    Downsamples and extracts onset, note, velocity and note length information from a sequence of midi picthes.
+    Finds the runs of equal midi numbers.
 
         Parameters:
         -----------
             midi_seq (ndarray): midi number sequence
-            M (int): decimation rate between 1 and N_qb
+
+        Returns:
+        --------
+            run_starts (ndarray): start index of each run, followed by len(midi_seq)
+            run_values (ndarray): midi number of each run
+    """
+
+    midi_seq = np.asarray(midi_seq)
+    run_starts = np.flatnonzero(np.diff(midi_seq)) + 1
+    run_starts = np.concatenate(([0], run_starts, [len(midi_seq)]))
+
+    return run_starts, midi_seq[run_starts[:-1]]
+
+
+def midi_sequence_to_midi_arrays(midi_seq, Ms, N_qb=8, silence_code=0, velocity=120):
+    """
+    Extracts onset, note, velocity and note length information from a sequence of midi pitches for several
+    decimation rates with a single run-length encoding. Decimating by M keeps the samples 0, M, 2M..., so a run
+    [a, b) of the full rate sequence becomes the decimated run [ceil(a/M), ceil(b/M)). Runs that vanish are dropped
+    and the neighbouring runs with equal notes are joined.
+
+        Parameters:
+        -----------
+            midi_seq (ndarray): midi number sequence
+            Ms (list): decimation rates between 1 and N_qb
             N_qb (int, default=8): number of samples a quarterbeat gets
             silence_code (int, default=0): A code int representing silences
             velocity (int, default=120): velocity of a midi note 
 
         Returns:
         --------
-            midi_array (ndarray): numpy array of [[start_beat, midi number, velocity, duration]]
+            midi_arrays (dict): {M: midi_array} where midi_array is a MIDI_NOTE_DTYPE structured array of
+                                (start_beat, midi_number, velocity, duration)
     """
 
-    midi_seq = downsample_midi_sequence(midi_seq, M=M, N_qb=N_qb)
-    
-    # Number of samples in the midi_seq corresponding to a beat
-    hop_ratio = 4*(N_qb//M)
+    run_starts, run_values = run_length_encoding(midi_seq)
+
+    midi_arrays = {}
+    for M in Ms:
+
+        assert M <= N_qb and M >= 1, 'Decimation rate must be smaller than N_qb={} points (quarter beat length)'.format(
+            N_qb)
+        assert not N_qb % M, 'N_qb must be divisble by the decimation rate!'
+
+        # Number of samples in the decimated midi_seq corresponding to a beat
+        hop_ratio = 4*(N_qb//M)
 
-    # adjust the beginning and the end of the loop
-    change_indices = np.where(np.diff(midi_seq) != 0)[0]
-    change_indices = np.insert(change_indices, [0, len(change_indices)], [-1, len(midi_seq)-1])
-    note_lengths = np.diff(change_indices) / hop_ratio  # normalize to beats
+        # snap the run boundaries to the decimated samples, drop the vanishing runs
+        boundaries = -(-run_starts // M)
+        survivors = np.flatnonzero(np.diff(boundaries) > 0)
+        starts, values = boundaries[survivors], run_values[survivors]
 
-    midi_array = []
-    for i, j in enumerate(change_indices[:-1]):
-        start_idx = j+1
-        note = midi_seq[start_idx]
-        if note != silence_code:  # non-zero notes only
-            midi_array.append([start_idx/hop_ratio, note, velocity, note_lengths[i]])
+        # join the runs that became neighbours
+        onsets = np.concatenate(([True], values[1:] != values[:-1]))
+        starts, values = starts[onsets], values[onsets]
+        ends = np.append(starts[1:], boundaries[-1])
+
+        notes = values != silence_code # non-zero notes only
+
+        midi_array = np.empty(np.count_nonzero(notes), dtype=MIDI_NOTE_DTYPE)
+        midi_array['start_beat'] = starts[notes] / hop_ratio
+        midi_array['midi_number'] = values[notes]
+        midi_array['velocity'] = velocity
+        midi_array['duration'] = (ends - starts)[notes] / hop_ratio  # normalize to beats
+
+        midi_arrays[M] = midi_array
+
+    return midi_arrays
+
+
+def midi_sequence_to_midi_array(midi_seq, M, N_qb=8, silence_code=0, velocity=120):
+    """
+    Downsamples and extracts onset, note, velocity and note length information from a sequence of midi picthes.
+
+        Parameters:
+        -----------
+            midi_seq (ndarray): midi number sequence
+            M (int): decimation rate between 1 and N_qb
+            N_qb (int, default=8): number of samples a quarterbeat gets
+            silence_code (int, default=0): A code int representing silences
+            velocity (int, default=120): velocity of a midi note 
+
+        Returns:
+        --------
+            midi_array (ndarray): MIDI_NOTE_DTYPE structured array of (start_beat, midi_number, velocity, duration)
+    """
 
-    return np.array(midi_array)
+    return midi_sequence_to_midi_arrays(midi_seq, [M], N_qb=N_qb, silence_code=silence_code, velocity=velocity)[M]
 
 
 def downsample_midi_sequence(midi_seq, M,  N_qb=8):
     """
-    Downsamples a given midi number sequence uniformly.
+    Downsamples given midi number sequence(s) uniformly along the last axis.
 
         Parameters:
         -----------
@@ -86,6 +151,6 @@ def downsample_midi_sequence(midi_seq, M,  N_qb=8):
     assert not N_qb % M, 'N_qb must be divisble by the decimation rate!'
 
     # Downsample
-    midi_seq_decimated = midi_seq[np.arange(0, len(midi_seq), M, dtype=int)]
+    midi_seq_decimated = midi_seq[..., ::M].copy()
 
     return midi_seq_decimated
\ No newline at end of file
@@ -5,12 +5,15 @@ from collections import Counter
 
 import numpy as np
 
-from ....utilities import sample_and_hold
+from .segmentation import RegionSet
 from ....constants import SUB_BASS_FREQUENCIES
 
-# TODO: equal votes in majority voting
+# Note table of the frequency quantization
+NOTE_FREQUENCIES = np.asarray(SUB_BASS_FREQUENCIES)
+NOTE_SPACING = np.min(np.diff(NOTE_FREQUENCIES)) # smallest distance between two notes
 
-def uniform_quantization(pitch_track, segments, epsilon=2):
+
+def uniform_quantization(pitch_track, regions, epsilon=2):
     """
     Uniformly quantizes each given segment independently.
 
@@ -18,7 +21,7 @@ def uniform_quantization(pitch_track, segments, epsilon=2):
         -----------
 
             pitch_track (tupple): (time_axis, F0) where both are np.ndarray
-            segments(tupple): voiced region (boundaries, lengths, indices)
+            regions (RegionSet): regions to be quantized
             epsilon (int, default=2): freq_bound = delta_scale/epsilon determines if quantization will happen.
         
         Returns:
@@ -28,25 +31,51 @@ def uniform_quantization(pitch_track, segments, epsilon=2):
 
     """
 
-    boundaries, lengths, indices = segments
-
-    # Form the Pitch Histogram and Do Majority Voting for each region independently
-    pitch_histograms = create_pitch_histograms(pitch_track[1], boundaries, epsilon)
-    majority_pitches = get_majority_pitches(pitch_histograms)    
-
-    #Quantize Each Region
-    quantized_non_zero_frequencies = sample_and_hold(majority_pitches,  lengths)
-    assert len(indices) == len(quantized_non_zero_frequencies), 'Hold lengths do not match'
+    # Quantize the frequencies and do majority voting for each region independently
+    majority_pitches = region_majority_pitches(pitch_track[1], regions, epsilon)
 
     # replace regions with quantized versions
-    quantized_pitches = pitch_track[1].copy()
-    np.put(quantized_pitches, indices, quantized_non_zero_frequencies)
+    quantized_pitches = regions.fill(pitch_track[1], majority_pitches)
 
     pitch_track_quantized = (pitch_track[0], quantized_pitches) # (time, freq) 
 
     return  pitch_track_quantized
 
 
+def quantize_frequencies(F0, epsilon):
+    """
+    Using epsilon balls around the MIDI pitch frequencies, quantizes a frequency array at once. Each frequency is
+    compared with its two neighbouring notes in the note table, the closer one is taken if it is within the bound.
+
+    Parameters:
+    -----------
+
+        F0 (ndarray): frequencies in Hz.
+        epsilon (int): freq_bound = delta_scale/epsilon determines if quantization will happen.
+
+    Returns:
+    --------
+
+        F0_quantized (ndarray): quantized frequencies in hertz, 0s and far away frequencies are kept
+        
+    """
+
+    F0 = np.asarray(F0, dtype=float)
+
+    # the notes below and above each frequency
+    upper_idx = np.clip(np.searchsorted(NOTE_FREQUENCIES, F0), 1, len(NOTE_FREQUENCIES)-1)
+    lower_delta = np.abs(F0 - NOTE_FREQUENCIES[upper_idx-1])
+    upper_delta = np.abs(F0 - NOTE_FREQUENCIES[upper_idx])
+
+    # the lower note wins equal distances
+    note_idx = np.where(upper_delta < lower_delta, upper_idx, upper_idx-1)
+    delta_min = np.minimum(lower_delta, upper_delta)
+
+    quantize = (F0 != 0) & (delta_min <= NOTE_SPACING/epsilon) # if there is a note closeby
+
+    return np.where(quantize, NOTE_FREQUENCIES[note_idx], F0)
+
+
 def quantize_frequency(f, epsilon):
     """
     Using epsilon balls around the MIDI pitch frequencies, quantizes a given frequency.
@@ -63,19 +92,81 @@ def quantize_frequency(f, epsilon):
         f (float): quantized frequency in hertz
         
     """
-    
-    if f: # for non zero frequencies
-                
-        delta_array = np.abs(f - np.array(SUB_BASS_FREQUENCIES)) # distances to the notes of the scale
-        delta_min = np.min(delta_array) # smallest such distance
 
-        delta_bound = np.min(np.diff(SUB_BASS_FREQUENCIES)) / epsilon 
+    return quantize_frequencies([f], epsilon)[0]
 
-        if delta_min <= delta_bound: # if there is a note closeby
-            note_idx = np.where(delta_array==delta_min)[0][0] # index of the corresponding note in the scale
-            f = SUB_BASS_FREQUENCIES[note_idx] # quantize pitch
-            
-    return f 
+
+def region_pitch_counts(F0, regions, epsilon=2):
+    """
+    Quantizes the frequencies of all the regions at once and counts each (region, pitch) pair with a single bincount.
+
+    Parameters:
+    -----------
+
+        F0 (ndarray): F0 array.
+        regions (RegionSet): regions of the F0 array
+        epsilon (int, default=2): freq_bound = delta_scale/epsilon determines if quantization will happen.
+
+    Returns:
+    --------
+
+        region_ids (ndarray): region index of each pair, ascending
+        pitches (ndarray): quantized pitch of each pair, in the order of their first occurrence inside a region
+        counts (ndarray): number of samples of each pair
+
+    """
+
+    regions = regions.clip(len(F0)) # like slicing
+
+    # region index and F0 index of every sample inside the regions
+    region_ids = regions.repeat(np.arange(len(regions)))
+    sample_indices = regions.indices()
+
+    pitches, pitch_codes = np.unique(quantize_frequencies(F0[sample_indices], epsilon), return_inverse=True)
+    N_pitches = max(len(pitches), 1)
+
+    # count the (region, pitch) pairs
+    pair_codes = region_ids*N_pitches + pitch_codes.reshape(-1)
+    pairs, first_indices, pair_inverse = np.unique(pair_codes, return_index=True, return_inverse=True)
+    counts = np.bincount(pair_inverse.reshape(-1), minlength=len(pairs))
+
+    order = np.lexsort((first_indices, pairs // N_pitches))
+    pairs = pairs[order]
+
+    return pairs // N_pitches, pitches[pairs % N_pitches], counts[order]
+
+
+def region_majority_pitches(F0, regions, epsilon=2):
+    """
+    Majority pitch of each region. Equal votes go to the pitch that occurs first in the region, regions without
+    samples get 0.
+
+    Parameters:
+    -----------
+
+        F0 (ndarray): F0 array.
+        regions (RegionSet): regions of the F0 array
+        epsilon (int, default=2): freq_bound = delta_scale/epsilon determines if quantization will happen.
+
+    Returns:
+    --------
+
+        majority_pitches (ndarray): majority pitch of each region
+
+    """
+
+    region_ids, pitches, counts = region_pitch_counts(F0, regions, epsilon)
+
+    # the stable sort keeps the first occurrence order between equal counts
+    order = np.lexsort((-counts, region_ids))
+    region_ids, pitches = region_ids[order], pitches[order]
+    first = np.ones(len(region_ids), dtype=bool)
+    first[1:] = region_ids[1:] != region_ids[:-1]
+
+    majority_pitches = np.zeros(len(regions))
+    majority_pitches[region_ids[first]] = pitches[first]
+
+    return majority_pitches
 
 
 def single_pitch_histogram(F0, epsilon):
@@ -95,7 +186,7 @@ def single_pitch_histogram(F0, epsilon):
 
     """
    
-    return Counter([quantize_frequency(f, epsilon) for f in F0])
+    return create_pitch_histograms(np.asarray(F0), np.array([[0, len(F0)]]), epsilon)[0]
 
 
 def create_pitch_histograms(F0, boundaries, epsilon=2):  
@@ -124,10 +215,12 @@ def create_pitch_histograms(F0, boundaries, epsilon=2):
     if isinstance(boundaries, int): # create the boundaries with uniform interval length
         boundaries = [[i*boundaries, (i+1)*boundaries] for i in range(int(len(F0)/boundaries))]
 
-    pitch_histograms = []        
-    for start, end in boundaries:
-        interval_pitch_histogram = single_pitch_histogram(F0[start:end], epsilon)
-        pitch_histograms.append(interval_pitch_histogram)
+    region_ids, pitches, counts = region_pitch_counts(F0, RegionSet.from_boundaries(boundaries), epsilon)
+
+    # the pairs are in first occurrence order, like counting the samples one by one
+    pitch_histograms = [Counter() for _ in range(len(boundaries))]
+    for region_idx, pitch, count in zip(region_ids, pitches, counts):
+        pitch_histograms[region_idx][pitch] = count
             
     return pitch_histograms
 
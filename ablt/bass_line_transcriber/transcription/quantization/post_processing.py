@@ -2,64 +2,71 @@
 # coding: utf-8
 
 import numpy as np
+from numba import njit
 
 from .pitch_quantization import quantize_frequency
 
 
-def onset_offset_merger(pitch_track, regions, length_threshold=8):
-    """
-    Merges the onset with the following segment and/or the offset with the previous segment.
-    """
-
-    F0 = pitch_track[1].copy()
-    no_regions = len(regions)
+@njit(cache=True)
+def _merge_onsets_offsets(F0, segment_boundaries, region_offsets, length_threshold):
+    """Merges the short onsets and offsets of every region in place, in a single pass over the flat segments."""
 
-    for region_idx, region_segments in enumerate(regions): # for each segment in the region
+    for region_idx in range(len(region_offsets)-1):
 
-        no_segments = len(region_segments)
+        first, last = region_offsets[region_idx], region_offsets[region_idx+1]
+        no_segments = last - first
 
         if no_segments > 2: # straightforward merging
-       
-            for segment_idx, (start, end) in enumerate(region_segments): # get the segment boundaries
 
-                segment_length = end - start
+            for segment_idx in range(first, last):
 
-                if segment_length < length_threshold: # if the current segment has small length, apply merging
+                start, end = segment_boundaries[segment_idx, 0], segment_boundaries[segment_idx, 1]
 
-                    if segment_idx == 0: # onset merging
+                if end - start < length_threshold: # if the current segment has small length, apply merging
 
-                        ns, _ = region_segments[segment_idx+1] # start idx of the next segment
-                        f = F0[ns] # get the closest sample from the next segment
-                        
-                        F0[start:end] = f # replace the original samples
+                    if segment_idx == first: # onset merging with the closest sample from the next segment
+                        F0[start:end] = F0[segment_boundaries[segment_idx+1, 0]]
 
-                    if segment_idx == no_segments-1: # offset merging
-
-                        _, pe = region_segments[segment_idx-1] # an idx from the previous segment
-                        f = F0[pe-1] # get the closest sample from the previous segment
-
-                        F0[start:end] = f # replace the original samples
+                    if segment_idx == last-1: # offset merging with the closest sample from the previous segment
+                        F0[start:end] = F0[segment_boundaries[segment_idx-1, 1]-1]
 
         elif no_segments == 2: #if there are 2 segments, ve take care of cases
 
-            ps, pe = region_segments[0]
-            ns, ne = region_segments[1]
+            ps, pe = segment_boundaries[first, 0], segment_boundaries[first, 1]
+            ns, ne = segment_boundaries[first+1, 0], segment_boundaries[first+1, 1]
 
             len1, len2 = pe-ps, ne-ns
 
             if not (len1==length_threshold and len2==length_threshold):
 
                 if len1>len2:
-                    f = F0[pe-1]
-                    F0[ns : ne] = f
+                    F0[ns : ne] = F0[pe-1]
                 else:
-                    f = F0[ns]
-                    F0[ps : pe] = f
+                    F0[ps : pe] = F0[ns]
 
-        else: # for single segment it can not be length smaller than 8 anyway
-            continue
+        # for single segment it can not be length smaller than 8 anyway
 
 
+def onset_offset_merger(pitch_track, segments, region_offsets, length_threshold=8):
+    """
+    Merges the onset with the following segment and/or the offset with the previous segment.
+
+        Parameters:
+        -----------
+            pitch_track (tupple): (time_axis, F0) where both are np.ndarrays
+            segments (RegionSet): segments of the good regions
+            region_offsets (ndarray): segments[region_offsets[i]:region_offsets[i+1]] are the segments of region i
+            length_threshold (int, default=8): segments shorter than this are merged
+
+        Returns:
+        --------
+            pitch_track (tupple): (time_axis, F0) where both are np.ndarrays
+    """
+
+    F0 = pitch_track[1].copy()
+    _merge_onsets_offsets(F0, segments.boundaries.astype(np.int64), np.asarray(region_offsets, dtype=np.int64),
+                          length_threshold)
+
     return (pitch_track[0], F0)
                             
 
@@ -68,12 +75,7 @@ def region_silencer(pitch_track, bad_regions):
     Zeroes out given regions.
     """
 
-    # get the indices to be silenced
-    _, _, indices = bad_regions
-
-    silenced_pitch_track = np.array([0.0 if idx in indices else f for idx, f in enumerate(pitch_track[1])])
-
-    return (pitch_track[0], silenced_pitch_track)
+    return (pitch_track[0], bad_regions.fill(pitch_track[1], 0.0))
 
 # REMOVE!
 def unk_filter(pitch_track, track_scale):
@@ -1,14 +1,12 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import numpy as np
-
 from .pitch_quantization import uniform_quantization
-from .segmentation import find_voiced_regions, segment_voiced_regions, get_region_information
+from .segmentation import find_voiced_regions, segment_voiced_regions
 from .post_processing import onset_offset_merger, region_silencer
 
 
-def uniform_voiced_region_quantization(pitch_track, track_scale, epsilon=2):
+def uniform_voiced_region_quantization(pitch_track, epsilon=2):
     """
     Finds the voiced regions, and uniformly quantizes each region in frequency using majority voting.
 
@@ -16,8 +14,7 @@ def uniform_voiced_region_quantization(pitch_track, track_scale, epsilon=2):
         -----------
 
             pitch_track (tupple): (time_axis, F0) where both are np.ndarray
-            track_scale (tupple): (notes, scale_frequencies, out_notes, out_frequencies)
-            epsilon (int, default=4): freq_bound = delta_scale/epsilon determines if quantization will happen.
+            epsilon (int, default=2): freq_bound = delta_scale/epsilon determines if quantization will happen.
 
         Returns:
         --------
@@ -27,7 +24,7 @@ def uniform_voiced_region_quantization(pitch_track, track_scale, epsilon=2):
 
     voiced_regions = find_voiced_regions(pitch_track[1])   
 
-    pitch_track_quantized = uniform_quantization(pitch_track, track_scale[1], voiced_regions, epsilon)
+    pitch_track_quantized = uniform_quantization(pitch_track, voiced_regions, epsilon)
 
     return  pitch_track_quantized
 
@@ -51,22 +48,19 @@ def adaptive_voiced_region_quantization(pitch_track, quarter_beat_positions, len
     """
 
     # Find the voiced regions
-    voiced_boundaries, _, _ = find_voiced_regions(pitch_track[1])
+    voiced_regions = find_voiced_regions(pitch_track[1])
 
-    # segment the voiced regions
-    segmented_good_regions, okay_regions, bad_regions = segment_voiced_regions(pitch_track[0], 
-                                                                        voiced_boundaries,
+    # segment the voiced regions, region_offsets select the segments of each good region
+    segments, region_offsets, okay_regions, bad_regions = segment_voiced_regions(pitch_track[0],
+                                                                        voiced_regions,
                                                                         length_threshold,
                                                                         quarter_beat_positions)
 
-    # flatten the boundaries, and create segment tupple = (bounds, lens, indices)
-    good_regions = get_region_information(np.array([bounds for region in segmented_good_regions for bounds in region]))
-
-    # Uniformly quantize each segmented region independtly 
-    pitch_track_quantized = uniform_quantization(pitch_track, good_regions, epsilon)
+    # Uniformly quantize each segment independtly 
+    pitch_track_quantized = uniform_quantization(pitch_track, segments, epsilon)
 
-    # Merge the onsets and the offsets using segmented_good_regions
-    pitch_track_quantized = onset_offset_merger(pitch_track_quantized, segmented_good_regions)
+    # Merge the onsets and the offsets of each segmented region
+    pitch_track_quantized = onset_offset_merger(pitch_track_quantized, segments, region_offsets)
 
     # Uniformly quantize okay regions, without segmentation
     pitch_track_quantized = uniform_quantization(pitch_track_quantized, okay_regions, epsilon)
@@ -2,6 +2,7 @@
 # coding: utf-8
 
 import numpy as np
+from numba import njit
 
 def calcRegionBounds(bool_array):
     '''
@@ -18,129 +19,245 @@ def calcRegionBounds(bool_array):
     return np.reshape(idx, (-1,2))
 
 
+class RegionSet:
+    """
+    A set of [start, end) regions of a sample array backed by start and length int32 arrays, so its memory and the
+    cost of its operations scale with the number of regions. Regions with non-positive lengths are empty.
+    """
+
+    def __init__(self, starts, lengths):
+        """
+            Parameters:
+            -----------
+                starts (array): start index of each region
+                lengths (array): number of samples of each region
+        """
+
+        self.starts = np.asarray(starts, dtype=np.int32).reshape(-1)
+        self.lengths = np.asarray(lengths, dtype=np.int32).reshape(-1)
+        assert len(self.starts) == len(self.lengths), 'Each region needs a start and a length!'
+
+    @classmethod
+    def from_boundaries(cls, boundaries):
+        """Creates the set from an array of [start, end) boundaries."""
+
+        boundaries = np.asarray(boundaries, dtype=np.int64).reshape(-1, 2)
+
+        return cls(boundaries[:, 0], boundaries[:, 1] - boundaries[:, 0])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, selection):
+        """Returns the regions selected by a slice, an index array or a boolean mask as a new set."""
+        return RegionSet(self.starts[selection], self.lengths[selection])
+
+    @property
+    def ends(self):
+        return self.starts + self.lengths
+
+    @property
+    def boundaries(self):
+        """[start, end) of each region."""
+        return np.stack([self.starts, self.ends], axis=1)
+
+    def clip(self, N):
+        """Clips the regions to an array of N samples like slicing does."""
+
+        starts = np.clip(self.starts, 0, N)
+
+        return RegionSet(starts, np.clip(self.ends, 0, N) - starts)
+
+    def repeat(self, values):
+        """Holds each region's value for the length of the region."""
+        return np.repeat(values, np.maximum(self.lengths, 0))
+
+    def indices(self):
+        """Indices of the samples inside the regions, in region order."""
+
+        lengths = np.maximum(self.lengths, 0)
+
+        return np.arange(lengths.sum()) + self.repeat(self.starts - (np.cumsum(lengths) - lengths))
+
+    def mask(self, N):
+        """Boolean mask of the samples of an N sample array that are inside the regions."""
+
+        regions = self.clip(N)
+        regions = regions[regions.lengths > 0]
+
+        # +1 at the starts, -1 at the ends, overlapping regions stack
+        delta = np.zeros(N+1, dtype=np.int64)
+        np.add.at(delta, regions.starts, 1)
+        np.add.at(delta, regions.ends, -1)
+
+        return np.cumsum(delta[:-1]) > 0
+
+    def fill(self, array, values):
+        """
+        Returns a copy of the array with the samples of each region set to a value.
+
+            Parameters:
+            -----------
+                array (ndarray): sample array
+                values (float or array): a single value for all the regions or one value per region
+        """
+
+        filled = array.copy()
+        if np.ndim(values):
+            filled[self.indices()] = self.repeat(values)
+        else:
+            filled[self.mask(len(array))] = values
+
+        return filled
+
+
 def find_voiced_regions(F0):
     """
-    From a given F0 array, finds the voiced regions' boundaries and returns them with corresponding lengths and indices.
+    From a given F0 array, finds the voiced regions and returns them as a RegionSet.
     """
     
     voiced_boundaries = calcRegionBounds(F0 != 0.0)
     
-    return get_region_information(voiced_boundaries)
+    return RegionSet.from_boundaries(voiced_boundaries)
 
 
-def get_region_information(boundaries):
-    """
-    Packs the boundaries, lengths, and the corresponding indices in a tupple.
-    """
+# Region categories of the segmentation
+GOOD_REGION, OKAY_REGION, BAD_REGION = 0, 1, 2
 
-    lengths = np.diff(boundaries, 1).flatten().tolist()
 
-    indices = [x for start, end in boundaries for x in np.arange(start, end)]
+@njit(cache=True)
+def _closest_index(array, value):
+    """Index of the closest element of a sorted array, the first one on equal distances."""
 
-    return (boundaries, lengths, indices)
+    upper_idx = np.searchsorted(array, value) # first element >= value
+    if upper_idx == 0:
+        return 0
+    if upper_idx < len(array) and np.abs(value - array[upper_idx]) < np.abs(value - array[upper_idx-1]):
+        return upper_idx
+    return np.searchsorted(array, array[upper_idx-1]) # first occurrence of the lower neighbour
 
 
 def find_closest_quarter_beat(time, quarter_beat_positions):
-    
-    delta = np.abs(time - quarter_beat_positions)
-    delta_min = np.min(delta)
-    idx = np.where(delta==delta_min)[0][0]
-        
+
+    idx = _closest_index(quarter_beat_positions, time)
+
     return idx, quarter_beat_positions[idx]
 
 
 def find_closest_note(time_axis, beat_time):
-    
-    delta = np.abs(beat_time - time_axis)
-    delta_min = np.min(delta)
-    
-    return np.where(delta==delta_min)[0][0]    
 
+    return _closest_index(time_axis, beat_time)
 
-def segment_voiced_regions(time_axis, region_boundaries, length_threshold, quarter_beat_positions):
-    """
-    Segments voiced regions if they have proper length, otherwise categorizes them.
 
-        Parameters:
-        -----------
-        time_axis (ndarray): time axis array
-        region_boundaries ():
-        length_threshold (int): the threshold in deciding if region length is suitable for segmentation
+@njit(cache=True)
+def _segment_regions(time_axis, region_boundaries, length_threshold, okay_threshold, quarter_beat_positions,
+                     delta_time):
+    """
+    Single pass over the voiced regions. Good regions are segmented at the quarter beats, the segments of all the
+    regions are written to one flat [start, end) array and region_offsets[i]:region_offsets[i+1] selects the
+    segments of the ith good region.
     """
-    
-    quarter_beat_positions -= quarter_beat_positions[0] # start from time 0
 
-    delta_time = np.diff(time_axis).max()/2 # maximum allowed distance deviation for beatgrid from the notes
+    N_regions, N_qb = region_boundaries.shape[0], len(quarter_beat_positions)
 
-    segmented_good_regions = [] # good regions 
-    okay_region_boundaries = [] # okayish regions
-    bad_region_boundaries = []  # bad regions
+    # closest pitch track sample of each quarter beat
+    qb_note_indices = np.empty(N_qb, dtype=np.int64)
+    for k in range(N_qb):
+        qb_note_indices[k] = _closest_index(time_axis, quarter_beat_positions[k])
 
-    # for each voiced region
-    for onset_idx, upper_bound in region_boundaries:
+    categories = np.empty(N_regions, dtype=np.int64)
+    segment_boundaries = np.empty((N_regions*(N_qb+1), 2), dtype=np.int64) # at most N_qb+1 segments per region
+    region_offsets = np.zeros(N_regions+1, dtype=np.int64)
+    N_segments, N_good = 0, 0
 
-        offset_idx = upper_bound - 1 # upper bound is excluded
+    for region_idx in range(N_regions):
 
-        region_length = offset_idx - onset_idx + 1 
+        onset_idx, upper_bound = region_boundaries[region_idx, 0], region_boundaries[region_idx, 1]
+        offset_idx = upper_bound - 1 # upper bound is excluded
+        region_length = offset_idx - onset_idx + 1
 
         if region_length > length_threshold: # if region length is suitable for segmentation
 
-            segment_boundaries = [] # segmentation boundaries
+            categories[region_idx] = GOOD_REGION
 
-
-            # get the times. Upper bounds of regions are excluded
+            # find the closest quarter beats to the onset and offset times
             onset_time, offset_time = time_axis[onset_idx], time_axis[offset_idx]
-            
-            # find the closest quarter beats to the onset and offset times 
-            start_beat_idx, start_beat_time = find_closest_quarter_beat(onset_time, quarter_beat_positions) 
-            end_beat_idx, end_beat_time = find_closest_quarter_beat(offset_time, quarter_beat_positions)
+            start_beat_idx = _closest_index(quarter_beat_positions, onset_time)
+            end_beat_idx = _closest_index(quarter_beat_positions, offset_time)
 
             # make sure that onset starts before a qbeat and the offest ends after a qbeat
-            if onset_time > start_beat_time and delta_time <=  onset_time - start_beat_time:
+            start_beat_time = quarter_beat_positions[start_beat_idx]
+            if onset_time > start_beat_time and delta_time <= onset_time - start_beat_time:
                 start_beat_idx += 1
-                start_beat_time = quarter_beat_positions[start_beat_idx]
+                if start_beat_idx == N_qb:
+                    raise IndexError('The voiced region starts after the last quarter beat.')
 
-            if offset_time < end_beat_time and delta_time <= end_beat_time - offset_time :
+            end_beat_time = quarter_beat_positions[end_beat_idx]
+            if offset_time < end_beat_time and delta_time <= end_beat_time - offset_time:
                 end_beat_idx -= 1
-                end_beat_time = quarter_beat_positions[end_beat_idx]
 
+            # segmentation starts with the onset idx and the closest quarter beat's corresponding idx
+            b2 = qb_note_indices[start_beat_idx]
+            if onset_idx != b2: # onset on quarter beat
+                segment_boundaries[N_segments, 0], segment_boundaries[N_segments, 1] = onset_idx, b2
+                N_segments += 1
+
+            # segment between each qbeat inside the adjusted region
+            for k in range(start_beat_idx, end_beat_idx):
+                segment_boundaries[N_segments, 0] = qb_note_indices[k]
+                segment_boundaries[N_segments, 1] = qb_note_indices[k+1]
+                N_segments += 1
 
-            # segmentation starts with the onset idx and the closest quarter beat's corresponding idx    
-            b1 = onset_idx
-            b2 = find_closest_note(time_axis, start_beat_time)
-            if not b1 == b2: # onset on quarter beat
-                segment_boundaries.append([b1, b2])
-                
-            # segment between each qbeat inside the adjusted region 
-            for k in np.arange(start_beat_idx, end_beat_idx):
+            # segmentation finishes with the final qbeat and the upper_bound = offset idx+1
+            b1 = qb_note_indices[end_beat_idx]
+            if b1 != upper_bound: # offset on quarter beat
+                segment_boundaries[N_segments, 0], segment_boundaries[N_segments, 1] = b1, upper_bound
+                N_segments += 1
 
-                # get the qbeat times
-                start_beat_time = quarter_beat_positions[k] 
-                end_beat_time = quarter_beat_positions[k+1]
+            N_good += 1
+            region_offsets[N_good] = N_segments
 
-                # get the corresponding indices in the pitch track
-                b1 = find_closest_note(time_axis, start_beat_time)
-                b2 = find_closest_note(time_axis, end_beat_time)
+        elif region_length >= okay_threshold: # if the region can be uniformly quantized
+            categories[region_idx] = OKAY_REGION
 
-                segment_boundaries.append([b1, b2])
-                
-            # segmentation finishes with the final qbeat and the upper_bound = offset idx+1
-            b1 = find_closest_note(time_axis, quarter_beat_positions[end_beat_idx])
-            b2 = upper_bound # upper bounds are excluded ()
-            if not b1 == b2: # offset on quarter beat
-                segment_boundaries.append([b1, b2])
+        else: # if the region will be erased
+            categories[region_idx] = BAD_REGION
 
-            segmented_good_regions.append(segment_boundaries)
+    return segment_boundaries[:N_segments], region_offsets[:N_good+1], categories
 
-        elif region_length >= int(length_threshold/2): # if the region can be uniformly quantized
 
-            okay_region_boundaries.append([onset_idx, upper_bound])
+def segment_voiced_regions(time_axis, voiced_regions, length_threshold, quarter_beat_positions):
+    """
+    Segments voiced regions if they have proper length, otherwise categorizes them.
 
-        else: # if the region will be erased
-               
-            bad_region_boundaries.append([onset_idx, upper_bound])
+        Parameters:
+        -----------
+        time_axis (ndarray): time axis array
+        voiced_regions (RegionSet): voiced regions of the pitch track
+        length_threshold (int): the threshold in deciding if region length is suitable for segmentation
+        quarter_beat_positions (ndarray): ndarray of quarter beat time values
+
+        Returns:
+        --------
+        segments (RegionSet): segments of all the good regions
+        region_offsets (ndarray): segments[region_offsets[i]:region_offsets[i+1]] are the segments of the ith good region
+        okay_regions (RegionSet): regions to be quantized without segmentation
+        bad_regions (RegionSet): regions to be silenced
+    """
+
+    time_axis = np.asarray(time_axis, dtype=np.float64)
+    region_boundaries = voiced_regions.boundaries.astype(np.int64)
+    quarter_beat_positions = np.asarray(quarter_beat_positions, dtype=np.float64)
+
+    quarter_beat_positions = quarter_beat_positions - quarter_beat_positions[0] # start from time 0
+
+    delta_time = np.diff(time_axis).max()/2 # maximum allowed distance deviation for beatgrid from the notes
+
+    segment_boundaries, region_offsets, categories = _segment_regions(time_axis, region_boundaries,
+                                                                      length_threshold, int(length_threshold/2),
+                                                                      quarter_beat_positions, delta_time)
 
-    okay_regions = get_region_information(np.array(okay_region_boundaries))
-    bad_regions = get_region_information(np.array(bad_region_boundaries))
+    segments = RegionSet.from_boundaries(segment_boundaries)
+    okay_regions, bad_regions = voiced_regions[categories == OKAY_REGION], voiced_regions[categories == BAD_REGION]
 
-    return segmented_good_regions, okay_regions, bad_regions
\ No newline at end of file
+    return segments, region_offsets, okay_regions, bad_regions
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import hashlib
+import threading
+
+import numpy as np
+
+from librosa import load
+from librosa.util import fix_length
+
+from .directories import AUDIO_CACHE_DIR, SEPARATION_CACHE_DIR, PYIN_CACHE_DIR
+from .constants import AUDIO_CACHE_BUDGET, SEPARATION_CACHE_BUDGET, PYIN_CACHE_BUDGET
+
+
+class ArrayCache:
+    """
+    Content addressed disk cache of numpy arrays. Each entry is a raw .npy file that is opened memory-mapped,
+    the least recently used entries are evicted once the cache grows past its disk budget.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Parameters:
+        -----------
+            cache_dir (str): directory of the cache entries
+            max_bytes (int): disk budget in bytes
+        """
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key+'.npy')
+
+    def get(self, key):
+        """
+        Returns the read-only memory-mapped array of the key or None if it is not cached.
+        """
+
+        path = self.path(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+            os.utime(path) # mark as recently used
+        except FileNotFoundError:
+            return None
+        return array
+
+    def put(self, key, array):
+        """
+        Stores the array under the key and returns its memory-mapped copy.
+        """
+
+        path = self.path(key)
+        tmp_path = '{}.{}-{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'wb') as outfile:
+            np.save(outfile, np.ascontiguousarray(array))
+        os.replace(tmp_path, path) # readers never see a partially written entry
+
+        self.evict(keep=key)
+        return np.load(path, mmap_mode='r')
+
+    def size(self):
+        """Returns the total size of the cache entries in bytes."""
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used entries until the cache fits its disk budget.
+        """
+
+        keep_path = self.path(keep) if keep is not None else None
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1]) # oldest first
+            total = sum(size for _, _, size in entries)
+            for path, _, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep_path:
+                    continue
+                try:
+                    os.remove(path) # open memory maps stay valid
+                    total -= size
+                except OSError:
+                    pass
+
+    def _entries(self):
+        """Returns (path, last_used, size) for each entry."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError: # removed by another process
+                    continue
+                entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+
+def file_hash(path, chunk_size=1<<20):
+    """Returns the sha1 hex digest of a file's contents."""
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def file_key(path):
+    """Returns the sha1 hex digest of a file's absolute path, size and modification time."""
+
+    stat = os.stat(path)
+    description = '{}|{}|{}'.format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    return hashlib.sha1(description.encode()).hexdigest()
+
+def array_hash(array):
+    """Returns the sha1 hex digest of an array's samples, shape and dtype."""
+
+    array = np.ascontiguousarray(array)
+    sha1 = hashlib.sha1('{}{}'.format(array.dtype.str, array.shape).encode())
+    sha1.update(array.data)
+    return sha1.hexdigest()
+
+def enable_caches(audio=True, separation=True, pyin=True):
+    """
+    Enables the caches with their default directories and disk budgets. All the caches are disabled until they
+    are configured.
+
+        Parameters:
+        -----------
+            audio (bool, default=True): the decoded audio cache (AUDIO_CACHE_BUDGET)
+            separation (bool, default=True): the separated bass stem cache (SEPARATION_CACHE_BUDGET)
+            pyin (bool, default=True): the raw pYIN output cache (PYIN_CACHE_BUDGET)
+    """
+
+    if audio:
+        configure_audio_cache()
+    if separation:
+        configure_separation_cache()
+    if pyin:
+        configure_pyin_cache()
+
+#-------------------------------------------------- Decoded Audio ------------------------------------------------------------
+
+_audio_cache = None
+_audio_cache_lock = threading.Lock()
+
+def configure_audio_cache(cache_dir=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_BUDGET):
+    """
+    Sets up the decoded audio cache. Give max_bytes=0 for disabling it.
+    """
+
+    global _audio_cache
+    with _audio_cache_lock:
+        _audio_cache = ArrayCache(cache_dir, max_bytes) if max_bytes else False
+    return _audio_cache
+
+def get_audio_cache():
+    """Returns the decoded audio cache, None if it is disabled (default)."""
+
+    return _audio_cache or None
+
+def audio_key(path, sr, mono):
+    return '{}_{}_{}'.format(file_hash(path), sr, 'mono' if mono else 'stereo')
+
+def load_audio(path, sr, mono=True):
+    """
+    Decodes and resamples an audio file through the decoded audio cache.
+    The array of a cached file is returned memory-mapped and read-only.
+    """
+
+    cache = get_audio_cache()
+    if cache is None:
+        return load(path, sr=sr, mono=mono)[0]
+
+    key = audio_key(path, sr, mono)
+    audio = cache.get(key)
+    if audio is None:
+        audio, _ = load(path, sr=sr, mono=mono)
+        audio = cache.put(key, audio)
+    return audio
+
+def load_audio_segment(path, sr, start_idx, end_idx):
+    """
+    Returns the [start_idx, end_idx) samples of a mono track. The segment is read from the decoded audio cache
+    if the track was cached, otherwise only this range is decoded using offset/duration decoding. Either way the
+    segment is zero padded to exactly end_idx-start_idx samples.
+    """
+
+    cache = get_audio_cache()
+    audio = cache.get(audio_key(path, sr, True)) if cache is not None else None
+    if audio is not None:
+        segment = np.array(audio[start_idx:end_idx])
+    else:
+        segment, _ = load(path, sr=sr, mono=True, offset=start_idx/sr, duration=(end_idx-start_idx)/sr)
+
+    return fix_length(segment, end_idx-start_idx) # exact number of samples
+
+#-------------------------------------------------- Separated Bass Stems ------------------------------------------------------------
+
+_separation_cache = None
+_separation_cache_lock = threading.Lock()
+
+def configure_separation_cache(cache_dir=SEPARATION_CACHE_DIR, max_bytes=SEPARATION_CACHE_BUDGET):
+    """
+    Sets up the cache of the raw stereo bass stems. Give max_bytes=0 for disabling it.
+    """
+
+    global _separation_cache
+    with _separation_cache_lock:
+        _separation_cache = ArrayCache(cache_dir, max_bytes) if max_bytes else False
+    return _separation_cache
+
+def get_separation_cache():
+    """Returns the separated bass stem cache, None if it is disabled (default)."""
+
+    return _separation_cache or None
+
+def separation_key(chorus, model_name, shifts=0, split='segment', overlap=0.25):
+    """
+    Returns the cache key of a separated chorus.
+
+        Parameters:
+        -----------
+            chorus (ndarray): mono chorus array
+            model_name (str): registry key of the separator
+            shifts (int, default=0): number of random shifts of apply_model
+            split (str, default='segment'): how the chorus is split into chunks, e.g. 'segment', 'batch', 'workers4'
+            overlap (float, default=0.25): overlap between the chunks
+    """
+
+    description = '{}|{}|{}|{}|{}'.format(array_hash(chorus), model_name, shifts, split, overlap)
+    return hashlib.sha1(description.encode()).hexdigest()
+
+#-------------------------------------------------- Raw pYIN Outputs ------------------------------------------------------------
+
+_pyin_cache = None
+_pyin_cache_lock = threading.Lock()
+
+def configure_pyin_cache(cache_dir=PYIN_CACHE_DIR, max_bytes=PYIN_CACHE_BUDGET):
+    """
+    Sets up the cache of the raw pYIN outputs. Give max_bytes=0 for disabling it.
+    """
+
+    global _pyin_cache
+    with _pyin_cache_lock:
+        _pyin_cache = ArrayCache(cache_dir, max_bytes) if max_bytes else False
+    return _pyin_cache
+
+def get_pyin_cache():
+    """Returns the raw pYIN output cache, None if it is disabled (default)."""
+
+    return _pyin_cache or None
+
+def pyin_key(bass_line, fs, hop_length, frame_length, fmin, fmax):
+    """Returns the cache key of the pYIN outputs of a bass line."""
+
+    description = '{}|{}|{}|{}|{}|{}'.format(array_hash(bass_line), fs, hop_length, frame_length, fmin, fmax)
+    return hashlib.sha1(description.encode()).hexdigest()
@@ -34,9 +34,29 @@ FRAME_LEN = int(FRAME_DUR*FS) # Frame Length
 HOP_RATIO = 32 # F0 estimation hop length wrt. a beat
 
 CUTOFF_FREQ = F_MAX # Post processing cut-off filter at the source separator
+BASS_LINE_DECIMATION = 16 # Decimation rate of the processed bass line
+BASS_LINE_FS = FS / BASS_LINE_DECIMATION # Sampling rate of the processed bass line
 DROP_DETECTOR_CUTOFF = PITCH_FREQUENCIES[48] # Cutoff frequency for drop detection C2
+DROP_DETECTOR_TAPS = 5001 # Tap of the drop detection low pass filter at FS
 
 M = 1 # Downsampling rate for symbolic representation creatinon
       # must be a power of 2 between 1 and HOP_RATIO
 
-PYIN_THRESHOLD = 0.05 # Confidence level filtering threshold    
\ No newline at end of file
+PYIN_THRESHOLD = 0.05 # Confidence level filtering threshold
+
+F0_ESTIMATORS = ['pYIN', 'semitone_YIN'] # F0 estimators of the transcriber
+YIN_THRESHOLD = 0.15 # Absolute threshold of the semitone grid YIN
+
+ANALYSIS_DECIMATION = 16 # Decimation rate of the track copy that is kept for chorus analysis in low memory mode
+
+# The caches are disabled by default, these budgets apply once they are enabled (--cache, ablt.cache.enable_caches)
+AUDIO_CACHE_BUDGET = 20*1024**3 # Disk budget of the decoded audio cache in bytes
+SEPARATION_CACHE_BUDGET = 5*1024**3 # Disk budget of the separated bass stem cache in bytes
+PYIN_CACHE_BUDGET = 1*1024**3 # Disk budget of the raw pYIN output cache in bytes
+
+BPM_TOLERANCE = 0.04 # Relative tempo tolerance around a provided BPM for the beat grid fit and the constrained tracker
+GRID_FIT_THRESHOLD = 1.5 # Minimum fit quality of a fixed beat grid, the beat tracker is used below it
+
+# Pretrained separation models of demucs 2.0.3
+SEPARATOR_MODELS = ['demucs', 'demucs48_hq', 'demucs_extra', 'demucs_quantized', 'tasnet', 'tasnet_extra']
+SEPARATOR_MODEL = 'demucs_extra' # default separation model
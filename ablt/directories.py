@@ -11,5 +11,10 @@ METADATA_DIR = os.path.join(DATA_DIR, 'metadata')
 AUDIO_DIR = os.path.join(DATA_DIR, 'audio_clips')
 OUTPUT_DIR = os.path.join(DATA_DIR, 'outputs')
 FIGURES_DIR = os.path.join(DATA_DIR, 'figures')
+SWEEP_DIR = os.path.join(DATA_DIR, 'sweeps')
+CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+AUDIO_CACHE_DIR = os.path.join(CACHE_DIR, 'audio')
+SEPARATION_CACHE_DIR = os.path.join(CACHE_DIR, 'separation')
+PYIN_CACHE_DIR = os.path.join(CACHE_DIR, 'pyin')
 
 TRACK_DICTS_PATH = os.path.join(METADATA_DIR, "track_dicts.json")
\ No newline at end of file
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import time
+import threading
+
+from .constants import SEPARATOR_MODEL
+
+# HERE WE KEEP THE MODELS THAT ARE SHARED THROUGHOUT A PROCESS
+
+_models = {} # {key: model}
+_load_timings = {} # {key: load duration in sec}
+_locks = {} # {key: Lock} one lock per model, so different models can load concurrently
+_registry_lock = threading.Lock()
+
+
+def _get_model(key, loader):
+    """
+    Returns the model of the key, loads it with the loader the first time it is asked for.
+    Concurrent callers of the same key wait for a single load.
+    """
+
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+
+    with lock:
+        model = _models.get(key)
+        if model is None:
+            start_time = time.time()
+            model = loader()
+            _load_timings[key] = time.time() - start_time
+            print('Loaded {} in {:.2f} sec.'.format(key, _load_timings[key]))
+            _models[key] = model
+    return model
+
+
+def _load_separator(name, quantized=False):
+    from demucs.pretrained import load_pretrained
+    separator = load_pretrained(name)
+    separator.eval()
+    if quantized:
+        from .bass_line_extractor.separation import quantize_separator
+        separator = quantize_separator(separator)
+    return separator
+
+def _load_traced_separator(path):
+    from .bass_line_extractor.separation import TracedSeparator
+    return TracedSeparator.load(path)
+
+def _load_beat_activation_processor():
+    from madmom.features.beats import RNNBeatProcessor
+    return RNNBeatProcessor()
+
+
+def get_separator(name=SEPARATOR_MODEL, quantized=False, traced_path=None):
+    """
+    Returns the shared pretrained demucs separator.
+
+        Parameters:
+        -----------
+            name (str, default=SEPARATOR_MODEL): pretrained demucs model, one of SEPARATOR_MODELS
+            quantized (bool, default=False): int8 dynamic quantized LSTM and linear layers
+            traced_path (str, default=None): load a serialized TracedSeparator instead of the pretrained model
+    """
+
+    if traced_path is not None:
+        return _get_model(traced_path, lambda: _load_traced_separator(traced_path))
+    if quantized:
+        return _get_model(name+'_int8', lambda: _load_separator(name, quantized=True))
+    return _get_model(name, lambda: _load_separator(name))
+
+def get_beat_activation_processor():
+    """Returns the shared madmom RNNBeatProcessor."""
+    return _get_model('RNNBeatProcessor', _load_beat_activation_processor)
+
+
+def model_name(model):
+    """Returns the registry key of a shared model, None if the model was not loaded through the registry."""
+    for key, registered_model in list(_models.items()):
+        if registered_model is model:
+            return key
+    return None
+
+
+def warm_up(separator_name=SEPARATOR_MODEL, separator=True, beat_activation_processor=True, quantized=False,
+            traced_path=None):
+    """
+    Loads the models before processing starts so the first track does not pay for them.
+
+        Parameters:
+        -----------
+            separator_name (str, default=SEPARATOR_MODEL): pretrained demucs model
+            separator (bool, default=True): load the separator
+            beat_activation_processor (bool, default=True): load the RNNBeatProcessor
+            quantized (bool, default=False): load the int8 quantized separator
+            traced_path (str, default=None): load a serialized TracedSeparator
+
+        Returns:
+        --------
+            load_timings (dict): {model: load duration in sec}
+    """
+
+    if separator:
+        get_separator(separator_name, quantized, traced_path)
+    if beat_activation_processor:
+        get_beat_activation_processor()
+    return load_timings()
+
+def load_timings():
+    """Returns the load durations of the loaded models in sec."""
+    return dict(_load_timings)
@@ -7,13 +7,14 @@ from .building_blocks import *
 from ..constants import FS
 
 
-def spectrogram(track_title, beat_positions, spectrogram, hop_length, F0_estimate=None, show=True, plot_dir='', plot_title=''):
+def spectrogram(track_title, beat_positions, spectrogram, hop_length, F0_estimate=None, show=True, plot_dir='', plot_title='',
+                fs=FS):
 
     fig, ax = plt.subplots(figsize=(20, 8), constrained_layout=True)
 
     fig.suptitle(track_title+'\n\nIsolated Chorus Bassline in the Beat Grid ', fontsize=20)
 
-    form_beat_grid_spectrogram(beat_positions, spectrogram, FS, hop_length, ax)
+    form_beat_grid_spectrogram(beat_positions, spectrogram, fs, hop_length, ax)
 
     if F0_estimate is not None:
         form_pitch_track(F0_estimate, ax, label='pYIN Estimate')
@@ -25,12 +26,13 @@ def spectrogram(track_title, beat_positions, spectrogram, hop_length, F0_estimat
         plt.show()
 
 # DEPRECATED
-def note_spectrogram(title, beat_positions, spectrogram, hop_length, notes, unk_notes, show=True, plot_dir='', plot_title=''):
+def note_spectrogram(title, beat_positions, spectrogram, hop_length, notes, unk_notes, show=True, plot_dir='', plot_title='',
+                     fs=FS):
 
     fig, ax = plt.subplots(figsize=(20, 8), constrained_layout=True)
     fig.suptitle(title+'\n\nIsolated Chorus Bassline in the Beat Grid ', fontsize=20)
 
-    form_beat_grid_spectrogram(beat_positions, spectrogram, FS, hop_length, ax)
+    form_beat_grid_spectrogram(beat_positions, spectrogram, fs, hop_length, ax)
 
     form_notes(ax, notes, unk_notes)
 
@@ -43,17 +45,18 @@ def note_spectrogram(title, beat_positions, spectrogram, hop_length, notes, unk_
         plt.show()
 
 # DEPRECATED
-def note_comparison_spectrogram(title, beat_positions, spectrogram, hop_length, F0_estimate, notes, unk_notes, show=True, plot_dir='', plot_title=''):
+def note_comparison_spectrogram(title, beat_positions, spectrogram, hop_length, F0_estimate, notes, unk_notes, show=True, plot_dir='',
+                                plot_title='', fs=FS):
 
     fig, ax = plt.subplots(figsize=(20, 10), nrows=2, sharex=False, constrained_layout=True)
 
     fig.suptitle(title+'\n\nIsolated Chorus Bassline in the Beat Grid ', fontsize=20)
 
-    form_beat_grid_spectrogram(beat_positions, spectrogram, FS, hop_length, ax[0])
+    form_beat_grid_spectrogram(beat_positions, spectrogram, fs, hop_length, ax[0])
     form_notes(ax[0], notes, unk_notes)
     form_note_legend(ax[0], notes, unk_notes)
 
-    form_beat_grid_spectrogram(beat_positions, spectrogram, FS, hop_length, ax[1])
+    form_beat_grid_spectrogram(beat_positions, spectrogram, fs, hop_length, ax[1])
     form_pitch_track(F0_estimate, ax[1], label='pYIN estimation')
     ax[1].legend(loc=1, fontsize=15)
 
@@ -7,7 +7,9 @@ from .building_blocks import beat_plotting, save_function
 from ..utilities import get_quarter_beat_positions, sample_and_hold
 
 
-def chorus_bassline_stem(title, beat_positions, chorus, bassline, N_beats, fs):
+def chorus_bassline_stem(title, beat_positions, chorus, bassline, N_beats, fs, bassline_fs=None):
+
+    bassline_fs = fs if bassline_fs is None else bassline_fs
     
     quarter_beat_positions = get_quarter_beat_positions(beat_positions)
     
@@ -16,6 +18,11 @@ def chorus_bassline_stem(title, beat_positions, chorus, bassline, N_beats, fs):
 
     N = int(plot_beats[N_beats])
 
+    bassline_quarter_beats = plot_quarter_beats*bassline_fs/fs
+    bassline_beats = plot_beats*bassline_fs/fs
+    N_bassline = int(bassline_beats[N_beats])
+    bassline = bassline[len(bassline) - int(len(chorus)*bassline_fs/fs):]
+
     fig, ax = plt.subplots(nrows=2, figsize=(20, 8), constrained_layout=True)
 
     ax[0].plot(chorus[:N])
@@ -25,11 +32,11 @@ def chorus_bassline_stem(title, beat_positions, chorus, bassline, N_beats, fs):
     ax[0].set_xlim([-150, N+150])
     ax[0].set_xlabel('Samples')
 
-    ax[1].plot(bassline[len(bassline) - len(chorus):][:N])
+    ax[1].plot(bassline[:N_bassline])
     ax[1].set_title('Bassline')
-    ax[1].vlines(plot_quarter_beats,-1,1, colors='k')
-    ax[1].vlines(plot_beats,-1,1, colors='r', linewidth=2)
-    ax[1].set_xlim([-150, N+150])
+    ax[1].vlines(bassline_quarter_beats,-1,1, colors='k')
+    ax[1].vlines(bassline_beats,-1,1, colors='r', linewidth=2)
+    ax[1].set_xlim([-150*bassline_fs/fs, N_bassline+150*bassline_fs/fs])
     ax[1].set_xlabel('Samples')
 
     fig.suptitle(title)
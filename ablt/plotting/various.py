@@ -7,6 +7,7 @@ import numpy as np
 from matplotlib import pyplot as plt
 
 from .building_blocks import *
+from ..bass_line_extractor.chorus_estimation import EnergyIndex, energy_threshold
 
 # TODO: needs cleaning and fixing functions
 
@@ -136,7 +137,16 @@ def plot_compared_confidences(title, confidence_crepe, confidence_pyin, save=Fal
         plt.show()
 
 
-def energy_levels(title, energies, possible_drops, estimated_drop, epsilon=1, show=True, save=False, plot_title=''):
+def energy_levels(title, energies, possible_drops, estimated_drop, epsilon=1, show=True, save=False, plot_title='',
+                  beat_positions=None):
+    """
+    Plots the energy levels with the possible and the chosen drops. energies can be an EnergyIndex of the track,
+    then the bar energies are queried using the beat_positions.
+    """
+
+    if isinstance(energies, EnergyIndex):
+        assert beat_positions is not None, 'Provide the beat positions for querying the EnergyIndex!'
+        energies = energies.bar_energies(beat_positions)
     
     no_half_sections = int( len(energies)/8 + 1)
     no_sections = int(no_half_sections / 2)
@@ -144,8 +154,8 @@ def energy_levels(title, energies, possible_drops, estimated_drop, epsilon=1, sh
     pre_drop_energies = [energies[idx-1] for idx in possible_drops[0]]
     drop_energies = [energies[idx] for idx in possible_drops[0]]
 
-    mean, std = np.mean(energies), np.std(energies)
-    threshold = mean - (std/epsilon)
+    mean = np.mean(energies)
+    threshold = energy_threshold(energies, epsilon)
     
     fig, ax = plt.subplots(figsize=(20,10))
 
@@ -7,19 +7,20 @@ from .building_blocks import *
 from ..constants import FS
 
 
-def waveform_and_spectrogram(track_title, beat_positions, audio_array, spectrogram, hop_length, F0_estimate=None, show=True, plot_dir='', plot_title=''):
+def waveform_and_spectrogram(track_title, beat_positions, audio_array, spectrogram, hop_length, F0_estimate=None, show=True, plot_dir='', plot_title='',
+                             fs=FS):
     
     fig, ax = plt.subplots(figsize=(20,10), nrows=2, sharex=False, constrained_layout=True) #, dpi=600
     
     create_sup_title(fig, track_title)
     #fig.suptitle(title+'\nIsolated Chorus Bassline in the Beat Grid', fontsize=20)
 
-    form_beat_grid_spectrogram(beat_positions, spectrogram, FS, hop_length, ax[0])
+    form_beat_grid_spectrogram(beat_positions, spectrogram, fs, hop_length, ax[0])
     if F0_estimate is not None:   
         form_pitch_track(F0_estimate, ax[0], label='Quantized Pitch Track') 
     ax[0].legend(loc=1, fontsize=15)
 
-    form_beat_grid_waveform(beat_positions, audio_array, FS, ax[1])
+    form_beat_grid_waveform(beat_positions, audio_array, fs, ax[1])
 
     if plot_dir:
         save_function(plot_dir, track_title, plot_title=plot_title, default_title='Wavefrom_and_Spectrogram')
@@ -8,36 +8,27 @@ from collections import Counter
 import pandas as pd
 import numpy as np
 
-import utilities
-import bassline_transcriber.transcription as transcription
-from representation import transpose_to_C, encode_midi_sequence
+from .. import utilities
+from ..bass_line_transcriber import transcription
+from .encoding import transpose_to_C, encode_midi_sequences, PITCH_CLASSES
 
 # Library for creating a Dataframe of Symbolic Representations
 
 # --------------------------------------- Dataframe Creation ---------------------------------------------------
 
 def create_datasets(df, excluded_titles, track_dicts,  M, N_qb=8, silence_code=0, sustain_code=100, MIN_NOTE=28, MAX_NOTE=51):
-    codes, titles, keys, scales = [], [], [], []
-    for title, key, scale, midi_sequence in zip(df['Title'], df['Key'], df['Scale'], df.iloc[:, 3:].to_numpy()):   
-        try:  
-            if title not in excluded_titles:
-                key = track_dicts[title]['Key'].split(' ')[0]
-                code = encode_midi_sequence(midi_sequence, key, M, N_qb,
-                                            silence_code=silence_code, sustain_code=sustain_code,
-                                            MIN_NOTE=MIN_NOTE, MAX_NOTE=MAX_NOTE) 
-                if code is not None:
-                    codes.append(code)
-                    titles.append(title)
-                    keys.append(key)
-                    scales.append(scale)
-        except KeyboardInterrupt:
-            sys.exit(0)  
-        except FileNotFoundError:
-            pass
-        except Exception as ex:
-            print(''.join(traceback.format_exception(etype=type(ex), value=ex, tb=ex.__traceback__)))
-    codes = np.array(codes).reshape(-1,512//M)
-    df_codes = make_dataframe(codes, titles, keys, scales)
+    titles, scales = df['Title'].to_numpy(), df['Scale'].to_numpy()
+    keys = np.array([track_dicts[title]['Key'].split(' ')[0] if title in track_dicts else '' for title in titles])
+    not_excluded, known_key = ~np.isin(titles, list(excluded_titles)), np.isin(keys, PITCH_CLASSES)
+    for title in titles[not_excluded & ~known_key]:
+        print('{}: no valid key in the track dicts, skipping.'.format(title))
+    included = not_excluded & known_key
+    titles, keys, scales = titles[included], keys[included], scales[included]
+    # Encode all the midi sequences at once
+    codes, valid = encode_midi_sequences(df.iloc[:, 3:].to_numpy()[included], keys, M, N_qb,
+                                         silence_code=silence_code, sustain_code=sustain_code,
+                                         MIN_NOTE=MIN_NOTE, MAX_NOTE=MAX_NOTE)
+    df_codes = make_dataframe(codes, titles[valid], keys[valid], scales[valid])
     df_codes_min = df_codes[df_codes['Scale'] == "min"]
     df_codes_maj = df_codes[df_codes['Scale'] == "maj"]
     df_codes_min.reset_index(drop=True, inplace=True)
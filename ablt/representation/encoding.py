@@ -10,6 +10,40 @@ from ..bass_line_transcriber.transcription import  downsample_midi_sequence
 # |put_sustain|  > code > |make consecutive| > representation > |NN| 
 
 
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+
+def encode_midi_sequences(midi_sequences, keys, M, N_qb=8, sustain_code=100, silence_code=0, MIN_NOTE=28, MAX_NOTE=51):
+    """Encodes a matrix of midi sequences to be used by the Neural Network, every step works on the whole matrix.
+        
+        Parameters:
+        -----------
+            midi_sequences (ndarray): [N, L] midi sequences corresponding to pitch tracks, silence indicated by the
+                                        silence code.
+            keys (array): the key of each sequence e.g. A# (no min or maj indicator)
+            M (int): decimation rate to be applied to the midi sequences
+            N_qb (int, default=8): 
+            sustain_code (int default=100): 
+
+        Returns:
+        --------
+            representations (ndarray): [K, L//M] representations of the K sequences without unwanted midi notes
+            valid (ndarray): [N] bool mask of the encoded sequences"""
+
+    representations = downsample_midi_sequence(np.asarray(midi_sequences), M, N_qb=N_qb)
+    representations = transpose_to_C(representations, keys, silence_code)
+    valid = code_filter(representations, MIN_NOTE=MIN_NOTE, MAX_NOTE=MAX_NOTE, silence_code=silence_code)
+    representations = representations[valid]
+    if sustain_code is not None:
+        representations = put_sustain(representations, sustain_code)
+    representations = make_consecutive_symbols(representations,
+                                               sustain_code=sustain_code,
+                                               silence_code=silence_code,
+                                               MAX_NOTE=MAX_NOTE,
+                                               MIN_NOTE=MIN_NOTE)
+    return representations, valid
+
+
 def encode_midi_sequence(midi_sequence, key, M, N_qb=8, sustain_code=100, silence_code=0, MIN_NOTE=28, MAX_NOTE=51):
     """Encodes a midi sequence to be used by the Neural Network.
         
@@ -25,56 +59,37 @@ def encode_midi_sequence(midi_sequence, key, M, N_qb=8, sustain_code=100, silenc
         --------
             representation None if the midi sequence contains unwanted midi notes or ndarray."""
 
-    representation = midi_sequence.copy()
-    representation = downsample_midi_sequence(representation, M, N_qb=N_qb)
-    representation = transpose_to_C(representation, key, silence_code)
-    if code_filter(representation, MIN_NOTE=MIN_NOTE, MAX_NOTE=MAX_NOTE, silence_code=silence_code):
-        if sustain_code is not None:
-            representation = put_sustain(representation, sustain_code)
-        representation = make_consecutive_symbols(representation, 
-                                                sustain_code=sustain_code,
-                                                silence_code=silence_code,
-                                                MAX_NOTE=MAX_NOTE,
-                                                MIN_NOTE=MIN_NOTE)
-    else:
-        representation = None  
-    return representation
+    representations, valid = encode_midi_sequences(np.asarray(midi_sequence)[None], [key], M, N_qb=N_qb,
+                                                   sustain_code=sustain_code, silence_code=silence_code,
+                                                   MIN_NOTE=MIN_NOTE, MAX_NOTE=MAX_NOTE)
+    return representations[0] if valid[0] else None
 
 
 def put_sustain(sequence, sustain_code=100):
-    for idx in range(len(sequence))[::-1][:-1]:
-        if sequence[idx] == sequence[idx - 1]:
-            sequence[idx] = sustain_code
+    """Replaces the repeated symbols of the sequence(s) with the sustain code, compared along the last axis."""
+    repeated = sequence[..., 1:] == sequence[..., :-1]
+    sequence[..., 1:][repeated] = sustain_code
     return sequence
 
 
 def transpose_to_C(midi_sequence, key, silence_code=0):
-    """Transposes a given midi sequence to C by calculating root distances. Silences are kept zero."""
-
-    def distance_to_C(key):
-        """Returns the number of intervals between the Key and C."""
-
-        pitches = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        return pitches.index(key)
+    """Transposes given midi sequence(s) to C by calculating root distances. Silences are kept zero. Give a key for
+    each row to transpose a matrix of sequences."""
 
-    N_intervals = distance_to_C(key) # root notes distance to C in semitones
+    # root notes distance to C in semitones, looked up once per distinct key
+    unique_keys, key_indices = np.unique(np.asarray(key), return_inverse=True)
+    N_intervals = np.array([PITCH_CLASSES.index(k) for k in unique_keys])[key_indices].reshape(np.shape(key))
+    if np.ndim(N_intervals):
+        N_intervals = N_intervals[:, None]
 
-    midi_array_T = np.array([m-N_intervals if m != silence_code else m for m in midi_sequence])
+    midi_array_T = np.where(midi_sequence != silence_code, midi_sequence - N_intervals, midi_sequence)
     
     return midi_array_T
 
 
 def code_filter(X, MIN_NOTE=28, MAX_NOTE=51, silence_code=0):
-    """"Filter out representations (before putting the sustain)."""
-    flag = True
-    if X[X>MAX_NOTE].size > 0:
-        flag = False
-        return flag
-
-    y = X[X<MIN_NOTE]
-    if y[y!=silence_code].size > 0:
-        flag = False
-    return flag
+    """"Filter out representations (before putting the sustain). A flag is returned for each row of X."""
+    return np.all(X <= MAX_NOTE, axis=-1) & np.all((X >= MIN_NOTE) | (X == silence_code), axis=-1)
 
 
 def make_consecutive_symbols(X, sustain_code=100, silence_code=0, MAX_NOTE=51, MIN_NOTE=28):
@@ -6,7 +6,7 @@ import numpy as np
 from librosa import stft, amplitude_to_db
 from librosa.util import normalize
 
-from scipy.signal import firwin, convolve
+from scipy.signal import firwin, convolve, resample_poly
 
 
 def extract_dB_spectrogram(audio, n_fft, win_length, hop_length, center=True):
@@ -53,3 +53,78 @@ def lp_and_normalize(track, fc, fs, M=5001, window_type='blackman'):
     return track_cut
 
 
+def decimate_track(track, q):
+    """
+    Anti-alias filters and decimates the track by an integer factor.
+
+        Parameters:
+        -----------
+            track (ndarray): audio track
+            q (int): decimation rate
+
+        Returns:
+        --------
+            track_decimated (ndarray): decimated track, sampled at fs/q
+    """
+
+    return resample_poly(track, 1, q).astype(track.dtype)
+
+
+def multirate_lp_and_normalize(track, fc, fs, q=4, min_fs_ratio=10, M=5001, window_type='blackman'):
+    """
+    Low Pass filters the track like lp_and_normalize, but first decimates it in stages of q while the sampling
+    rate stays above min_fs_ratio*fc. The filter tap is scaled with the sampling rate, so the transition band
+    stays the same in Hz while the filtering costs a fraction of the full rate convolution.
+
+        Parameters:
+        -----------
+            track(ndarray): audio track
+            fc (float): Cut-off frequency in Hz
+            fs (float): Sampling frequency in Hz
+            q (int, default=4): decimation rate of each stage
+            min_fs_ratio (float, default=10): lowest sampling rate to reach wrt. the cut-off frequency
+            M (int, default=5001): Filter tap at fs
+            window_type (str, default='blackmann'): window type
+        
+        Returns:
+        --------
+            track_cut (ndarray): processed track, sampled at fs_low
+            fs_low (float): sampling rate of the processed track
+    """
+
+    fs_low = fs
+    while fs_low/q >= min_fs_ratio*fc:
+        track = decimate_track(track, q)
+        fs_low /= q
+
+    M_low = int(M*fs_low/fs) | 1 # keep an odd tap for the Type I filter
+
+    return lp_and_normalize(track, fc, fs_low, M=M_low, window_type=window_type), fs_low
+
+
+def decimate_lp_and_normalize(track, fc, fs, q, M=5001, window_type='blackman'):
+    """
+    Anti-alias filters and decimates the track by q, then low pass filters it like lp_and_normalize at the low
+    rate. The filter tap is scaled with the sampling rate, so the transition band stays the same in Hz.
+
+        Parameters:
+        -----------
+            track(ndarray): audio track
+            fc (float): Cut-off frequency in Hz, must be below fs/(2q)
+            fs (float): Sampling frequency in Hz
+            q (int): decimation rate
+            M (int, default=5001): Filter tap at fs
+            window_type (str, default='blackmann'): window type
+
+        Returns:
+        --------
+            track_cut (ndarray): processed track, sampled at fs/q
+            fs_low (float): sampling rate of the processed track
+    """
+
+    fs_low = fs / q
+    assert fc < fs_low/2, 'The cut-off frequency must be below the Nyquist frequency of the decimated track!'
+
+    M_low = int(M/q) | 1 # keep an odd tap for the Type I filter
+
+    return lp_and_normalize(decimate_track(track, q), fc, fs_low, M=M_low, window_type=window_type), fs_low
@@ -9,7 +9,8 @@ import traceback
 
 import numpy as np
 
-from demucs.pretrained import load_pretrained
+from .model_registry import get_separator
+from .constants import FS, SEPARATOR_MODEL
 
 #-------------------------------------------------- METADATA ------------------------------------------------------------
 
@@ -32,6 +33,26 @@ def get_chorus_beat_positions(output_dir):
     title = os.path.basename(output_dir)
     return np.load(os.path.join(output_dir, 'chorus', 'beat_positions', title+'.npy'))
     
+BASS_LINE_METADATA = 'bass_line_metadata.json' # Reserved name, it can not be mistaken for a bass line .npy
+
+def export_bass_line_fs(fs, bass_line_dir):
+    """
+    Writes the sampling rate of the bass lines in a directory to its metadata file.
+    """
+    os.makedirs(bass_line_dir, exist_ok=True)
+    with open(os.path.join(bass_line_dir, BASS_LINE_METADATA), 'w') as outfile:
+        json.dump({'fs': float(fs)}, outfile)
+
+def get_bass_line_fs(bass_line_dir):
+    """
+    Loads the sampling rate of the bass lines in a directory. Bass lines that were exported without it are at FS.
+    """
+    metadata_path = os.path.join(bass_line_dir, BASS_LINE_METADATA)
+    if not os.path.isfile(metadata_path):
+        return FS
+    with open(metadata_path, 'r') as infile:
+        return float(json.load(infile)['fs'])
+    
 def get_bar_positions(beat_positions):
     """
    Finds the bar positions from a gşven beat positions array.     
@@ -56,8 +77,8 @@ def get_eighth_beat_positions(beat_positions):
 
 # Load Source Separation Model
 
-def load_source_separation_model():
-    separator = load_pretrained('demucs_extra')
+def load_source_separation_model(name=SEPARATOR_MODEL):
+    separator = get_separator(name)
     return separator
 
 #-------------------------------------------------- Miscallenous ------------------------------------------------------------
@@ -93,14 +114,12 @@ def exception_logger(dir, ex, title):
 #-------------------------------------------------- Printing ------------------------------------------------------------
 
 def print_midi_array(midi_array):  
-    x = list([list(row) for row in midi_array])
-    x.insert(0,['Start Beat', 'MIDI Number', 'Velocity', 'Duration'])
     print('{:^59}\n'.format('Bassline MIDI Array'))
     print('{:^15}{:^16}{:^14}{:^14}'.format('Start Beat', 'MIDI Number', 'Velocity', 'Duration'))
     print('-'*59)
     for row in midi_array:      
-        start, dur = row[0], row[3]
-        m, vel = row[1].astype(int), row[2].astype(int)   
+        start, dur = row['start_beat'], row['duration']
+        m, vel = int(row['midi_number']), int(row['velocity'])
         print('|{:^13}|{:^15}|{:^13}|{:^13}|'.format(start, m, vel, dur))
 
 def print_symbolic_representation(symbolic_representation):
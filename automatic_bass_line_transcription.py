@@ -4,12 +4,15 @@ import argparse
 import numpy as np
 
 from ablt.utilities import read_track_dicts
+from ablt.cache import enable_caches
+from ablt.model_registry import warm_up, get_separator
 
 from ablt.bass_line_extractor import extract_single_bass_line
+from ablt.bass_line_extractor.separation import configure_chunk_threads
 from ablt.bass_line_transcriber import transcribe_single_bass_line
 
 from ablt.directories import OUTPUT_DIR, TRACK_DICTS_PATH, AUDIO_DIR
-from ablt.constants import HOP_RATIO, M
+from ablt.constants import HOP_RATIO, M, SEPARATOR_MODELS, SEPARATOR_MODEL, F0_ESTIMATORS
 
 
 # TODO: integrate parallel processing
@@ -19,9 +22,21 @@ if __name__ == "__main__":
     parser.add_argument('-a', '--audio-dir', type=str, help="Directory containing all the audio files.", default=AUDIO_DIR)
     parser.add_argument('-n', '--n-bars', type=int, help="Number of chorus bars to extract.", default=4)
     parser.add_argument('-f', '--hop-ratio', type=int, help="Number of F0 samples that makes up a beat.", default=HOP_RATIO)
+    parser.add_argument('-e', '--F0-estimator', type=str, choices=F0_ESTIMATORS, help="F0 estimator of the transcription.", default='pYIN')
     parser.add_argument('-t', '--track-dicts', action="store_true", help="Use a track_dicts.json file.")
+    parser.add_argument('-l', '--low-memory', action="store_true", help="Drop the full rate track after beat tracking and decode only the chorus again.")
+    parser.add_argument('-g', '--fixed-grid', action="store_true", help="Fit a fixed beat grid using the BPM of the track_dicts.json file.")
+    parser.add_argument('-s', '--separator-model', type=str, choices=SEPARATOR_MODELS, help="Pretrained demucs model for the source separation.", default=SEPARATOR_MODEL)
+    parser.add_argument('-q', '--quantize-separator', action="store_true", help="Use the int8 dynamic quantized separator.")
+    parser.add_argument('-w', '--chunk-workers', type=int, help="Separate the chunks of a chorus in parallel with this many threads.", default=None)
+    parser.add_argument('--split-chorus', action="store_true", help="Shorten the separation segment so the chunk workers share the chorus, changes the separated bass line.")
+    parser.add_argument('--traced-separator', type=str, help="Path of a serialized TracedSeparator to use.", default=None)
+    parser.add_argument('-c', '--cache', action="store_true", help="Cache the decoded audio, the separated bass lines and the pYIN outputs on disk.")
     args = parser.parse_args()
 
+    if args.cache:
+        enable_caches()
+
     audio_dir = args.audio_dir
     N_bars = args.n_bars
     hop_ratio = args.hop_ratio
@@ -32,6 +47,16 @@ if __name__ == "__main__":
     else:
         track_dicts = None  
 
+    # Load the shared demucs and madmom models once
+    warm_up(args.separator_model, quantized=args.quantize_separator, traced_path=args.traced_separator)
+    separator = get_separator(args.separator_model, args.quantize_separator, args.traced_separator)
+
+    if args.chunk_workers and args.split_chorus: # bound torch's threads once, the chunk workers share the cores
+        configure_chunk_threads(args.chunk_workers)
+    elif args.chunk_workers:
+        print('Warning: a chorus usually fits into a single separation segment, --chunk-workers only speeds up '
+              'the separation with --split-chorus.')
+
     if os.path.isfile(audio_dir): # if a single file is specified
 
         title = os.path.splitext(os.path.basename(audio_dir))[0]
@@ -41,7 +66,9 @@ if __name__ == "__main__":
         else:
             BPM = track_dicts[title]['BPM']
         
-        extract_single_bass_line(audio_dir, N_bars=N_bars, separator=None, BPM=BPM)
+        extract_single_bass_line(audio_dir, N_bars=N_bars, separator=separator, BPM=BPM, low_memory=args.low_memory,
+                                 fixed_grid=args.fixed_grid, chunk_workers=args.chunk_workers,
+                                 split_chorus=args.split_chorus)
 
         # Update with the estimated BPM
         if track_dicts is None:
@@ -50,7 +77,7 @@ if __name__ == "__main__":
         
         bassline_path = os.path.join(OUTPUT_DIR, title, 'bass_line', title+'.npy')
         transcribe_single_bass_line(bassline_path, BPM=BPM, M=M,
-                                    N_bars=N_bars, hop_ratio=hop_ratio)
+                                    N_bars=N_bars, hop_ratio=hop_ratio, F0_estimator=args.F0_estimator)
 
     else: # if a folder of audio files is specified
 
@@ -65,7 +92,9 @@ if __name__ == "__main__":
                 BPM = track_dicts[title]['BPM']
 
             audio_path = os.path.join(audio_dir, title_ext)
-            extract_single_bass_line(audio_path, N_bars=N_bars, separator=None, BPM=BPM)
+            extract_single_bass_line(audio_path, N_bars=N_bars, separator=separator, BPM=BPM, low_memory=args.low_memory,
+                                 fixed_grid=args.fixed_grid, chunk_workers=args.chunk_workers,
+                                 split_chorus=args.split_chorus)
 
             # Update with the estimated BPM
             if track_dicts is None:
@@ -74,4 +103,4 @@ if __name__ == "__main__":
             
             bassline_path = os.path.join(OUTPUT_DIR, title, 'bass_line', title+'.npy')
             transcribe_single_bass_line(bassline_path, BPM=BPM, M=M, 
-                                        N_bars=N_bars, hop_ratio=hop_ratio)
\ No newline at end of file
+                                        N_bars=N_bars, hop_ratio=hop_ratio, F0_estimator=args.F0_estimator)
\ No newline at end of file
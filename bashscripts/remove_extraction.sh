@@ -11,6 +11,10 @@ for file in "data/outputs/*/"; do
     delete_string="$file$string"
     rm -rf $delete_string
 
+    string="/beat_activations"
+    delete_string="$file$string"
+    rm -rf $delete_string
+
     string="/chorus"
     delete_string="$file$string"
     rm -rf $delete_string  
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Speed and note accuracy of the semitone grid YIN against librosa's pyin. The estimators run on synthetic bass
+lines with known notes, and on the extracted bass lines if there are any, where pyin serves as the reference.
+
+Run from the repository root:
+
+    python -m benchmarks.F0_estimators --n-bass-lines 20
+"""
+
+import os
+import glob
+import time
+import argparse
+
+import numpy as np
+
+from ablt.bass_line_transcriber.transcription import pYIN_F0, semitone_YIN_F0, frequency_to_midi_sequence
+from ablt.utilities import get_bass_line_fs
+from ablt.cache import configure_pyin_cache
+from ablt.directories import OUTPUT_DIR
+from ablt.constants import BASS_LINE_FS, HOP_RATIO, PYIN_THRESHOLD, SUB_BASS_FREQUENCIES, MIDI_PITCH_MIN
+
+ESTIMATORS = {'pYIN': pYIN_F0, 'semitone_YIN': semitone_YIN_F0}
+
+
+def synthesize_bass_line(rng, BPM=125, N_bars=4, fs=BASS_LINE_FS, silence_ratio=0.15):
+    """
+    Synthesizes a bass line of random quarter beat notes with a few harmonics.
+
+        Returns:
+        --------
+            bass_line (ndarray): audio
+            beat_duration (float): in seconds
+            midi_sequence (ndarray): MIDI number of each F0 sample, 0 for silence
+    """
+
+    beat_duration = 60/BPM
+    N_qb = N_bars*4*4
+    notes = rng.integers(0, len(SUB_BASS_FREQUENCIES), N_qb)
+    silent = rng.random(N_qb) < silence_ratio
+
+    t = np.arange(int(N_qb*beat_duration/4*fs)) / fs
+    qb_idx = np.minimum((4*t/beat_duration).astype(int), N_qb-1)
+    f = np.where(silent[qb_idx], 0, SUB_BASS_FREQUENCIES[notes[qb_idx]])
+    phase = 2*np.pi*np.cumsum(f)/fs
+    bass_line = (np.sin(phase) + 0.4*np.sin(2*phase) + 0.2*np.sin(3*phase)) * (f > 0)
+    bass_line += 0.01*rng.standard_normal(len(t))
+
+    sample_qb_idx = np.arange(N_qb*HOP_RATIO//4) // (HOP_RATIO//4)
+    midi_sequence = np.where(silent[sample_qb_idx], 0, notes[sample_qb_idx] + MIDI_PITCH_MIN)
+
+    return bass_line, beat_duration, midi_sequence
+
+
+def load_bass_lines(n_bass_lines):
+    """Returns [(bass_line, beat_duration, fs)] of the extracted bass lines."""
+
+    bass_lines = []
+    for path in sorted(glob.glob(os.path.join(OUTPUT_DIR, '*', 'bass_line', '*.npy')))[:n_bass_lines]:
+        title = os.path.splitext(os.path.basename(path))[0]
+        BPM_path = os.path.join(OUTPUT_DIR, title, 'beat_grid', 'BPM.npy')
+        if os.path.isfile(BPM_path):
+            bass_lines.append((np.load(path), 60/float(np.load(BPM_path)), get_bass_line_fs(os.path.dirname(path))))
+    return bass_lines
+
+
+def midi_sequence(estimator, bass_line, beat_duration, fs):
+    """Returns the confidence filtered MIDI sequence of an estimator and its duration."""
+
+    start_time = time.time()
+    _, pitch_track = ESTIMATORS[estimator](bass_line, beat_duration, HOP_RATIO, 4, PYIN_THRESHOLD, fs=fs)
+    duration = time.time() - start_time
+    return frequency_to_midi_sequence(pitch_track[1]), duration
+
+
+def note_accuracy(estimate, reference):
+    """Returns the note accuracy on the voiced reference samples and the voicing accuracy."""
+    voiced = reference > 0
+    return np.mean(estimate[voiced] == reference[voiced]), np.mean((estimate > 0) == voiced)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='F0 estimator speed/accuracy benchmark.')
+    parser.add_argument('-n', '--n-bass-lines', type=int, help="Number of bass lines of each kind.", default=20)
+    parser.add_argument('--seed', type=int, help="Seed of the synthetic bass lines.", default=0)
+    args = parser.parse_args()
+
+    configure_pyin_cache(max_bytes=0) # time pyin, not the cache
+
+    rng = np.random.default_rng(args.seed)
+    synthetic = [synthesize_bass_line(rng, BPM=rng.uniform(115, 135)) for _ in range(args.n_bass_lines)]
+
+    print('{} synthetic bass lines at {} Hz\n'.format(len(synthetic), BASS_LINE_FS))
+    print('{:>14} | {:>12} | {:>14} | {:>15}'.format('estimator', 's/bass line', 'note accuracy', 'voicing accuracy'))
+    for estimator in ESTIMATORS:
+        durations, accuracies = [], []
+        for bass_line, beat_duration, reference in synthetic:
+            estimate, duration = midi_sequence(estimator, bass_line, beat_duration, BASS_LINE_FS)
+            durations.append(duration)
+            accuracies.append(note_accuracy(estimate, reference))
+        note_acc, voicing_acc = np.mean(accuracies, axis=0)
+        print('{:>14} | {:>12.4f} | {:>14.3f} | {:>15.3f}'.format(estimator, np.mean(durations), note_acc, voicing_acc))
+
+    extracted = load_bass_lines(args.n_bass_lines)
+    if extracted:
+        print('\n{} extracted bass lines, pYIN as the reference\n'.format(len(extracted)))
+        print('{:>14} | {:>12} | {:>14} | {:>15}'.format('estimator', 's/bass line', 'note agreement',
+                                                        'voicing agreement'))
+        references = {}
+        for estimator in ESTIMATORS:
+            durations, agreements = [], []
+            for idx, (bass_line, beat_duration, fs) in enumerate(extracted):
+                estimate, duration = midi_sequence(estimator, bass_line, beat_duration, fs)
+                references.setdefault(idx, estimate)
+                durations.append(duration)
+                agreements.append(note_accuracy(estimate, references[idx]))
+            note_agreement, voicing_agreement = np.mean(agreements, axis=0)
+            print('{:>14} | {:>12.4f} | {:>14.3f} | {:>15.3f}'.format(estimator, np.mean(durations), note_agreement,
+                                                                        voicing_agreement))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Separation latency of a single chorus against the number of chunk workers, with and without splitting the chorus
+among them. Each configuration runs in a fresh process, so its torch thread count is set like the scripts set it.
+
+Run from the repository root:
+
+    python -m benchmarks.chunk_workers --n-choruses 4 --chunk-workers 2 4
+"""
+
+import os
+import sys
+import time
+import pickle
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+
+def run(model, n_choruses, N_bars, chunk_workers, split_chorus, output_path):
+    """Separates the choruses with a configuration and pickles the latencies and the bass lines."""
+
+    import torch as th
+
+    from ablt.bass_line_extractor.separation import separate_bass_line, configure_chunk_threads
+    from ablt.model_registry import get_separator
+    from benchmarks.separation_throughput import load_choruses
+
+    if chunk_workers and split_chorus:
+        configure_chunk_threads(chunk_workers)
+
+    separator = get_separator(model)
+    choruses = load_choruses(n_choruses, N_bars=N_bars)
+    separate_bass_line(separator, choruses[0], chunk_workers, split_chorus, use_cache=False) # warm up
+
+    latencies, bass_lines = [], []
+    for chorus in choruses:
+        start_time = time.time()
+        bass_lines.append(separate_bass_line(separator, chorus, chunk_workers, split_chorus, use_cache=False))
+        latencies.append(time.time() - start_time)
+
+    with open(output_path, 'wb') as outfile:
+        pickle.dump((latencies, bass_lines, th.get_num_threads()), outfile)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Chunk worker separation latency benchmark.')
+    parser.add_argument('-m', '--model', type=str, help="Pretrained demucs model.", default='demucs_extra')
+    parser.add_argument('-n', '--n-choruses', type=int, help="Number of choruses to separate.", default=4)
+    parser.add_argument('-N', '--n-bars', type=int, help="Number of bars of the synthesized choruses.", default=4)
+    parser.add_argument('-w', '--chunk-workers', type=int, nargs='+', help="Chunk workers to try.", default=[2, 4])
+    parser.add_argument('--run', type=str, nargs=3, help=argparse.SUPPRESS, default=None)
+    args = parser.parse_args()
+
+    if args.run is not None: # a single configuration in a child process
+        chunk_workers, split_chorus, output_path = int(args.run[0]) or None, args.run[1] == '1', args.run[2]
+        run(args.model, args.n_choruses, args.n_bars, chunk_workers, split_chorus, output_path)
+        sys.exit(0)
+
+    configurations = [(0, False)] + [(w, split) for w in args.chunk_workers for split in [False, True]]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for chunk_workers, split_chorus in configurations:
+            output_path = os.path.join(tmp_dir, 'w{}_s{:d}.pkl'.format(chunk_workers, split_chorus))
+            subprocess.run([sys.executable, '-m', 'benchmarks.chunk_workers', '-m', args.model,
+                            '-n', str(args.n_choruses), '-N', str(args.n_bars),
+                            '--run', str(chunk_workers), str(int(split_chorus)), output_path], check=True)
+            with open(output_path, 'rb') as infile:
+                results[(chunk_workers, split_chorus)] = pickle.load(infile)
+
+    _, reference, _ = results[(0, False)]
+    print('{:>14} | {:>13} | {:>13} | {:>8} | {:>14}'.format('chunk workers', 'split chorus', 'torch threads',
+                                                             's/chorus', 'max deviation'))
+    for (chunk_workers, split_chorus), (latencies, bass_lines, num_threads) in results.items():
+        deviation = max(np.max(np.abs(bass_line - ref)) / (np.max(np.abs(ref)) + 1e-8)
+                                                                for bass_line, ref in zip(bass_lines, reference))
+        print('{:>14} | {:>13} | {:>13} | {:>8.3f} | {:>14.2e}'.format(chunk_workers or '-', str(split_chorus),
+                                                                       num_threads, np.median(latencies),
+                                                                       deviation))
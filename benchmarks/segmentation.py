@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Speed of the compiled voiced region segmentation and onset/offset merging. Both are compared against the
+reference Python loops on random pitch tracks and jittered beat grids, the outputs must be identical. The same
+comparison runs as a test in tests/test_segmentation.py.
+
+Run from the repository root:
+
+    python -m benchmarks.segmentation --n-cases 2000
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from ablt.bass_line_transcriber.transcription.quantization.segmentation import (find_voiced_regions,
+                                                                                segment_voiced_regions)
+from ablt.bass_line_transcriber.transcription.quantization.post_processing import onset_offset_merger
+from ablt.constants import HOP_RATIO
+
+
+def reference_closest_index(array, value):
+    delta = np.abs(value - array)
+    return np.where(delta==np.min(delta))[0][0]
+
+
+def reference_segment_voiced_regions(time_axis, region_boundaries, length_threshold, quarter_beat_positions):
+    """The segmentation scanning the whole time axis and beat grid for every boundary."""
+
+    quarter_beat_positions = quarter_beat_positions - quarter_beat_positions[0]
+    delta_time = np.diff(time_axis).max()/2
+
+    segmented_good_regions, okay_region_boundaries, bad_region_boundaries = [], [], []
+    for onset_idx, upper_bound in region_boundaries:
+
+        offset_idx = upper_bound - 1
+        region_length = offset_idx - onset_idx + 1
+
+        if region_length > length_threshold:
+
+            segment_boundaries = []
+
+            onset_time, offset_time = time_axis[onset_idx], time_axis[offset_idx]
+            start_beat_idx = reference_closest_index(quarter_beat_positions, onset_time)
+            end_beat_idx = reference_closest_index(quarter_beat_positions, offset_time)
+            start_beat_time, end_beat_time = quarter_beat_positions[start_beat_idx], quarter_beat_positions[end_beat_idx]
+
+            if onset_time > start_beat_time and delta_time <= onset_time - start_beat_time:
+                start_beat_idx += 1
+                start_beat_time = quarter_beat_positions[start_beat_idx]
+
+            if offset_time < end_beat_time and delta_time <= end_beat_time - offset_time:
+                end_beat_idx -= 1
+
+            b2 = reference_closest_index(time_axis, start_beat_time)
+            if not onset_idx == b2:
+                segment_boundaries.append([onset_idx, b2])
+
+            for k in np.arange(start_beat_idx, end_beat_idx):
+                segment_boundaries.append([reference_closest_index(time_axis, quarter_beat_positions[k]),
+                                           reference_closest_index(time_axis, quarter_beat_positions[k+1])])
+
+            b1 = reference_closest_index(time_axis, quarter_beat_positions[end_beat_idx])
+            if not b1 == upper_bound:
+                segment_boundaries.append([b1, upper_bound])
+
+            segmented_good_regions.append(segment_boundaries)
+
+        elif region_length >= int(length_threshold/2):
+            okay_region_boundaries.append([onset_idx, upper_bound])
+
+        else:
+            bad_region_boundaries.append([onset_idx, upper_bound])
+
+    return segmented_good_regions, okay_region_boundaries, bad_region_boundaries
+
+
+def reference_onset_offset_merger(pitch_track, regions, length_threshold=8):
+    """The onset/offset merging with nested Python loops."""
+
+    F0 = pitch_track[1].copy()
+    for region_segments in regions:
+
+        no_segments = len(region_segments)
+        if no_segments > 2:
+            for segment_idx, (start, end) in enumerate(region_segments):
+                if end - start < length_threshold:
+                    if segment_idx == 0:
+                        F0[start:end] = F0[region_segments[segment_idx+1][0]]
+                    if segment_idx == no_segments-1:
+                        F0[start:end] = F0[region_segments[segment_idx-1][1]-1]
+
+        elif no_segments == 2:
+            (ps, pe), (ns, ne) = region_segments
+            len1, len2 = pe-ps, ne-ns
+            if not (len1==length_threshold and len2==length_threshold):
+                if len1>len2:
+                    F0[ns : ne] = F0[pe-1]
+                else:
+                    F0[ps : pe] = F0[ns]
+
+    return (pitch_track[0], F0)
+
+
+def random_case(rng, N_bars=4, hop_ratio=HOP_RATIO):
+    """
+    Returns a random pitch track with voiced runs of random lengths and a jittered quarter beat grid.
+
+        Returns:
+        --------
+            pitch_track (tupple): (time_axis, F0)
+            quarter_beat_positions (ndarray): quarter beat times
+    """
+
+    beat_duration = 60/rng.uniform(115, 135)
+    N = N_bars*4*hop_ratio
+
+    time_axis = np.arange(N) * beat_duration/hop_ratio
+
+    # alternating silent and voiced runs
+    run_lengths = rng.integers(1, 3*hop_ratio//4, N)
+    voiced = np.repeat(np.arange(len(run_lengths)) % 2 == rng.integers(2), run_lengths)[:N]
+    F0 = np.where(voiced, rng.uniform(30, 125, N), 0.0)
+
+    beat_positions = rng.uniform(0, 10) + np.arange(N_bars*4+2)*beat_duration
+    beat_positions += rng.normal(0, beat_duration/50, len(beat_positions))
+    quarter_beat_positions = np.concatenate([np.linspace(beat_positions[i], beat_positions[i+1], 4, endpoint=False)
+                                             for i in range(len(beat_positions)-1)])
+
+    return (time_axis, F0), quarter_beat_positions
+
+
+def compare(segmentation, reference_segmentation):
+    """True if both segmentations are identical."""
+
+    segments, region_offsets, okay_regions, bad_regions = segmentation
+    reference_segments, reference_okay_boundaries, reference_bad_boundaries = reference_segmentation
+
+    segmented_good_regions = [segments.boundaries[start:end].tolist() for start, end in zip(region_offsets[:-1],
+                                                                                              region_offsets[1:])]
+
+    return (segmented_good_regions == [[list(bounds) for bounds in region] for region in reference_segments] and
+            okay_regions.boundaries.tolist() == [list(bounds) for bounds in reference_okay_boundaries] and
+            bad_regions.boundaries.tolist() == [list(bounds) for bounds in reference_bad_boundaries])
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Compiled segmentation property test and benchmark.')
+    parser.add_argument('-n', '--n-cases', type=int, help="Number of random pitch tracks.", default=2000)
+    parser.add_argument('--seed', type=int, help="Seed of the random pitch tracks.", default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cases = []
+    for _ in range(args.n_cases):
+        pitch_track, quarter_beat_positions = random_case(rng)
+        cases.append((pitch_track, find_voiced_regions(pitch_track[1]), int(rng.choice([4, 8, 12])),
+                      quarter_beat_positions))
+
+    segment_voiced_regions(cases[0][0][0], cases[0][1], cases[0][2], cases[0][3]) # compile
+
+    mismatches, durations = 0, {'reference': 0.0, 'compiled': 0.0}
+    for pitch_track, voiced_regions, length_threshold, quarter_beat_positions in cases:
+
+        start_time = time.perf_counter()
+        reference_segmentation = reference_segment_voiced_regions(pitch_track[0], voiced_regions.boundaries,
+                                                                  length_threshold, quarter_beat_positions)
+        reference_merged = reference_onset_offset_merger(pitch_track, reference_segmentation[0])
+        durations['reference'] += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        segmentation = segment_voiced_regions(pitch_track[0], voiced_regions, length_threshold,
+                                              quarter_beat_positions)
+        merged = onset_offset_merger(pitch_track, segmentation[0], segmentation[1])
+        durations['compiled'] += time.perf_counter() - start_time
+
+        if not (compare(segmentation, reference_segmentation) and np.array_equal(merged[1], reference_merged[1])):
+            mismatches += 1
+
+    print('{} random pitch tracks, {} mismatches'.format(len(cases), mismatches))
+    for name, duration in durations.items():
+        print('{:>10}: {:.3f} ms/pitch track'.format(name, 1e3*duration/len(cases)))
+
+    assert not mismatches, 'The compiled segmentation does not match the reference!'
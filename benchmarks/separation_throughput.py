@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Separation throughput against the batch size of the batched demucs inference.
+
+Run from the repository root:
+
+    python -m benchmarks.separation_throughput --n-choruses 16 --batch-sizes 1 2 4 8 16
+"""
+
+import os
+import glob
+import time
+import argparse
+
+import numpy as np
+import torch as th
+
+from demucs.utils import apply_model
+
+from ablt.bass_line_extractor.separation import separate_bass_lines_batch
+from ablt.model_registry import get_separator
+from ablt.directories import OUTPUT_DIR
+from ablt.constants import FS
+
+
+def load_choruses(n_choruses, N_bars=4, BPM=125, seed=0):
+    """Loads the exported chorus arrays, synthesizes noise choruses of similar lengths if there are not enough."""
+
+    paths = sorted(glob.glob(os.path.join(OUTPUT_DIR, '*', 'chorus', 'array', '*.npy')))[:n_choruses]
+    choruses = [np.load(path) for path in paths]
+
+    rng = np.random.default_rng(seed)
+    while len(choruses) < n_choruses:
+        length = int(N_bars*4*60/rng.uniform(0.97*BPM, 1.03*BPM)*FS)
+        choruses.append((0.1*rng.standard_normal(length)).astype(np.float32))
+    return choruses
+
+
+def separate_sequential(separator, choruses):
+    """Separates the choruses one by one like SourceSeparator.separate_bass_line."""
+
+    bass_lines = []
+    for chorus in choruses:
+        wav = np.stack([chorus]*2, axis=0)
+        ref = wav.mean(0)
+        mean, std = ref.mean(), ref.std()
+        sources = apply_model(separator, th.tensor((wav - mean) / std), shifts=0, split=True, overlap=0.25)
+        bass_lines.append((sources[1] * std + mean).numpy())
+    return bass_lines
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Batched separation throughput benchmark.')
+    parser.add_argument('-m', '--model', type=str, help="Pretrained demucs model.", default='demucs_extra')
+    parser.add_argument('-n', '--n-choruses', type=int, help="Number of choruses to separate.", default=16)
+    parser.add_argument('-b', '--batch-sizes', type=int, nargs='+', help="Batch sizes to try.", default=[1, 2, 4, 8, 16])
+    parser.add_argument('-j', '--threads', type=int, help="Torch intra-op threads, 0 for the default.", default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        th.set_num_threads(args.threads)
+
+    separator = get_separator(args.model)
+    choruses = load_choruses(args.n_choruses)
+    print('{} choruses, {} torch threads\n'.format(len(choruses), th.get_num_threads()))
+
+    separate_sequential(separator, choruses[:1]) # warm up
+
+    start_time = time.time()
+    reference = separate_sequential(separator, choruses)
+    duration = time.time() - start_time
+    print('{:>12} | {:>10} | {:>12} | {:>14}'.format('batch size', 's/chorus', 'choruses/s', 'max deviation'))
+    print('{:>12} | {:>10.3f} | {:>12.3f} | {:>14}'.format('sequential', duration/len(choruses),
+                                                            len(choruses)/duration, '-'))
+
+    for batch_size in args.batch_sizes:
+        start_time = time.time()
+        bass_lines = separate_bass_lines_batch(separator, choruses, batch_size=batch_size, use_cache=False)
+        duration = time.time() - start_time
+
+        deviation = max(np.max(np.abs(bass_line - ref)) / (np.max(np.abs(ref)) + 1e-8)
+                                                                for bass_line, ref in zip(bass_lines, reference))
+        print('{:>12} | {:>10.3f} | {:>12.3f} | {:>14.2e}'.format(batch_size, duration/len(choruses),
+                                                                  len(choruses)/duration, deviation))
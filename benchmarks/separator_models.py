@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Speed, memory and transcription quality of the pretrained separation models on a fixed set of choruses.
+Every model runs in its own process so the peak memory is measured separately, the MIDI sequences are compared
+with the ones obtained using demucs_extra.
+
+Needs extracted choruses in the outputs directory. Run from the repository root:
+
+    python -m benchmarks.separator_models --n-choruses 10 --models demucs_extra demucs tasnet
+"""
+
+import os
+import glob
+import time
+import resource
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+
+from ablt.constants import FS, BASS_LINE_FS, HOP_RATIO, PYIN_THRESHOLD, SEPARATOR_MODELS
+from ablt.directories import OUTPUT_DIR
+
+
+def load_benchmark_choruses(n_choruses):
+    """Returns {title: (chorus, chorus_beat_positions)} of the first extracted choruses."""
+
+    choruses = {}
+    for path in sorted(glob.glob(os.path.join(OUTPUT_DIR, '*', 'chorus', 'array', '*.npy'))):
+        title = os.path.splitext(os.path.basename(path))[0]
+        beat_positions_path = os.path.join(OUTPUT_DIR, title, 'chorus', 'beat_positions', title+'.npy')
+        if os.path.isfile(beat_positions_path):
+            choruses[title] = (np.load(path), np.load(beat_positions_path))
+        if len(choruses) == n_choruses:
+            break
+    return choruses
+
+
+def transcribe(bass_line, chorus_beat_positions, N_bars=4, hop_ratio=HOP_RATIO, epsilon=2):
+    """Transcribes a separated bass line to a MIDI number sequence like the BassLineTranscriber."""
+
+    from ablt.bass_line_transcriber.transcription import (pYIN_F0, adaptive_voiced_region_quantization,
+                                                            frequency_to_midi_sequence)
+    from ablt.utilities import get_quarter_beat_positions
+
+    beat_duration = np.mean(np.diff(chorus_beat_positions))
+    _, pitch_track = pYIN_F0(bass_line, beat_duration, hop_ratio, N_bars, PYIN_THRESHOLD, fs=BASS_LINE_FS)
+    pitch_track_quantized = adaptive_voiced_region_quantization(pitch_track,
+                                                    get_quarter_beat_positions(chorus_beat_positions),
+                                                    length_threshold=hop_ratio//4, epsilon=epsilon)
+    return frequency_to_midi_sequence(pitch_track_quantized[1])
+
+
+def run_model(model_name, choruses, queue):
+    """Separates and transcribes the choruses with a model, runs in a fresh process."""
+
+    from ablt.cache import configure_separation_cache
+    from ablt.model_registry import get_separator
+    from ablt.bass_line_extractor.parallel_processing.batch_source_separator import separate_single_bassline
+
+    configure_separation_cache(max_bytes=0) # time the separation, not the cache
+    separator = get_separator(model_name)
+    separate_single_bassline(next(iter(choruses.values()))[0], separator, FS) # warm up
+
+    bass_lines, duration = {}, 0
+    for title, (chorus, _) in choruses.items():
+        start_time = time.time()
+        bass_lines[title] = separate_single_bassline(chorus, separator, FS)
+        duration += time.time() - start_time
+
+    midi_sequences = {title: transcribe(bass_lines[title], chorus_beat_positions)
+                                                for title, (_, chorus_beat_positions) in choruses.items()}
+
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # in MB
+    queue.put((duration/len(choruses), peak_memory, midi_sequences))
+
+
+def note_agreement(midi_sequences, reference_sequences):
+    """Mean frame-wise MIDI number agreement with the reference sequences."""
+    return np.mean([np.mean(midi_sequences[title] == reference_sequences[title]) for title in reference_sequences])
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Separation model speed/quality benchmark.')
+    parser.add_argument('-n', '--n-choruses', type=int, help="Number of extracted choruses to use.", default=10)
+    parser.add_argument('-m', '--models', type=str, nargs='+', choices=SEPARATOR_MODELS, help="Models to compare.",
+                        default=['demucs_extra', 'demucs', 'demucs_quantized', 'tasnet', 'tasnet_extra'])
+    args = parser.parse_args()
+
+    choruses = load_benchmark_choruses(args.n_choruses)
+    assert choruses, 'No extracted choruses found in {}, extract some bass lines first!'.format(OUTPUT_DIR)
+    print('{} choruses\n'.format(len(choruses)))
+
+    models = ['demucs_extra'] + [model for model in args.models if model != 'demucs_extra'] # reference first
+
+    ctx = mp.get_context('spawn')
+    results = {}
+    for model_name in models:
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_model, args=(model_name, choruses, queue))
+        process.start()
+        results[model_name] = queue.get()
+        process.join()
+
+    reference_sequences = results['demucs_extra'][2]
+    print('{:>18} | {:>10} | {:>16} | {:>15}'.format('model', 's/chorus', 'peak memory (MB)', 'note agreement'))
+    for model_name, (s_per_chorus, peak_memory, midi_sequences) in results.items():
+        print('{:>18} | {:>10.3f} | {:>16.0f} | {:>15.3f}'.format(model_name, s_per_chorus, peak_memory,
+                                                            note_agreement(midi_sequences, reference_sequences)))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Speedup and bass stem SDR drift of the optimized separators against the float demucs model.
+Optionally exports a traced separator to be used with --traced-separator.
+
+Run from the repository root:
+
+    python -m benchmarks.separator_optimization --n-choruses 8 --export data/cache/demucs_extra_int8.pt
+"""
+
+import time
+import argparse
+
+import torch as th
+
+from demucs.pretrained import load_pretrained
+
+from ablt.bass_line_extractor.separation import (quantize_separator, trace_separator, compare_separators,
+                                                TracedSeparator)
+
+from benchmarks.separation_throughput import load_choruses
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Optimized separator comparison.')
+    parser.add_argument('-m', '--model', type=str, help="Pretrained demucs model.", default='demucs_extra')
+    parser.add_argument('-n', '--n-choruses', type=int, help="Number of choruses to separate.", default=8)
+    parser.add_argument('-d', '--duration', type=float, help="Longest chunk of the traced models in sec.", default=20)
+    parser.add_argument('-e', '--export', type=str, help="Export the traced int8 separator to this path.", default=None)
+    parser.add_argument('-j', '--threads', type=int, help="Torch intra-op threads, 0 for the default.", default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        th.set_num_threads(args.threads)
+
+    start_time = time.time()
+    separator = load_pretrained(args.model)
+    separator.eval()
+    load_duration = time.time() - start_time
+
+    choruses = load_choruses(args.n_choruses)
+
+    quantized = quantize_separator(separator)
+    candidates = {'int8': quantized,
+                  'traced float': trace_separator(separator, args.duration),
+                  'traced int8': trace_separator(quantized, args.duration)}
+
+    compare_separators(separator, separator, choruses[:1]) # warm up
+
+    print('{:>14} | {:>10} | {:>8} | {:>15} | {:>14}'.format('separator', 's/chorus', 'speedup',
+                                                             'mean SDR (dB)', 'min SDR (dB)'))
+    for name, candidate in candidates.items():
+        comparison = compare_separators(separator, candidate, choruses)
+        print('{:>14} | {:>10.3f} | {:>8.2f} | {:>15.1f} | {:>14.1f}'.format(name, comparison['s_per_chorus'],
+                            comparison['speedup'], comparison['bass_SDR_mean'], comparison['bass_SDR_min']))
+
+    if args.export is not None:
+        candidates['traced int8'].save(args.export)
+
+        start_time = time.time()
+        TracedSeparator.load(args.export)
+        print('\nExported to {}. Load time: {:.2f} sec (load_pretrained: {:.2f} sec)'.format(args.export,
+                                                                        time.time()-start_time, load_duration))
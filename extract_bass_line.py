@@ -2,12 +2,14 @@ import os
 import argparse
 import tqdm
 
-from demucs.pretrained import load_pretrained
-
 from ablt.utilities import read_track_dicts
+from ablt.cache import enable_caches
+from ablt.model_registry import warm_up, get_separator
 from ablt.bass_line_extractor import extract_single_bass_line
+from ablt.bass_line_extractor.separation import configure_chunk_threads
 
 from ablt.directories import AUDIO_DIR, TRACK_DICTS_PATH
+from ablt.constants import SEPARATOR_MODELS, SEPARATOR_MODEL
 
 # Extracts the basslines of all wav and mp3 files in a directory, if BPM value is proveded in the track_dicts.json file,
 # it used this information, otherwise it estimates it.
@@ -18,8 +20,19 @@ if __name__ == '__main__':
     parser.add_argument('-a', '--audio-dir', type=str, help="Directory containing all the audio files.", default=AUDIO_DIR)
     parser.add_argument('-n', '--n-bars', type=int, help="Number of chorus bars to extract.", default=4)
     parser.add_argument('-t', '--track-dicts', action="store_true", help="Use a track_dicts.json file.")
+    parser.add_argument('-l', '--low-memory', action="store_true", help="Drop the full rate track after beat tracking and decode only the chorus again.")
+    parser.add_argument('-g', '--fixed-grid', action="store_true", help="Fit a fixed beat grid using the BPM of the track_dicts.json file.")
+    parser.add_argument('-s', '--separator-model', type=str, choices=SEPARATOR_MODELS, help="Pretrained demucs model for the source separation.", default=SEPARATOR_MODEL)
+    parser.add_argument('-q', '--quantize-separator', action="store_true", help="Use the int8 dynamic quantized separator.")
+    parser.add_argument('-w', '--chunk-workers', type=int, help="Separate the chunks of a chorus in parallel with this many threads.", default=None)
+    parser.add_argument('--split-chorus', action="store_true", help="Shorten the separation segment so the chunk workers share the chorus, changes the separated bass line.")
+    parser.add_argument('--traced-separator', type=str, help="Path of a serialized TracedSeparator to use.", default=None)
+    parser.add_argument('-c', '--cache', action="store_true", help="Cache the decoded audio, the separated bass lines and the pYIN outputs on disk.")
     args = parser.parse_args()
 
+    if args.cache:
+        enable_caches()
+
     audio_dir = args.audio_dir
     N_bars = args.n_bars
 
@@ -29,6 +42,16 @@ if __name__ == '__main__':
     else:
         track_dicts = None  
     
+    # Load the shared demucs and madmom models once
+    warm_up(args.separator_model, quantized=args.quantize_separator, traced_path=args.traced_separator)
+    separator = get_separator(args.separator_model, args.quantize_separator, args.traced_separator)
+
+    if args.chunk_workers and args.split_chorus: # bound torch's threads once, the chunk workers share the cores
+        configure_chunk_threads(args.chunk_workers)
+    elif args.chunk_workers:
+        print('Warning: a chorus usually fits into a single separation segment, --chunk-workers only speeds up '
+              'the separation with --split-chorus.')
+
     if os.path.isfile(audio_dir): # if a single file is specified
 
         if track_dicts is None:
@@ -37,13 +60,12 @@ if __name__ == '__main__':
             title = os.path.splitext(os.path.basename(audio_dir))[0]
             BPM = track_dicts[title]['BPM']         
 
-        extract_single_bass_line(audio_dir, N_bars=N_bars, separator=None, BPM=BPM) 
+        extract_single_bass_line(audio_dir, N_bars=N_bars, separator=separator, BPM=BPM, low_memory=args.low_memory,
+                                 fixed_grid=args.fixed_grid, chunk_workers=args.chunk_workers,
+                                 split_chorus=args.split_chorus) 
 
     else: # if a directory of audio files is specified
 
-        # Load the demucs once here for faster training
-        separator = load_pretrained('demucs_extra')       
-
         # Get the list of all wav and mp3 paths
         track_titles = os.listdir(audio_dir)
         for title_ext in tqdm.tqdm(track_titles):
@@ -56,4 +78,6 @@ if __name__ == '__main__':
                 title = os.path.splitext(title_ext)[0]
                 BPM = track_dicts[title]['BPM']
 
-            extract_single_bass_line(audio_path, N_bars=N_bars, separator=separator, BPM=BPM) 
\ No newline at end of file
+            extract_single_bass_line(audio_path, N_bars=N_bars, separator=separator, BPM=BPM, low_memory=args.low_memory,
+                                 fixed_grid=args.fixed_grid, chunk_workers=args.chunk_workers,
+                                 split_chorus=args.split_chorus) 
\ No newline at end of file
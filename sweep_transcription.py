@@ -0,0 +1,58 @@
+import os
+import argparse
+
+import numpy as np
+
+from ablt.utilities import read_track_dicts
+from ablt.cache import enable_caches
+from ablt.bass_line_transcriber import parameter_sweep
+
+from ablt.directories import OUTPUT_DIR, TRACK_DICTS_PATH
+from ablt.constants import HOP_RATIO, M, PYIN_THRESHOLD, F0_ESTIMATORS
+
+
+def threshold_type(value):
+    return value if value in ['mean', 'mean_reduced'] else float(value)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Transcription Parameter Sweep.')
+    parser.add_argument('-b', '--bassline-dir', type=str, help="Directory containing all extracted basslines.", default=OUTPUT_DIR)
+    parser.add_argument('-t', '--track-dicts', action="store_true", help="Use a track_dicts.json file.")
+    parser.add_argument('-n', '--n-bars', type=int, help="Number of chorus bars to transcribe.", default=4)
+    parser.add_argument('-e', '--F0-estimators', type=str, nargs='+', choices=F0_ESTIMATORS, help="F0 estimators.", default=['pYIN'])
+    parser.add_argument('-f', '--hop-ratios', type=int, nargs='+', help="Numbers of F0 estimate samples that make up a beat.", default=[HOP_RATIO])
+    parser.add_argument('-p', '--pYIN-thresholds', type=threshold_type, nargs='+', help="Confidence thresholds, a value, mean or mean_reduced.", default=[PYIN_THRESHOLD])
+    parser.add_argument('-q', '--quantization-schemes', type=str, nargs='+', choices=['adaptive', 'uniform'], help="Quantization schemes.", default=['adaptive'])
+    parser.add_argument('-x', '--epsilons', type=int, nargs='+', help="Quantization epsilons.", default=[2])
+    parser.add_argument('-m', '--downsampling-rates', type=int, nargs='+', help="Downsampling rates of the MIDI sequence.", default=[M])
+    parser.add_argument('-j', '--max-workers', type=int, help="Number of processes, 0 for the number of cpus.", default=0)
+    parser.add_argument('-o', '--output', type=str, help="Path of the results table.", default=None)
+    parser.add_argument('-c', '--cache', action="store_true", help="Cache the raw pYIN outputs on disk.")
+    args = parser.parse_args()
+
+    if args.cache:
+        enable_caches(audio=False, separation=False)
+
+    track_dicts = read_track_dicts(TRACK_DICTS_PATH) if args.track_dicts else None
+
+    bass_lines = {}
+    for title in sorted(os.listdir(args.bassline_dir)):
+        bassline_path = os.path.join(args.bassline_dir, title, 'bass_line', title+'.npy')
+        if not os.path.isfile(bassline_path):
+            continue
+        if track_dicts is None:
+            BPM = float(np.load(os.path.join(OUTPUT_DIR, title, 'beat_grid', 'BPM.npy')))
+        else:
+            BPM = track_dicts[title]['BPM']
+        bass_lines[bassline_path] = BPM
+
+    grid = {'F0_estimator': args.F0_estimators,
+            'hop_ratio': args.hop_ratios,
+            'pYIN_threshold': args.pYIN_thresholds,
+            'quantization_scheme': args.quantization_schemes,
+            'epsilon': args.epsilons,
+            'M': args.downsampling_rates}
+
+    parameter_sweep(bass_lines, grid, N_bars=args.n_bars, max_workers=args.max_workers or None, results_path=args.output)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+for module in ['librosa', 'madmom', 'torch', 'demucs', 'tqdm', 'psutil']:
+    pytest.importorskip(module)
+
+from ablt.bass_line_extractor.beat_grid import fit_beat_grid
+from ablt.constants import GRID_FIT_THRESHOLD
+
+FPS = 100
+DURATION = 60 # in sec
+
+
+def click_envelope(BPM, phase, seed=0):
+    """Returns the onset envelope of a click track, decaying pulses at the beats over a noise floor."""
+
+    rng = np.random.default_rng(seed)
+    envelope = 0.1*np.abs(rng.standard_normal(DURATION*FPS))
+    pulse = np.exp(-np.arange(4)) # frames
+    for beat in np.arange(phase, DURATION, 60/BPM):
+        idx = int(round(beat*FPS))
+        envelope[idx:idx+len(pulse)] += pulse[:len(envelope)-idx]
+    return envelope
+
+
+def noise_envelope(seed=0):
+    """Returns a rectified white noise onset envelope without a beat."""
+
+    rng = np.random.default_rng(seed)
+    return np.abs(rng.standard_normal(DURATION*FPS))
+
+
+@pytest.mark.parametrize('BPM', [120, 125, 128, 174])
+def test_click_track_grid_is_accepted(BPM):
+    phase = 0.137
+    beat_positions, quality = fit_beat_grid(click_envelope(BPM, phase), BPM, fps=FPS)
+
+    assert quality >= GRID_FIT_THRESHOLD
+    clicks = np.arange(phase, DURATION, 60/BPM)[:len(beat_positions)]
+    assert len(beat_positions) >= len(clicks) - 1
+    assert np.max(np.abs(beat_positions[:len(clicks)] - clicks)) < 2/FPS
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_noise_grid_is_rejected(seed):
+    _, quality = fit_beat_grid(noise_envelope(seed), 125, fps=FPS)
+
+    assert quality < GRID_FIT_THRESHOLD
+
+
+def test_short_envelope_can_not_be_fitted():
+    beat_positions, quality = fit_beat_grid(click_envelope(125, 0.1)[:FPS//2], 125, fps=FPS)
+
+    assert len(beat_positions) == 0 and quality == 0.0
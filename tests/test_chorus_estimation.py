@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+for module in ['librosa', 'madmom', 'torch', 'demucs', 'tqdm', 'psutil']:
+    pytest.importorskip(module)
+
+from ablt.bass_line_extractor import extractor_class
+from ablt.bass_line_extractor.chorus_estimation import EnergyIndex, drop_detection
+from ablt.bass_line_extractor.parallel_processing.parallel_extractor_classes import (BatchInfo, BatchTracks,
+                                                                                      BatchChorusDetector)
+from ablt.signal_processing import decimate_track
+from ablt.constants import FS, ANALYSIS_DECIMATION
+
+BPM = 125
+N_BARS = 4
+
+# Amplitudes of the 4 bar cells: intro, breakdown, first drop, breakdown, main drop. The energy difference between
+# the two drops is above the absolute drop picking threshold only at the full rate scale.
+CELL_AMPLITUDES = [0.5, 0.2, 0.8, 0.2, 1.0, 1.0]
+MAIN_DROP_BEAT_IDX = 4*4*N_BARS
+
+
+def synthetic_track(seed=0):
+    """Returns a 55 Hz tone whose amplitude changes every 4 bars and its beat positions."""
+
+    rng = np.random.default_rng(seed)
+    beat_length = 60/BPM
+    N_beats = 4*N_BARS*len(CELL_AMPLITUDES)
+
+    time_axis = np.arange(int(N_beats*beat_length*FS)) / FS
+    amplitudes = np.array(CELL_AMPLITUDES)[(time_axis // (4*N_BARS*beat_length)).astype(int)]
+    track = amplitudes*np.sin(2*np.pi*55*time_axis) + 0.01*rng.standard_normal(len(time_axis))
+
+    return track.astype(np.float32), np.arange(N_beats)*beat_length
+
+
+def test_energies_do_not_depend_on_the_sampling_rate():
+    track, beat_positions = synthetic_track()
+
+    full_rate = EnergyIndex.from_track(track, FS, multirate=False).bar_energies(beat_positions)
+    multirate = EnergyIndex.from_track(track, FS).bar_energies(beat_positions)
+    analysis = EnergyIndex.from_track(decimate_track(track, ANALYSIS_DECIMATION),
+                                      FS/ANALYSIS_DECIMATION).bar_energies(beat_positions)
+
+    np.testing.assert_allclose(multirate, full_rate, rtol=0.02)
+    np.testing.assert_allclose(analysis, full_rate, rtol=0.02)
+
+
+def test_drop_detection_on_the_analysis_track():
+    track, beat_positions = synthetic_track()
+
+    full_rate_index = EnergyIndex.from_track(track, FS, multirate=False)
+    full_rate_drop_beat_idx, _ = drop_detection(None, beat_positions, FS, 2, full_rate_index)
+    analysis_drop_beat_idx, _ = drop_detection(decimate_track(track, ANALYSIS_DECIMATION), beat_positions,
+                                               FS/ANALYSIS_DECIMATION, 2, full_rate_track=track)
+
+    assert full_rate_drop_beat_idx == MAIN_DROP_BEAT_IDX
+    assert analysis_drop_beat_idx == full_rate_drop_beat_idx
+
+
+def chorus_start_beat_idx(monkeypatch, tmp_path, track, beat_positions, low_memory):
+    monkeypatch.setattr(extractor_class, 'OUTPUT_DIR', str(tmp_path))
+    monkeypatch.setattr(extractor_class, 'load_audio', lambda path, sr, mono: track)
+
+    info = extractor_class.Info('synthetic.mp3', 0, FS, N_BARS)
+    track_holder = extractor_class.Track(info, low_memory)
+    track_holder.release()
+    chorus_detector = extractor_class.ChorusDetector(info, track_holder)
+    chorus_detector.estimate_chorus_position(beat_positions)
+
+    return chorus_detector.chorus_start_beat_idx
+
+
+def test_low_memory_chorus_detector(monkeypatch, tmp_path):
+    track, beat_positions = synthetic_track()
+
+    full_rate_drop_beat_idx = chorus_start_beat_idx(monkeypatch, tmp_path, track, beat_positions, low_memory=False)
+    low_memory_drop_beat_idx = chorus_start_beat_idx(monkeypatch, tmp_path, track, beat_positions, low_memory=True)
+
+    assert full_rate_drop_beat_idx == MAIN_DROP_BEAT_IDX
+    assert low_memory_drop_beat_idx == full_rate_drop_beat_idx
+
+
+def batch_chorus_beat_positions(track_array_dict, beat_positions_dict, low_memory):
+    info = BatchInfo(list(track_array_dict), {}, FS, N_BARS, None)
+    track_array_dict = BatchTracks(info, low_memory=low_memory).release(dict(track_array_dict))
+
+    chorus_detector = BatchChorusDetector(info)
+    chorus_detector.estimate_choruses(track_array_dict, beat_positions_dict)
+
+    return chorus_detector.chorus_estimates_dict
+
+
+def test_low_memory_batch_chorus_detector():
+    track_array_dict, beat_positions_dict = {}, {}
+    for seed in range(2):
+        track_array_dict[str(seed)], beat_positions_dict[str(seed)] = synthetic_track(seed)
+
+    full_rate_choruses = batch_chorus_beat_positions(track_array_dict, beat_positions_dict, low_memory=False)
+    low_memory_choruses = batch_chorus_beat_positions(track_array_dict, beat_positions_dict, low_memory=True)
+
+    assert full_rate_choruses.keys() == low_memory_choruses.keys() == track_array_dict.keys()
+    for title, chorus_beat_positions in full_rate_choruses.items():
+        assert chorus_beat_positions[0] == beat_positions_dict[title][MAIN_DROP_BEAT_IDX]
+        np.testing.assert_array_equal(low_memory_choruses[title], chorus_beat_positions)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+for module in ['librosa', 'crepe', 'numba', 'psutil']:
+    pytest.importorskip(module)
+
+from ablt.representation.encoding import encode_midi_sequences, encode_midi_sequence, PITCH_CLASSES
+
+MIN_NOTE, MAX_NOTE = 28, 51
+N_SEQUENCES, LENGTH = 200, 512
+
+
+def reference_encoding(midi_sequence, key, M, N_qb=8, sustain_code=100, silence_code=0):
+    """Encodes a single sequence step by step, returns None if it has unwanted notes."""
+
+    representation = midi_sequence[np.arange(0, len(midi_sequence), M, dtype=int)]
+
+    N_intervals = PITCH_CLASSES.index(key)
+    representation = np.array([m-N_intervals if m != silence_code else m for m in representation])
+
+    if representation[representation > MAX_NOTE].size > 0:
+        return None
+    y = representation[representation < MIN_NOTE]
+    if y[y != silence_code].size > 0:
+        return None
+
+    if sustain_code is not None:
+        for idx in range(len(representation))[::-1][:-1]:
+            if representation[idx] == representation[idx - 1]:
+                representation[idx] = sustain_code
+
+    if sustain_code is not None:
+        representation[representation == sustain_code] = MAX_NOTE+1
+    representation[representation != silence_code] -= MIN_NOTE-1
+    representation[representation == silence_code] = 0
+    return representation
+
+
+def random_midi_sequences(rng, silence_code=0):
+    """Returns runs of notes in the range of each key, a third of the sequences has an unwanted note."""
+
+    keys = rng.choice(PITCH_CLASSES, N_SEQUENCES)
+    shifts = np.array([PITCH_CLASSES.index(key) for key in keys])
+
+    midi_sequences = np.empty((N_SEQUENCES, LENGTH), dtype=int)
+    for idx, shift in enumerate(shifts):
+        N_runs = rng.integers(1, 64)
+        values = np.where(rng.random(N_runs) < 0.3, silence_code, rng.integers(MIN_NOTE, MAX_NOTE+1, N_runs) + shift)
+        run_ends = np.sort(rng.choice(np.arange(1, LENGTH), N_runs-1, replace=False))
+        midi_sequences[idx] = np.repeat(values, np.diff(np.concatenate([[0], run_ends, [LENGTH]])))
+
+    rejected = np.flatnonzero(rng.random(N_SEQUENCES) < 1/3)
+    positions = rng.integers(0, LENGTH, len(rejected))
+    unwanted = np.where(rng.random(len(rejected)) < 0.5, MIN_NOTE-1, MAX_NOTE+1) + shifts[rejected]
+    midi_sequences[rejected, positions - positions % 8] = unwanted # kept by every decimation rate
+
+    return midi_sequences, keys
+
+
+@pytest.mark.parametrize('M', [1, 2, 4, 8])
+@pytest.mark.parametrize('sustain_code', [100, None])
+@pytest.mark.parametrize('silence_code', [0, -1])
+def test_batch_encoding_matches_the_row_loop(M, sustain_code, silence_code):
+    rng = np.random.default_rng(M)
+    midi_sequences, keys = random_midi_sequences(rng, silence_code)
+
+    representations, valid = encode_midi_sequences(midi_sequences, keys, M, sustain_code=sustain_code,
+                                                   silence_code=silence_code)
+    expected = [reference_encoding(midi_sequence, key, M, sustain_code=sustain_code, silence_code=silence_code)
+                                                                for midi_sequence, key in zip(midi_sequences, keys)]
+
+    np.testing.assert_array_equal(valid, [representation is not None for representation in expected])
+    assert 0 < np.count_nonzero(valid) < N_SEQUENCES
+    np.testing.assert_array_equal(representations, [representation for representation in expected
+                                                                                if representation is not None])
+
+    for midi_sequence, key, representation in list(zip(midi_sequences, keys, expected))[:20]:
+        encoded = encode_midi_sequence(midi_sequence, key, M, sustain_code=sustain_code, silence_code=silence_code)
+        if representation is None:
+            assert encoded is None
+        else:
+            np.testing.assert_array_equal(encoded, representation)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+for module in ['mido', 'librosa', 'crepe', 'numba', 'psutil']:
+    pytest.importorskip(module)
+
+from mido import Message, MidiFile, MidiTrack, MetaMessage, bpm2tempo
+
+from ablt.MIDI_output import midi_file_bytes, multi_track_midi_bytes
+from ablt.bass_line_transcriber.transcription import MIDI_NOTE_DTYPE
+
+TPB = 960*16
+
+
+def random_midi_array(rng, N_notes):
+    """Returns non overlapping notes on the eighth beat grid."""
+
+    gaps = rng.integers(0, 4, N_notes) / 8
+    durations = rng.integers(1, 16, N_notes) / 8
+    midi_array = np.zeros(N_notes, dtype=MIDI_NOTE_DTYPE)
+    midi_array['start_beat'] = np.cumsum(gaps) + np.concatenate([[0], np.cumsum(durations)[:-1]])
+    midi_array['midi_number'] = rng.integers(28, 52, N_notes)
+    midi_array['velocity'] = 100
+    midi_array['duration'] = durations
+    return midi_array
+
+
+def mido_track(midi_array, title, BPM=None, middle_c='C4'):
+    """Builds the track of a bass line note by note with mido."""
+
+    track = MidiTrack()
+    if BPM is not None:
+        track.append(MetaMessage('time_signature', numerator=4, denominator=4))
+        track.append(MetaMessage('set_tempo', tempo=bpm2tempo(BPM)))
+    track.append(MetaMessage('track_name', name=title))
+    track.append(MetaMessage('instrument_name', name='bass'))
+
+    offset = 0.0
+    for start_beat, midi_number, _, duration in midi_array:
+        pitch = int(midi_number) + (12 if middle_c == 'C3' else 0)
+        track.append(Message('note_on', note=pitch, velocity=100, time=int((start_beat-offset)*TPB)))
+        track.append(Message('note_off', note=pitch, velocity=100, time=int(duration*TPB)))
+        offset = start_beat + duration
+    track.append(MetaMessage('end_of_track'))
+    return track
+
+
+def mido_bytes(tracks):
+    outfile = MidiFile(type=1, ticks_per_beat=TPB)
+    outfile.tracks.extend(tracks)
+    buffer = BytesIO()
+    outfile.save(file=buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('N_notes', [0, 1, 2, 64])
+@pytest.mark.parametrize('middle_c', ['C4', 'C3'])
+def test_midi_file_matches_mido(N_notes, middle_c):
+    rng = np.random.default_rng(N_notes)
+    for BPM in [120, 125.5, 174]:
+        midi_array = random_midi_array(rng, N_notes)
+        expected = mido_bytes([mido_track(midi_array, 'title', BPM, middle_c)])
+
+        assert midi_file_bytes(midi_array, BPM, 'title', middle_c, TPB) == expected
+
+
+def test_multi_track_midi_file_matches_mido():
+    rng = np.random.default_rng(0)
+    bass_lines = {'track_{}'.format(idx): (random_midi_array(rng, N_notes), BPM)
+                                        for idx, (N_notes, BPM) in enumerate([(32, 125), (0, 128), (1, 120), (17, 174)])}
+
+    conductor = MidiTrack([MetaMessage('time_signature', numerator=4, denominator=4),
+                           MetaMessage('set_tempo', tempo=bpm2tempo(125)),
+                           MetaMessage('end_of_track')])
+    tracks = [mido_track(midi_array, title) for title, (midi_array, _) in bass_lines.items()]
+    content = multi_track_midi_bytes(bass_lines, tpb=TPB)
+
+    assert content == mido_bytes([conductor] + tracks)
+
+    midi_file = MidiFile(file=BytesIO(content))
+    assert midi_file.type == 1 and len(midi_file.tracks) == 1 + len(bass_lines)
+    assert [track.name for track in midi_file.tracks[1:]] == list(bass_lines)
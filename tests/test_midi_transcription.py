@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+for module in ['librosa', 'crepe', 'numba', 'psutil']:
+    pytest.importorskip(module)
+
+from ablt.bass_line_transcriber.transcription import midi_sequence_to_midi_arrays
+
+N_QB = 8
+MS = [1, 2, 4, 8]
+
+
+def reference_midi_array(midi_seq, M, N_qb=8, silence_code=0, velocity=120):
+    """Decimates the sequence and finds its notes from the changes of the decimated sequence, one rate at a time."""
+
+    midi_seq = midi_seq[np.arange(0, len(midi_seq), M, dtype=int)]
+    hop_ratio = 4*(N_qb//M)
+
+    change_indices = np.where(np.diff(midi_seq) != 0)[0]
+    change_indices = np.insert(change_indices, [0, len(change_indices)], [-1, len(midi_seq)-1])
+    note_lengths = np.diff(change_indices) / hop_ratio
+
+    midi_array = []
+    for i, j in enumerate(change_indices[:-1]):
+        start_idx = j+1
+        note = midi_seq[start_idx]
+        if note != silence_code:
+            midi_array.append([start_idx/hop_ratio, note, velocity, note_lengths[i]])
+
+    return np.array(midi_array).reshape(-1, 4)
+
+
+def random_midi_sequence(rng, leading_silence, trailing_silence, silence_code=0):
+    """Returns runs of random notes and silences, many of them shorter than the largest decimation rate."""
+
+    N_runs = rng.integers(1, 40)
+    values = np.where(rng.random(N_runs) < 0.3, silence_code, rng.integers(28, 52, N_runs))
+    lengths = rng.integers(1, 3*N_QB, N_runs)
+    if leading_silence:
+        values[0] = silence_code
+    if trailing_silence:
+        values[-1] = silence_code
+    return np.repeat(values, lengths)
+
+
+@pytest.mark.parametrize('leading_silence', [False, True])
+@pytest.mark.parametrize('trailing_silence', [False, True])
+@pytest.mark.parametrize('silence_code', [0, -1])
+def test_midi_arrays_match_the_per_rate_loop(leading_silence, trailing_silence, silence_code):
+    rng = np.random.default_rng(2*leading_silence + trailing_silence)
+    for _ in range(200):
+        midi_seq = random_midi_sequence(rng, leading_silence, trailing_silence, silence_code)
+        midi_arrays = midi_sequence_to_midi_arrays(midi_seq, MS, N_qb=N_QB, silence_code=silence_code)
+
+        for M in MS:
+            expected = reference_midi_array(midi_seq, M, N_qb=N_QB, silence_code=silence_code)
+            midi_array = midi_arrays[M]
+
+            assert len(midi_array) == len(expected)
+            np.testing.assert_allclose(midi_array['start_beat'], expected[:, 0])
+            np.testing.assert_array_equal(midi_array['midi_number'], expected[:, 1])
+            np.testing.assert_array_equal(midi_array['velocity'], expected[:, 2])
+            np.testing.assert_allclose(midi_array['duration'], expected[:, 3])
+
+
+def test_all_silent_sequence_has_no_notes():
+    midi_arrays = midi_sequence_to_midi_arrays(np.zeros(4*N_QB*16, dtype=int), MS, N_qb=N_QB)
+
+    assert all(len(midi_array) == 0 for midi_array in midi_arrays.values())
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+for module in ['numba', 'librosa', 'crepe', 'psutil']:
+    pytest.importorskip(module)
+
+from ablt.bass_line_transcriber.transcription.quantization.segmentation import (find_voiced_regions,
+                                                                                segment_voiced_regions)
+from ablt.bass_line_transcriber.transcription.quantization.post_processing import onset_offset_merger
+
+from benchmarks.segmentation import (reference_segment_voiced_regions, reference_onset_offset_merger, random_case,
+                                     compare)
+
+N_CASES = 1000
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_compiled_segmentation_matches_the_reference(seed):
+    rng = np.random.default_rng(seed)
+
+    for _ in range(N_CASES):
+        pitch_track, quarter_beat_positions = random_case(rng)
+        voiced_regions = find_voiced_regions(pitch_track[1])
+        length_threshold = int(rng.choice([4, 8, 12]))
+
+        reference_segmentation = reference_segment_voiced_regions(pitch_track[0], voiced_regions.boundaries,
+                                                                  length_threshold, quarter_beat_positions)
+        segmentation = segment_voiced_regions(pitch_track[0], voiced_regions, length_threshold,
+                                              quarter_beat_positions)
+        assert compare(segmentation, reference_segmentation)
+
+        reference_merged = reference_onset_offset_merger(pitch_track, reference_segmentation[0])
+        merged = onset_offset_merger(pitch_track, segmentation[0], segmentation[1])
+        np.testing.assert_array_equal(merged[1], reference_merged[1])
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+
+import numpy as np
+import pytest
+
+for module in ['librosa', 'crepe', 'numba', 'psutil']:
+    pytest.importorskip(module)
+
+from ablt.bass_line_transcriber import sweep, transcribe, transcriber_class
+from ablt.bass_line_transcriber.sweep import TranscriptionStages, parameter_combinations, split_grid
+from ablt.bass_line_transcriber.transcribe import transcribe_single_bass_line
+from ablt.utilities import export_function, export_bass_line_fs
+from ablt.constants import BASS_LINE_FS
+from benchmarks.F0_estimators import synthesize_bass_line
+
+BPM = 125
+N_BARS = 4
+TITLE = 'synthetic'
+
+GRID = {'F0_estimator': ['semitone_YIN'],
+        'hop_ratio': [32, 16],
+        'pYIN_threshold': [0.05, 'mean'],
+        'quantization_scheme': ['adaptive', 'uniform'],
+        'epsilon': [2, 4],
+        'M': [1, 2, 4]}
+
+
+@pytest.fixture
+def bass_line_path(tmp_path, monkeypatch):
+    """Exports a synthetic bass line and its chorus beat positions to a temporary output directory."""
+
+    for module in [sweep, transcribe, transcriber_class]:
+        monkeypatch.setattr(module, 'OUTPUT_DIR', str(tmp_path))
+
+    bass_line, beat_duration, _ = synthesize_bass_line(np.random.default_rng(0), BPM=BPM, N_bars=N_BARS)
+    bass_line_dir = os.path.join(str(tmp_path), TITLE, 'bass_line')
+    export_function(bass_line, bass_line_dir, TITLE)
+    export_bass_line_fs(BASS_LINE_FS, bass_line_dir)
+    export_function(np.arange(4*N_BARS+1)*beat_duration, os.path.join(str(tmp_path), TITLE, 'chorus', 'beat_positions'),
+                    TITLE)
+
+    return os.path.join(bass_line_dir, TITLE+'.npy')
+
+
+def test_memoized_stages_match_the_transcriber(bass_line_path):
+    stages = TranscriptionStages(bass_line_path, BPM, N_bars=N_BARS)
+    combinations = parameter_combinations(GRID)
+    memoized = [stages.midi_array(params) for params in combinations]
+
+    for params, midi_array in zip(combinations, memoized):
+        midi_arrays = transcribe_single_bass_line(bass_line_path, BPM, M=params['M'], N_bars=N_BARS,
+                                                  hop_ratio=params['hop_ratio'],
+                                                  quantization_scheme=params['quantization_scheme'],
+                                                  epsilon=params['epsilon'], pYIN_threshold=params['pYIN_threshold'],
+                                                  F0_estimator=params['F0_estimator'], export_MIDI=False)
+        assert midi_arrays is not None
+        np.testing.assert_array_equal(midi_array, midi_arrays[params['M']])
+
+    assert any(len(midi_array) for midi_array in memoized)
+
+
+def test_split_grid_covers_the_grid():
+    sub_grids = split_grid(GRID)
+
+    assert len(sub_grids) == len(GRID['F0_estimator'])*len(GRID['hop_ratio'])
+    assert [params for sub_grid in sub_grids for params in parameter_combinations(sub_grid)] == \
+                                                                                    parameter_combinations(GRID)
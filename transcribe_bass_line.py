@@ -4,10 +4,12 @@ import argparse
 import numpy as np
 
 from ablt.utilities import read_track_dicts
+from ablt.cache import enable_caches
 from ablt.bass_line_transcriber import transcribe_single_bass_line
+from ablt.MIDI_output import export_MIDI_batch
 
 from ablt.directories import OUTPUT_DIR, TRACK_DICTS_PATH
-from ablt.constants import HOP_RATIO, M
+from ablt.constants import HOP_RATIO, M, F0_ESTIMATORS
 
 
 if __name__ == "__main__":
@@ -18,8 +20,14 @@ if __name__ == "__main__":
     parser.add_argument('-n', '--n-bars', type=int, help="Number of chorus bars to extract.", default=4)
     parser.add_argument('-m', '--downsampling-rate', type=int, help='Downsampling rate to the F0 estimation.', default=M)
     parser.add_argument('-f', '--hop-ratio', type=int, help="Number of F0 estimate samples that make up a beat.", default=HOP_RATIO)
+    parser.add_argument('-e', '--F0-estimator', type=str, choices=F0_ESTIMATORS, help="F0 estimator of the transcription.", default='pYIN')
+    parser.add_argument('-a', '--midi-archive', type=str, help="Write all the MIDI outputs to a single .zip archive or a multi-track .mid file instead of a file per track. The tracks of a .mid file share the tempo of the first track, use a .zip archive for per track tempi.", default=None)
+    parser.add_argument('-c', '--cache', action="store_true", help="Cache the raw pYIN outputs on disk.")
     args = parser.parse_args()
 
+    if args.cache:
+        enable_caches(audio=False, separation=False)
+
     bassline_dir = args.bassline_dir
     M = args.downsampling_rate
     N_bars = args.n_bars
@@ -31,6 +39,9 @@ if __name__ == "__main__":
     else:
         track_dicts = None
 
+    export_MIDI = args.midi_archive is None
+    midi_batch = {} # {title: (midi_arrays, BPM)}
+
     if os.path.split(os.path.dirname(bassline_dir))[-1] == "outputs": # if a single file is specified
         
         title = os.path.splitext(os.path.basename(bassline_dir))[0]
@@ -41,8 +52,11 @@ if __name__ == "__main__":
             BPM = track_dicts[title]['BPM']         
 
         bassline_path = os.path.join(bassline_dir, 'bass_line', title+'.npy')
-        transcribe_single_bass_line(bassline_path, BPM=BPM, M=M,
-                                    N_bars=N_bars, hop_ratio=hop_ratio)
+        midi_arrays = transcribe_single_bass_line(bassline_path, BPM=BPM, M=M,
+                                                  N_bars=N_bars, hop_ratio=hop_ratio, F0_estimator=args.F0_estimator,
+                                                  export_MIDI=export_MIDI)
+        if midi_arrays is not None:
+            midi_batch[title] = (midi_arrays, BPM)
 
     else:
         track_titles = os.listdir(bassline_dir)
@@ -55,5 +69,12 @@ if __name__ == "__main__":
                 BPM = track_dicts[title]['BPM']            
             
             bassline_path = os.path.join(bassline_dir, title, 'bass_line', title+'.npy')
-            transcribe_single_bass_line(bassline_path, BPM=BPM, M=M,
-                                        N_bars=N_bars, hop_ratio=hop_ratio)                                                    
\ No newline at end of file
+            midi_arrays = transcribe_single_bass_line(bassline_path, BPM=BPM, M=M,
+                                                      N_bars=N_bars, hop_ratio=hop_ratio, F0_estimator=args.F0_estimator,
+                                                      export_MIDI=export_MIDI)
+            if midi_arrays is not None:
+                midi_batch[title] = (midi_arrays, BPM)
+
+    if not export_MIDI:
+        export_MIDI_batch(midi_batch, args.midi_archive)
+        print('{} MIDI outputs written to {}'.format(len(midi_batch), args.midi_archive))
\ No newline at end of file